@@ -1,17 +1,33 @@
+import functools
+import os
+import threading
+import time
+
 import dash
 from dash import html, dcc, Input, Output, State, dash_table
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.graph_objects as go
 
+from config import APP_CONFIG, CACHE_CONFIG, ML_CONFIG
+from src.model import NOMBRES_ESTIMADOR
+
 # Importar módulos personalizados
-from src.etl import cargar_datos, obtener_estadisticas_avanzadas, cargar_o_entrenar_modelo
+from src.etl import cargar_datos, congelar_datos, obtener_estadisticas_avanzadas, cargar_o_entrenar_modelo
+from src.cubo import construir_cubo
+from src.indice import IndiceRecomendacion
+from src.tabla import TablaDatos
 from src.graphics import (
     crear_grafico_distritos, crear_grafico_edad, crear_grafico_sexo,
     crear_grafico_evolucion_temporal, crear_grafico_tiempo_espera,
     crear_grafico_bvd_vs_espera, crear_grafico_top_distritos
 )
-from src.model import recomendar_residencia
+from src.cache import CacheLRU, CacheRecomendaciones, CacheCompartida, crear_backend
+from src.figuras import AlmacenFiguras
+from src.api import crear_api
+from src.agrupador import AgrupadorPredicciones
+from src.entrenamiento import GestorModelo
 
 # Inicializar app
 app = dash.Dash(
@@ -21,322 +37,473 @@ app = dash.Dash(
 )
 server = app.server
 
-# Cargar datos
-df = cargar_datos()
-print(f"Datos cargados: {len(df)} registros")
+# Recursos que dependen de los datos; los rellena inicializar(), al importar
+# el módulo o, con CARGA_DIFERIDA, en un hilo después de arrancar el worker
+df = pd.DataFrame()
+cubo = indice = tabla_datos = modelo_ml = gestor_modelo = None
+cache_compartida = cache_recomendaciones = None
+stats = {}
+id_datos = 'sin-datos'
+distritos = edades = sexos = ["Todos"]
+datos_listos = threading.Event()
+_carga = {'pid': None, 'error': None}
+_bloqueo_carga = threading.Lock()
+
+def inicializar():
+    """Carga datos, cubo, índice y modelo y precalienta las recomendaciones"""
+    global df, cubo, indice, tabla_datos, modelo_ml, stats, gestor_modelo
+    global cache_compartida, id_datos, cache_recomendaciones, distritos, edades, sexos
+
+    # Cargar datos (sin carga diferida y con gunicorn --preload esto ocurre una sola vez, en el master;
+    # los buffers de solo lectura se comparten copy-on-write entre workers)
+    df = congelar_datos(cargar_datos(compacto=APP_CONFIG['COMPACT_DATA']))
+    print(f"Datos cargados: {len(df)} registros")
+
+    # Cubo de agregados para estadísticas y gráficos (una sola pasada sobre los datos)
+    cubo = construir_cubo(df) if not df.empty else None
+
+    # Índice por filtro y BVD para las recomendaciones (sin copias por clic)
+    indice = IndiceRecomendacion(df) if not df.empty else None
+
+    # Vista de la pestaña de datos: páginas, filtros y orden en el servidor
+    tabla_datos = TablaDatos(df) if not df.empty else None
+
+    # Cargar o entrenar modelo (el reentrenamiento corre en otro proceso y el
+    # gestor cambia al modelo nuevo cuando se publica)
+    modelo_ml, stats = cargar_o_entrenar_modelo(df, cubo)
+    # Las versiones nuevas llegan con el vector de esperas del snapshot ya
+    # calculado: la primera recomendación tras el cambio no lo paga
+    gestor_modelo = GestorModelo(modelo_ml, preparar=precalentar_modelo)
+
+    # Caché compartida entre workers para las recomendaciones
+    cache_compartida = CacheCompartida(crear_backend(), ttl=CACHE_CONFIG['TTL'])
+    id_datos = df.attrs.get('huella', 'sin-datos')
+
+    # Caché LRU de recomendaciones, precalentada con las combinaciones más comunes
+    cache_recomendaciones = CacheRecomendaciones(CACHE_CONFIG['RECOMENDACIONES_MAX'], cache_compartida)
+    cache_recomendaciones.precalentar(df, modelo_ml, indice, CACHE_CONFIG['PRECALENTAR_RECOMENDACIONES'])
+
+    # Opciones para dropdowns
+    distritos = ["Todos"] + sorted(df['DISTRITO_NOMBRE'].unique().tolist()) if not df.empty else ["Todos"]
+    edades = ["Todos"] + sorted(df['TRAMO_EDAD'].unique().tolist()) if not df.empty else ["Todos"]
+    sexos = ["Todos"] + sorted(df['SEXO'].unique().tolist()) if not df.empty else ["Todos"]
+    datos_listos.set()
+
+# Gráficos de la pestaña de análisis. Cada uno se compila una vez por
+# snapshot de datos a JSON en disco (AlmacenFiguras) y cada worker guarda
+# además el dict ya leído; los callbacks no vuelven a pasar por plotly
+GRAFICOS = {
+    'grafico-distritos': lambda: crear_grafico_top_distritos(cubo),  # Usamos el top 10
+    'grafico-evolucion': lambda: crear_grafico_evolucion_temporal(cubo),
+    # Los gráficos agregados salen del cubo; el scatter necesita las filas
+    'grafico-bvd-espera': lambda: crear_grafico_bvd_vs_espera(df),
+    'grafico-tiempo-espera': lambda: crear_grafico_tiempo_espera(cubo),
+    'grafico-edad': lambda: crear_grafico_edad(cubo),
+    'grafico-sexo': lambda: crear_grafico_sexo(cubo)
+}
+cache_figuras = CacheLRU(capacidad=2 * len(GRAFICOS))
+almacen_figuras = AlmacenFiguras()
+
+# Los clics simultáneos de varios usuarios se predicen en un solo lote
+agrupador = AgrupadorPredicciones()
+
+def modelo_servido():
+    """Modelo activo con sus predicciones pasando por el agrupador"""
+    return agrupador.envolver(gestor_modelo.modelo)
+
+def precalentar_modelo(modelo):
+    """Memoriza la espera prevista de todas las filas con un modelo aún no publicado"""
+    if not df.empty:
+        modelo.predecir_filas(df)
+
+def numero_arboles(modelo):
+    """Árboles del bosque o iteraciones del boosting del modelo servido"""
+    return (getattr(modelo.model, 'n_estimators', None) or getattr(modelo.model, 'max_iter', None)
+            or getattr(modelo.bosque, 'n_arboles', None) or ML_CONFIG['N_ESTIMATORS'])
+
+def figura_vacia(texto):
+    fig = go.Figure()
+    fig.add_annotation(text=texto, showarrow=False)
+    return fig
+
+def obtener_figura(id_grafico):
+    """Figura de `id_grafico` para el snapshot de datos actual"""
+    if df.empty:
+        return figura_vacia("No hay datos disponibles")
+    try:
+        return cache_figuras.obtener((id_grafico, id_datos), lambda: almacen_figuras.obtener(
+            id_datos, id_grafico, GRAFICOS[id_grafico]))
+    except Exception as e:
+        print(f"Error creando {id_grafico}: {e}")
+        return figura_vacia(f"Error: {str(e)}")
+
+def precompilar_figuras():
+    """Deja en disco las figuras del snapshot actual antes de la primera visita"""
+    if APP_CONFIG['PRECOMPILAR_FIGURAS'] and not df.empty:
+        almacen_figuras.precompilar(id_datos, GRAFICOS)
+
+def _cargar_en_segundo_plano():
+    inicio = time.perf_counter()
+    try:
+        inicializar()
+        print(f"Carga diferida completada en {time.perf_counter() - inicio:.1f} s")
+        gestor_modelo.comprobar_en_segundo_plano()
+        precompilar_figuras()
+    except Exception as e:
+        print(f"Error en la carga diferida: {e}")
+        _carga['error'] = str(e)
+
+def iniciar_carga():
+    """Arranca la carga diferida en este proceso si aún no se ha hecho
 
-# Cargar o entrenar modelo
-modelo_ml, stats = cargar_o_entrenar_modelo(df)
+    La llaman el hook post_worker_init de gunicorn y cada petición; el
+    servidor responde mientras el hilo carga (la página muestra un aviso
+    hasta que termina). Con preload el master no la llama: cada worker
+    carga sus propios datos después del fork.
+    """
+    if datos_listos.is_set():
+        return
+    with _bloqueo_carga:
+        if _carga['pid'] == os.getpid():
+            return
+        _carga['pid'], _carga['error'] = os.getpid(), None
+        threading.Thread(target=_cargar_en_segundo_plano, name='carga-datos', daemon=True).start()
 
-# Opciones para dropdowns
-distritos = ["Todos"] + sorted(df['DISTRITO_NOMBRE'].unique().tolist()) if not df.empty else ["Todos"]
-edades = ["Todos"] + sorted(df['TRAMO_EDAD'].unique().tolist()) if not df.empty else ["Todos"]
-sexos = ["Todos"] + sorted(df['SEXO'].unique().tolist()) if not df.empty else ["Todos"]
+if APP_CONFIG['CARGA_DIFERIDA']:
+    server.before_request(iniciar_carga)
+else:
+    inicializar()
+    precompilar_figuras()
+
+def contexto_api():
+    """Datos y modelo actuales para la API REST; None mientras se cargan"""
+    if not datos_listos.is_set():
+        return None
+    return {'df': df, 'indice': indice, 'modelo': modelo_servido(),
+            'recomendar': cache_recomendaciones.recomendar}
+
+# Puntuación por lotes para otros sistemas: /api/v1/predict y /api/v1/recommend
+server.register_blueprint(crear_api(contexto_api))
 
 # Layout principal
-app.layout = dbc.Container([
-    # Header
-    dbc.Row([
-        dbc.Col([
-            html.H1("🏥 Residencias Alzheimer - Madrid", 
-                   className="text-center mt-4 mb-3",
-                   style={'color': '#2c3e50', 'fontWeight': 'bold'}),
-            html.P("Sistema de Recomendación Inteligente con Machine Learning", 
-                  className="text-center text-muted mb-3"),
-            dbc.Badge("✅ DEPLOY EN RENDER", color="success", className="mb-4 mx-2"),
-            dbc.Badge("🤖 ML ACTIVADO", color="info", className="mb-4 mx-2"),
-            dbc.Badge(f"📊 {len(df)} REGISTROS", color="warning", className="mb-4 mx-2")
-        ])
-    ]),
+@functools.lru_cache(maxsize=1)
+def crear_layout():
+    """Layout del dashboard; se construye una vez, con los datos ya cargados"""
+    return dbc.Container([
+        # Header
+        dbc.Row([
+            dbc.Col([
+                html.H1("🏥 Residencias Alzheimer - Madrid", 
+                       className="text-center mt-4 mb-3",
+                       style={'color': '#2c3e50', 'fontWeight': 'bold'}),
+                html.P("Sistema de Recomendación Inteligente con Machine Learning", 
+                      className="text-center text-muted mb-3"),
+                dbc.Badge("✅ DEPLOY EN RENDER", color="success", className="mb-4 mx-2"),
+                dbc.Badge("🤖 ML ACTIVADO", color="info", className="mb-4 mx-2"),
+                dbc.Badge(f"📊 {len(df)} REGISTROS", color="warning", className="mb-4 mx-2")
+            ])
+        ]),
     
-    # Tabs para diferentes secciones
-    dbc.Tabs([
-        # Tab 1: Recomendaciones ML
-        dbc.Tab(label="🤖 Recomendaciones ML", tab_id="tab-recomendaciones", children=[
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card([
-                        dbc.CardHeader("🔍 Configurar Búsqueda Inteligente", className="bg-primary text-white"),
-                        dbc.CardBody([
-                            dbc.Row([
-                                dbc.Col([
-                                    html.Label("Distrito:", className="fw-bold mb-2"),
-                                    dcc.Dropdown(
-                                        id='distrito-dropdown',
-                                        options=[{'label': d, 'value': d} for d in distritos],
-                                        value='Todos',
-                                        placeholder="Seleccione distrito..."
-                                    )
-                                ], width=4),
-                                dbc.Col([
-                                    html.Label("Tramo de Edad:", className="fw-bold mb-2"),
-                                    dcc.Dropdown(
-                                        id='edad-dropdown',
-                                        options=[{'label': e, 'value': e} for e in edades],
-                                        value='Todos',
-                                        placeholder="Seleccione edad..."
-                                    )
-                                ], width=4),
-                                dbc.Col([
-                                    html.Label("Sexo:", className="fw-bold mb-2"),
-                                    dcc.Dropdown(
-                                        id='sexo-dropdown',
-                                        options=[{'label': s, 'value': s} for s in sexos],
-                                        value='Todos',
-                                        placeholder="Seleccione sexo..."
-                                    )
-                                ], width=4),
-                            ]),
-                            dbc.Row([
-                                dbc.Col([
-                                    html.Label("BVD Mínimo:", className="fw-bold mb-2"),
-                                    dcc.Slider(
-                                        id='bvd-slider',
-                                        min=0,
-                                        max=100,
-                                        step=5,
-                                        value=0,
-                                        marks={i: str(i) for i in range(0, 101, 20)},
-                                        tooltip={"placement": "bottom", "always_visible": True}
-                                    )
-                                ], width=12),
-                            ]),
-                            dbc.Button(
-                                "🎯 Generar Recomendaciones Inteligentes", 
-                                id='buscar-btn', 
-                                color="primary", 
-                                className="mt-4 w-100 py-2",
-                                n_clicks=0
-                            )
-                        ])
-                    ], className="mb-4")
-                ])
-            ]),
+        # Tabs para diferentes secciones
+        dbc.Tabs([
+            # Tab 1: Recomendaciones ML
+            dbc.Tab(label="🤖 Recomendaciones ML", tab_id="tab-recomendaciones", children=[
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card([
+                            dbc.CardHeader("🔍 Configurar Búsqueda Inteligente", className="bg-primary text-white"),
+                            dbc.CardBody([
+                                dbc.Row([
+                                    dbc.Col([
+                                        html.Label("Distrito:", className="fw-bold mb-2"),
+                                        dcc.Dropdown(
+                                            id='distrito-dropdown',
+                                            options=[{'label': d, 'value': d} for d in distritos],
+                                            value='Todos',
+                                            placeholder="Seleccione distrito..."
+                                        )
+                                    ], width=4),
+                                    dbc.Col([
+                                        html.Label("Tramo de Edad:", className="fw-bold mb-2"),
+                                        dcc.Dropdown(
+                                            id='edad-dropdown',
+                                            options=[{'label': e, 'value': e} for e in edades],
+                                            value='Todos',
+                                            placeholder="Seleccione edad..."
+                                        )
+                                    ], width=4),
+                                    dbc.Col([
+                                        html.Label("Sexo:", className="fw-bold mb-2"),
+                                        dcc.Dropdown(
+                                            id='sexo-dropdown',
+                                            options=[{'label': s, 'value': s} for s in sexos],
+                                            value='Todos',
+                                            placeholder="Seleccione sexo..."
+                                        )
+                                    ], width=4),
+                                ]),
+                                dbc.Row([
+                                    dbc.Col([
+                                        html.Label("BVD Mínimo:", className="fw-bold mb-2"),
+                                        dcc.Slider(
+                                            id='bvd-slider',
+                                            min=0,
+                                            max=100,
+                                            step=5,
+                                            value=0,
+                                            marks={i: str(i) for i in range(0, 101, 20)},
+                                            tooltip={"placement": "bottom", "always_visible": True}
+                                        )
+                                    ], width=12),
+                                ]),
+                                dbc.Button(
+                                    "🎯 Generar Recomendaciones Inteligentes", 
+                                    id='buscar-btn', 
+                                    color="primary", 
+                                    className="mt-4 w-100 py-2",
+                                    n_clicks=0
+                                )
+                            ])
+                        ], className="mb-4")
+                    ])
+                ]),
             
-            # Resultados de ML
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card([
-                        dbc.CardHeader("💡 Recomendaciones con Predicción ML", className="bg-success text-white"),
-                        dbc.CardBody(id='recomendaciones-output', children=[
-                            dbc.Alert(
-                                "👆 Configure los filtros y haga clic en 'Generar Recomendaciones Inteligentes'",
-                                color="info",
-                                className="text-center"
-                            )
+                # Resultados de ML
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card([
+                            dbc.CardHeader("💡 Recomendaciones con Predicción ML", className="bg-success text-white"),
+                            dbc.CardBody(id='recomendaciones-output', children=[
+                                dbc.Alert(
+                                    "👆 Configure los filtros y haga clic en 'Generar Recomendaciones Inteligentes'",
+                                    color="info",
+                                    className="text-center"
+                                )
+                            ])
                         ])
                     ])
-                ])
+                ]),
             ]),
-        ]),
         
-        # Tab 2: Análisis de Datos
-        dbc.Tab(label="📊 Análisis de Datos", tab_id="tab-analisis", children=[
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card([
-                        dbc.CardHeader("📈 Métricas Principales", className="bg-info text-white"),
-                        dbc.CardBody([
-                            dbc.Row([
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H4(f"{stats.get('total_personas', 0):,}", className="text-primary text-center"),
-                                            html.P("Personas en lista", className="text-center text-muted")
+            # Tab 2: Análisis de Datos
+            dbc.Tab(label="📊 Análisis de Datos", tab_id="tab-analisis", children=[
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card([
+                            dbc.CardHeader("📈 Métricas Principales", className="bg-info text-white"),
+                            dbc.CardBody([
+                                dbc.Row([
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H4(f"{stats.get('total_personas', 0):,}", className="text-primary text-center"),
+                                                html.P("Personas en lista", className="text-center text-muted")
+                                            ])
                                         ])
-                                    ])
-                                ], width=2),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H4(f"{stats.get('promedio_dias_espera', 0):.0f}", className="text-success text-center"),
-                                            html.P("Días promedio espera", className="text-center text-muted")
+                                    ], width=2),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H4(f"{stats.get('promedio_dias_espera', 0):.0f}", className="text-success text-center"),
+                                                html.P("Días promedio espera", className="text-center text-muted")
+                                            ])
                                         ])
-                                    ])
-                                ], width=2),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H4(f"{stats.get('promedio_bvd', 0):.1f}", className="text-warning text-center"),
-                                            html.P("BVD Promedio", className="text-center text-muted")
+                                    ], width=2),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H4(f"{stats.get('promedio_bvd', 0):.1f}", className="text-warning text-center"),
+                                                html.P("BVD Promedio", className="text-center text-muted")
+                                            ])
                                         ])
-                                    ])
-                                ], width=2),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H4(f"{stats.get('distritos_unicos', 0)}", className="text-danger text-center"),
-                                            html.P("Distritos", className="text-center text-muted")
+                                    ], width=2),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H4(f"{stats.get('distritos_unicos', 0)}", className="text-danger text-center"),
+                                                html.P("Distritos", className="text-center text-muted")
+                                            ])
                                         ])
-                                    ])
-                                ], width=2),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H4(f"{stats.get('mediana_bvd', 0):.1f}", className="text-info text-center"),
-                                            html.P("BVD Mediano", className="text-center text-muted")
+                                    ], width=2),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H4(f"{stats.get('mediana_bvd', 0):.1f}", className="text-info text-center"),
+                                                html.P("BVD Mediano", className="text-center text-muted")
+                                            ])
                                         ])
-                                    ])
-                                ], width=2),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H4(f"{df['MES_ENTRADA'].nunique() if len(df) > 0 else 0}", className="text-secondary text-center"),
-                                            html.P("Meses analizados", className="text-center text-muted")
+                                    ], width=2),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H4(f"{len(stats.get('tendencia_mensual', {}))}", className="text-secondary text-center"),
+                                                html.P("Meses analizados", className="text-center text-muted")
+                                            ])
                                         ])
-                                    ])
-                                ], width=2),
+                                    ], width=2),
+                                ])
                             ])
-                        ])
-                    ], className="mb-4")
-                ])
-            ]),
+                        ], className="mb-4")
+                    ])
+                ]),
             
-            # Gráficos principales
-            dbc.Row([
-                dbc.Col([dcc.Graph(id='grafico-distritos')], width=6),
-                dbc.Col([dcc.Graph(id='grafico-evolucion')], width=6),
-            ], className="mb-4"),
+                # Gráficos principales
+                dbc.Row([
+                    dbc.Col([dcc.Graph(id='grafico-distritos')], width=6),
+                    dbc.Col([dcc.Graph(id='grafico-evolucion')], width=6),
+                ], className="mb-4"),
             
-            dbc.Row([
-                dbc.Col([dcc.Graph(id='grafico-bvd-espera')], width=6),
-                dbc.Col([dcc.Graph(id='grafico-tiempo-espera')], width=6),
-            ], className="mb-4"),
+                dbc.Row([
+                    dbc.Col([dcc.Graph(id='grafico-bvd-espera')], width=6),
+                    dbc.Col([dcc.Graph(id='grafico-tiempo-espera')], width=6),
+                ], className="mb-4"),
             
-            dbc.Row([
-                dbc.Col([dcc.Graph(id='grafico-edad')], width=6),
-                dbc.Col([dcc.Graph(id='grafico-sexo')], width=6),
+                dbc.Row([
+                    dbc.Col([dcc.Graph(id='grafico-edad')], width=6),
+                    dbc.Col([dcc.Graph(id='grafico-sexo')], width=6),
+                ]),
             ]),
-        ]),
         
-        # Tab 3: Información del Modelo
-        dbc.Tab(label="🧠 Modelo ML", tab_id="tab-modelo", children=[
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card([
-                        dbc.CardHeader("🤖 Información del Modelo de Machine Learning", className="bg-dark text-white"),
-                        dbc.CardBody([
-                            html.H4("Random Forest Regressor", className="text-primary"),
-                            html.P("""
-                                Este modelo predice el tiempo de espera estimado (en días) para cada paciente 
-                                basándose en sus características demográficas y el Baremo de Valoración de la Dependencia (BVD).
-                            """),
+            # Tab 3: Información del Modelo
+            dbc.Tab(label="🧠 Modelo ML", tab_id="tab-modelo", children=[
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card([
+                            dbc.CardHeader("🤖 Información del Modelo de Machine Learning", className="bg-dark text-white"),
+                            dbc.CardBody([
+                                # Nombre y árboles del modelo servido: cambian con cada versión publicada
+                                html.H4(id='modelo-titulo', className="text-primary"),
+                                html.P("""
+                                    Este modelo predice el tiempo de espera estimado (en días) para cada paciente 
+                                    basándose en sus características demográficas y el Baremo de Valoración de la Dependencia (BVD).
+                                """),
                             
-                            html.H5("Características utilizadas:", className="mt-4"),
-                            html.Ul([
-                                html.Li("Distrito de residencia"),
-                                html.Li("Tramo de edad"),
-                                html.Li("Sexo"),
-                                html.Li("Baremo de Valoración de la Dependencia (BVD)")
-                            ]),
+                                html.H5("Características utilizadas:", className="mt-4"),
+                                html.Ul([
+                                    html.Li("Distrito de residencia"),
+                                    html.Li("Tramo de edad"),
+                                    html.Li("Sexo"),
+                                    html.Li("Baremo de Valoración de la Dependencia (BVD)")
+                                ]),
                             
-                            html.H5("Métricas del modelo:", className="mt-4"),
-                            dbc.Row([
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H5("100", className="text-center text-success"),
-                                            html.P("Árboles en el bosque", className="text-center")
+                                html.H5("Métricas del modelo:", className="mt-4"),
+                                dbc.Row([
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody(id='modelo-arboles')
                                         ])
-                                    ])
-                                ], width=4),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H5(f"{len(df)}", className="text-center text-info"),
-                                            html.P("Registros de entrenamiento", className="text-center")
+                                    ], width=4),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H5(f"{len(df)}", className="text-center text-info"),
+                                                html.P("Registros de entrenamiento", className="text-center")
+                                            ])
                                         ])
-                                    ])
-                                ], width=4),
-                                dbc.Col([
-                                    dbc.Card([
-                                        dbc.CardBody([
-                                            html.H5("4", className="text-center text-warning"),
-                                            html.P("Características principales", className="text-center")
+                                    ], width=4),
+                                    dbc.Col([
+                                        dbc.Card([
+                                            dbc.CardBody([
+                                                html.H5("4", className="text-center text-warning"),
+                                                html.P("Características principales", className="text-center")
+                                            ])
                                         ])
-                                    ])
-                                ], width=4),
-                            ]),
+                                    ], width=4),
+                                ]),
                             
-                            html.H5("Cómo funciona:", className="mt-4"),
-                            html.P("""
-                                El modelo analiza patrones históricos de asignación de plazas para predecir 
-                                cuántos días podría esperar un paciente con características específicas. 
-                                Las recomendaciones se priorizan combinando el BVD (mayor necesidad) con 
-                                el tiempo de espera predicho (menor espera estimada).
-                            """),
+                                html.H5("Cómo funciona:", className="mt-4"),
+                                html.P("""
+                                    El modelo analiza patrones históricos de asignación de plazas para predecir 
+                                    cuántos días podría esperar un paciente con características específicas. 
+                                    Las recomendaciones se priorizan combinando el BVD (mayor necesidad) con 
+                                    el tiempo de espera predicho (menor espera estimada).
+                                """),
                             
-                            html.Div(id='modelo-status', className="mt-4")
+                                html.Div(id='modelo-status', className="mt-4"),
+                                dcc.Interval(id='modelo-intervalo', interval=ML_CONFIG['INTERVALO_COMPROBACION'] * 1000)
+                            ])
                         ])
                     ])
                 ])
-            ])
-        ]),
+            ]),
         
-        # Tab 4: Datos Crudos
-        dbc.Tab(label="📋 Datos", tab_id="tab-datos", children=[
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card([
-                        dbc.CardHeader("📊 Vista de Datos", className="bg-secondary text-white"),
-                        dbc.CardBody([
-                            html.Div(id='tabla-datos-container')
+            # Tab 4: Datos Crudos
+            dbc.Tab(label="📋 Datos", tab_id="tab-datos", children=[
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card([
+                            dbc.CardHeader("📊 Vista de Datos", className="bg-secondary text-white"),
+                            dbc.CardBody([
+                                html.Div(id='tabla-datos-container')
+                            ])
                         ])
                     ])
                 ])
             ])
-        ])
-    ], id="tabs", active_tab="tab-recomendaciones", className="mt-4"),
+        ], id="tabs", active_tab="tab-recomendaciones", className="mt-4"),
     
-    # Footer
-    dbc.Row([
-        dbc.Col([
-            html.Hr(),
-            html.P(
-                "Sistema desarrollado con Dash | Modelo ML: Random Forest | "
-                "Datos: Ayuntamiento de Madrid | Deploy: Render",
-                className="text-center text-muted mt-4 small"
-            ),
-            html.P(
-                "Versión 2.0 - Sistema Inteligente de Recomendación",
-                className="text-center text-muted mb-4 small"
-            )
+        # Footer
+        dbc.Row([
+            dbc.Col([
+                html.Hr(),
+                html.P(id='pie-modelo', className="text-center text-muted mt-4 small"),
+                html.P(
+                    "Versión 2.0 - Sistema Inteligente de Recomendación",
+                    className="text-center text-muted mb-4 small"
+                )
+            ])
         ])
+    ], fluid=True, style={'padding': '20px'})
+
+def crear_pantalla_carga():
+    """Aviso mientras la carga diferida no ha terminado"""
+    if _carga['error']:
+        return dbc.Alert(f"Error cargando datos y modelo: {_carga['error']}", color="danger", className="mt-4")
+    return html.Div([
+        dbc.Spinner(color="primary"),
+        html.P("Cargando datos y modelo…", className="text-muted mt-3")
+    ], className="text-center mt-5")
+
+def servir_layout():
+    """Layout de cada carga de página: el dashboard o el aviso de carga"""
+    listo = datos_listos.is_set()
+    return html.Div([
+        dcc.Interval(id='arranque-intervalo', interval=1000, disabled=listo),
+        html.Div(crear_layout() if listo else crear_pantalla_carga(), id='contenido-app')
     ])
-], fluid=True, style={'padding': '20px'})
+
+app.layout = servir_layout
 
 # Callbacks
 
 @app.callback(
-    [Output('grafico-distritos', 'figure'),
-     Output('grafico-evolucion', 'figure'),
-     Output('grafico-bvd-espera', 'figure'),
-     Output('grafico-tiempo-espera', 'figure'),
-     Output('grafico-edad', 'figure'),
-     Output('grafico-sexo', 'figure')],
-    [Input('tabs', 'active_tab')]
+    [Output('contenido-app', 'children'),
+     Output('arranque-intervalo', 'disabled')],
+    [Input('arranque-intervalo', 'n_intervals')]
 )
-def actualizar_graficos(active_tab):
-    """Actualiza todos los gráficos cuando se cambia a la pestaña de análisis"""
-    if df.empty:
-        empty_fig = go.Figure()
-        empty_fig.add_annotation(text="No hay datos disponibles", showarrow=False)
-        return [empty_fig] * 6
-    
-    try:
-        fig1 = crear_grafico_top_distritos(df)  # Usamos el top 10
-        fig2 = crear_grafico_evolucion_temporal(df)
-        fig3 = crear_grafico_bvd_vs_espera(df)
-        fig4 = crear_grafico_tiempo_espera(df)
-        fig5 = crear_grafico_edad(df)
-        fig6 = crear_grafico_sexo(df)
-        
-        return fig1, fig2, fig3, fig4, fig5, fig6
-    except Exception as e:
-        print(f"Error creando gráficos: {e}")
-        empty_fig = go.Figure()
-        empty_fig.add_annotation(text=f"Error: {str(e)}", showarrow=False)
-        return [empty_fig] * 6
+def comprobar_arranque(n_intervals):
+    """Sustituye el aviso de carga por el dashboard cuando los datos están listos"""
+    if datos_listos.is_set():
+        return crear_layout(), True
+    if _carga['error']:
+        return crear_pantalla_carga(), True
+    raise PreventUpdate
+
+def registrar_grafico(id_grafico):
+    @app.callback(
+        Output(id_grafico, 'figure'),
+        [Input('tabs', 'active_tab')],
+        [State(id_grafico, 'figure')]
+    )
+    def actualizar_grafico(active_tab, figura):
+        """Dibuja el gráfico la primera vez que se abre la pestaña de análisis"""
+        if active_tab != 'tab-analisis' or (figura and figura.get('data')):
+            raise PreventUpdate
+        return obtener_figura(id_grafico)
+    return actualizar_grafico
+
+for id_grafico in GRAFICOS:
+    registrar_grafico(id_grafico)
 
 @app.callback(
     Output('recomendaciones-output', 'children'),
@@ -356,13 +523,9 @@ def generar_recomendaciones_ml(n_clicks, distrito, edad, sexo, bvd_min):
         )
     
     try:
-        # Filtrar por BVD mínimo
-        df_filtrado = df.copy()
-        if bvd_min > 0:
-            df_filtrado = df_filtrado[df_filtrado['BVD'] >= bvd_min]
-        
-        # Obtener recomendaciones con ML
-        recomendaciones = recomendar_residencia(df_filtrado, distrito, edad, sexo, modelo_ml)
+        # Obtener recomendaciones con ML (filtro por BVD mínimo incluido en el índice)
+        recomendaciones = cache_recomendaciones.recomendar(df, distrito, edad, sexo, modelo_servido(),
+                                                           bvd_min=bvd_min, indice=indice)
         
         if isinstance(recomendaciones, str):
             return dbc.Alert(recomendaciones, color="warning")
@@ -445,7 +608,7 @@ def generar_recomendaciones_ml(n_clicks, distrito, edad, sexo, bvd_min):
                     ], width=4),
                     dbc.Col([
                         html.P(f"Recomendaciones encontradas: {len(recomendaciones)}"),
-                        html.P(f"Modelo ML: Random Forest activado"),
+                        html.P(f"Modelo ML: {NOMBRES_ESTIMADOR[gestor_modelo.modelo.estimador]} activado"),
                     ], width=4),
                 ])
             ])
@@ -457,53 +620,135 @@ def generar_recomendaciones_ml(n_clicks, distrito, edad, sexo, bvd_min):
         print(f"Error generando recomendaciones: {e}")
         return dbc.Alert(f"Error al generar recomendaciones: {str(e)}", color="danger")
 
+@app.callback(
+    Output('pie-modelo', 'children'),
+    [Input('tabs', 'active_tab'),
+     Input('modelo-intervalo', 'n_intervals')]
+)
+def actualizar_pie_modelo(active_tab, n_intervals):
+    """Pie de página con el motor del modelo servido"""
+    return (f"Sistema desarrollado con Dash | Modelo ML: {NOMBRES_ESTIMADOR[gestor_modelo.modelo.estimador]} | "
+            "Datos: Ayuntamiento de Madrid | Deploy: Render")
+
+@app.callback(
+    [Output('modelo-titulo', 'children'),
+     Output('modelo-arboles', 'children')],
+    [Input('tabs', 'active_tab'),
+     Input('modelo-intervalo', 'n_intervals')]
+)
+def actualizar_descripcion_modelo(active_tab, n_intervals):
+    """Nombre y número de árboles del modelo servido (cambia al publicarse otra versión)"""
+    if active_tab != 'tab-modelo':
+        raise PreventUpdate
+    modelo_actual = gestor_modelo.modelo
+    arboles = [
+        html.H5(f"{numero_arboles(modelo_actual)}", className="text-center text-success"),
+        html.P("Árboles en el bosque" if modelo_actual.estimador == 'random_forest'
+               else "Iteraciones de boosting", className="text-center")
+    ]
+    return f"{NOMBRES_ESTIMADOR[modelo_actual.estimador]} Regressor", arboles
+
 @app.callback(
     Output('modelo-status', 'children'),
-    [Input('tabs', 'active_tab')]
+    [Input('tabs', 'active_tab'),
+     Input('modelo-intervalo', 'n_intervals')]
 )
-def actualizar_info_modelo(active_tab):
-    """Muestra el estado del modelo ML"""
-    if modelo_ml and modelo_ml.model:
-        return dbc.Alert(
-            "✅ Modelo ML cargado y listo para realizar predicciones",
+def actualizar_info_modelo(active_tab, n_intervals):
+    """Muestra el estado del modelo ML y del último entrenamiento"""
+    if active_tab != 'tab-modelo':
+        raise PreventUpdate
+    modelo_actual = gestor_modelo.modelo
+    if modelo_actual and modelo_actual.disponible:
+        version = modelo_actual.artefacto.get('version', '')
+        estado_modelo = dbc.Alert(
+            f"✅ Modelo ML cargado y listo para realizar predicciones ({version})",
             color="success"
         )
     else:
-        return dbc.Alert(
+        estado_modelo = dbc.Alert(
             "⚠️ Modelo ML no disponible. Se usarán criterios básicos para las recomendaciones.",
             color="warning"
         )
 
+    entrenamiento = gestor_modelo.estado()
+    textos = {
+        'en_curso': ("⏳ Entrenamiento en curso", "info"),
+        'completado': ("✅ Último entrenamiento publicado", "success"),
+        'rechazado': ("⚠️ Último entrenamiento rechazado en la validación", "warning"),
+        'error': ("❌ Último entrenamiento con error", "danger"),
+        'interrumpido': ("❌ Último entrenamiento interrumpido", "danger")
+    }
+    if entrenamiento.get('estado') not in textos:
+        return estado_modelo
+    texto, color = textos[entrenamiento['estado']]
+    detalles = [f"{texto}: {entrenamiento.get('filas', 0)} registros, "
+                f"{entrenamiento.get('duracion', 0):.0f} s"]
+    if entrenamiento.get('version'):
+        detalles.append(f" · versión {entrenamiento['version']}")
+    if entrenamiento.get('metricas'):
+        detalles.append(f" · MAE {entrenamiento['metricas']['MAE']:.2f}")
+    if entrenamiento.get('motivo'):
+        detalles.append(f" · {entrenamiento['motivo']}")
+    return html.Div([estado_modelo, dbc.Alert("".join(detalles), color=color)])
+
 @app.callback(
     Output('tabla-datos-container', 'children'),
-    [Input('tabs', 'active_tab')]
+    [Input('tabs', 'active_tab')],
+    [State('tabla-datos-container', 'children')]
 )
-def actualizar_tabla_datos(active_tab):
-    """Muestra la tabla de datos"""
+def actualizar_tabla_datos(active_tab, contenido):
+    """Muestra la tabla de datos la primera vez que se abre su pestaña"""
+    if active_tab != 'tab-datos' or contenido:
+        raise PreventUpdate
     if df.empty:
         return html.P("No hay datos disponibles")
     
-    # Crear tabla paginada
-    return dash_table.DataTable(
-        data=df.to_dict('records'),
-        columns=[{'name': col, 'id': col} for col in df.columns],
-        page_size=10,
-        style_table={'overflowX': 'auto'},
-        style_cell={
-            'textAlign': 'left',
-            'padding': '10px',
-            'whiteSpace': 'normal',
-            'height': 'auto',
-        },
-        style_header={
-            'backgroundColor': '#2c3e50',
-            'color': 'white',
-            'fontWeight': 'bold'
-        },
-        filter_action="native",
-        sort_action="native",
-        sort_mode="multi",
-    )
+    # Solo la estructura: cada página la sirve paginar_tabla_datos
+    return html.Div([
+        html.P(id='tabla-datos-resumen', className="text-muted small"),
+        dash_table.DataTable(
+            id='tabla-datos',
+            columns=tabla_datos.definicion_columnas(),
+            page_current=0,
+            page_size=APP_CONFIG['TABLA_TAMANO_PAGINA'],
+            page_action="custom",
+            style_table={'overflowX': 'auto'},
+            style_cell={
+                'textAlign': 'left',
+                'padding': '10px',
+                'whiteSpace': 'normal',
+                'height': 'auto',
+            },
+            style_header={
+                'backgroundColor': '#2c3e50',
+                'color': 'white',
+                'fontWeight': 'bold'
+            },
+            filter_action="custom",
+            filter_query='',
+            sort_action="custom",
+            sort_mode="multi",
+            sort_by=[],
+        )
+    ])
+
+@app.callback(
+    [Output('tabla-datos', 'data'),
+     Output('tabla-datos', 'page_count'),
+     Output('tabla-datos-resumen', 'children')],
+    [Input('tabla-datos', 'page_current'),
+     Input('tabla-datos', 'page_size'),
+     Input('tabla-datos', 'filter_query'),
+     Input('tabla-datos', 'sort_by')]
+)
+def paginar_tabla_datos(page_current, page_size, filter_query, sort_by):
+    """Devuelve solo la página pedida, filtrada y ordenada en el servidor"""
+    if tabla_datos is None:
+        raise PreventUpdate
+    registros, n_paginas, n_filas = tabla_datos.pagina(page_current, page_size, filter_query, sort_by)
+    return registros, n_paginas, f"{n_filas:,} registros" + (" (filtrados)" if filter_query else "")
 
 if __name__ == "__main__":
+    if gestor_modelo is not None:
+        gestor_modelo.comprobar_en_segundo_plano()
     app.run(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
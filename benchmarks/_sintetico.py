@@ -0,0 +1,59 @@
+"""
+Generación de datos sintéticos con el esquema de data/lista_espera.csv
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+os.chdir(RAIZ)
+
+from src.etl import DISTRITOS, TRAMOS_EDAD, SEXOS, limpiar_datos
+
+COLUMNAS_CSV = ['NUMERO_ORDEN', 'DNI', 'NOMBRE', 'TRAMO_EDAD', 'SEXO', 'DISTRITO_COD',
+                'DISTRITO', 'BVD', 'FECHA_DE_ENTRADA', 'FX_CARGA']
+
+def generar_crudo(filas, semilla=0, fx_carga='2025-10-26'):
+    """Genera un DataFrame crudo (como el CSV) con `filas` filas aleatorias"""
+    rng = np.random.default_rng(semilla)
+    distrito = rng.integers(0, len(DISTRITOS), filas)
+    bvd = np.round(rng.uniform(40, 100, filas), 2)
+    segundos = rng.integers(0, 500 * 86400, filas)
+    fechas = pd.Timestamp(fx_carga) - pd.to_timedelta(segundos, unit='s')
+    orden = np.argsort(-bvd, kind='stable')
+    df = pd.DataFrame({
+        'NUMERO_ORDEN': np.arange(1, filas + 1),
+        'DNI': [f"*****{n:03d}X" for n in rng.integers(0, 1000, filas)],
+        'NOMBRE': rng.choice(['AAA', 'MOO', 'FRS', 'JGP'], filas),
+        'TRAMO_EDAD': rng.choice(TRAMOS_EDAD, filas),
+        'SEXO': rng.choice(SEXOS, filas),
+        'DISTRITO_COD': distrito + 1,
+        'DISTRITO': np.array(DISTRITOS)[distrito],
+        'BVD': bvd,
+        'FECHA_DE_ENTRADA': fechas.strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'FX_CARGA': fx_carga
+    })
+    df = df.iloc[orden].reset_index(drop=True)
+    df['NUMERO_ORDEN'] = np.arange(1, filas + 1)
+    return df[COLUMNAS_CSV]
+
+def generar_df(filas, semilla=0):
+    """Genera un DataFrame limpio, como el que devuelve cargar_datos"""
+    return limpiar_datos(generar_crudo(filas, semilla))
+
+def generar_csv(ruta, filas, semilla=0, bloque=200000):
+    """Escribe un CSV sintético por bloques para no cargarlo entero en memoria"""
+    escritas = 0
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        while escritas < filas:
+            n = min(bloque, filas - escritas)
+            trozo = generar_crudo(n, semilla + escritas)
+            trozo['NUMERO_ORDEN'] += escritas
+            trozo.to_csv(f, sep=';', index=False, header=(escritas == 0))
+            escritas += n
+    return ruta
@@ -0,0 +1,88 @@
+"""
+Benchmark: predicciones concurrentes de una fila, directas frente a agrupadas
+
+Uso: python benchmarks/bench_agrupador.py [--clientes 1 8 32] [--llamadas 40] [--espera-ms 5]
+
+Entrena un bosque sobre datos sintéticos en un directorio temporal y, para
+el modelo de sklearn (n_jobs=-1 en directo, HILOS_PREDICCION agrupado) y
+para el bosque compilado, lanza --clientes hilos que piden cada uno --llamadas veces
+predecir_tiempo_espera de un paciente aleatorio, como los clics de varios
+usuarios a la vez. Compara llamar al modelo directamente con pasar por
+AgrupadorPredicciones: latencia p50/p99 por llamada, llamadas por segundo
+y llamadas por lote.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from _sintetico import generar_crudo, generar_df
+from config import ML_CONFIG
+from src.agrupador import AgrupadorPredicciones
+from src.artefactos import AlmacenModelos
+from src.model import ModeloPrediccion
+
+def medir(modelo, pacientes, clientes, llamadas):
+    """Latencias (s) de todas las llamadas y duración total con `clientes` hilos a la vez"""
+    latencias = [[] for _ in range(clientes)]
+    salida = threading.Barrier(clientes + 1)
+
+    def cliente(i):
+        rng = np.random.default_rng(i)
+        salida.wait()
+        for fila in rng.integers(0, len(pacientes), llamadas):
+            inicio = time.perf_counter()
+            resultado = modelo.predecir_tiempo_espera(*pacientes[fila])
+            latencias[i].append(time.perf_counter() - inicio)
+            assert isinstance(resultado, dict), resultado
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    salida.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    return np.concatenate(latencias), time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clientes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--llamadas', type=int, default=40)
+    parser.add_argument('--espera-ms', type=float, default=5)
+    parser.add_argument('--entrenamiento', type=int, default=20000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # entrenar_modelo guarda artefactos en el directorio actual: no pisar los del proyecto
+    os.chdir(tempfile.mkdtemp(prefix='bench_agrupador_'))
+    ModeloPrediccion('random_forest').entrenar_modelo(generar_df(args.entrenamiento, semilla=1))
+    crudo = generar_crudo(1000, semilla=2)
+    pacientes = list(zip(crudo['DISTRITO'], crudo['TRAMO_EDAD'], crudo['SEXO'], crudo['BVD'].astype(float)))
+
+    print(f"\n{'modelo':>10} {'modo':>9} {'clientes':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'llamadas/s':>10} {'por lote':>8}")
+    for nombre, compilado in [('sklearn', False), ('compilado', True)]:
+        modelo = ModeloPrediccion()
+        AlmacenModelos().cargar(modelo, compilado=compilado)
+        for clientes in args.clientes:
+            for modo in ('directo', 'agrupado'):
+                # Un agrupador nuevo por medida; el directo usa todos los núcleos (n_jobs=-1)
+                agrupador = AgrupadorPredicciones(espera_ms=args.espera_ms)
+                if modelo.model is not None:
+                    modelo.model.n_jobs = -1 if modo == 'directo' else ML_CONFIG['HILOS_PREDICCION']
+                servido = modelo if modo == 'directo' else agrupador.envolver(modelo)
+                medir(servido, pacientes, clientes, 3)  # calentamiento
+                latencias, duracion = medir(servido, pacientes, clientes, args.llamadas)
+                por_lote = agrupador.estadisticas()['llamadas_por_lote'] if modo == 'agrupado' else 1
+                print(f"{nombre:>10} {modo:>9} {clientes:>8} {np.percentile(latencias, 50) * 1000:>9.2f} "
+                      f"{np.percentile(latencias, 99) * 1000:>9.2f} {len(latencias) / duracion:>10.0f} "
+                      f"{por_lote:>8.1f}")
+
+if __name__ == '__main__':
+    main()
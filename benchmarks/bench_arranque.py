@@ -0,0 +1,134 @@
+"""
+Benchmark: tiempo de arranque del worker web con y sin carga diferida
+
+Uso: python benchmarks/bench_arranque.py [--filas 0] [--top 15] [--puerto 8766] [--sin-gunicorn]
+
+1. Perfil de imports (python -X importtime -c "import app") con
+   CARGA_DIFERIDA=0 y =1: tiempo total, tiempo propio agrupado por paquete
+   raíz y si sklearn o plotly.express llegaron a importarse. Con carga
+   diferida el tiempo de import es solo código; con carga normal incluye
+   además leer datos, cubo, índice y modelo (tiempo propio de `app`).
+2. Con gunicorn (un worker, sin preload) mide cuánto tarda "/" en responder
+   y cuánto hasta que /_dash-layout sirve el dashboard completo.
+
+Con --filas N se usa un CSV sintético de N filas en un directorio temporal
+(con su modelo ya entrenado) en lugar de data/lista_espera.csv.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+from _sintetico import RAIZ, generar_csv
+
+def entorno(diferida, **extra):
+    return dict(os.environ, CARGA_DIFERIDA='1' if diferida else '0', PYTHONPATH=RAIZ, **extra)
+
+def preparar(filas):
+    """Directorio de trabajo con un CSV de `filas` filas y su modelo entrenado"""
+    directorio = tempfile.mkdtemp(prefix='bench_arranque_')
+    os.makedirs(os.path.join(directorio, 'data'))
+    generar_csv(os.path.join(directorio, 'data', 'lista_espera.csv'), filas)
+    # El primer arranque lanza el entrenamiento en segundo plano; se espera a que publique
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=directorio, env=entorno(False),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    limite = time.time() + 600
+    while not os.path.exists(os.path.join(directorio, 'modelos', 'ACTUAL')):
+        if time.time() > limite:
+            raise RuntimeError('el modelo no se publicó a tiempo')
+        time.sleep(1)
+    return directorio
+
+def perfil_imports(directorio, diferida):
+    """Líneas de -X importtime como (propio_us, acumulado_us, nivel, módulo)"""
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=directorio, env=entorno(diferida), capture_output=True, text=True,
+                            check=True).stderr
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        nivel = (len(nombre) - len(nombre.lstrip())) // 2
+        filas.append((int(propio), int(acumulado), nivel, nombre.strip()))
+    return filas
+
+def resumir(filas, top):
+    total = next(acumulado for _, acumulado, _, nombre in filas if nombre == 'app')
+    por_paquete = defaultdict(int)
+    for propio, _, _, nombre in filas:
+        por_paquete[nombre.split('.')[0]] += propio
+    modulos = {nombre for *_, nombre in filas}
+    return {
+        'total_s': total / 1e6,
+        'app_propio_s': next(propio for propio, _, _, nombre in filas if nombre == 'app') / 1e6,
+        'sklearn': any(m.split('.')[0] == 'sklearn' for m in modulos),
+        'plotly.express': 'plotly.express' in modulos,
+        'paquetes': sorted(por_paquete.items(), key=lambda p: -p[1])[:top]
+    }
+
+def medir_gunicorn(directorio, diferida, puerto):
+    """Segundos hasta que "/" responde y hasta que el layout trae el dashboard"""
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:server',
+         '--config', os.path.join(RAIZ, 'gunicorn.conf.py'), '--bind', f'127.0.0.1:{puerto}'],
+        cwd=directorio, env=entorno(diferida, GUNICORN_PRELOAD='0', WEB_CONCURRENCY='1'),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        primera = None
+        while True:
+            try:
+                if primera is None:
+                    urllib.request.urlopen(f'http://127.0.0.1:{puerto}/', timeout=5).read()
+                    primera = time.perf_counter() - inicio
+                layout = json.loads(urllib.request.urlopen(
+                    f'http://127.0.0.1:{puerto}/_dash-layout', timeout=30).read())
+                if '"tabs"' in json.dumps(layout):
+                    return primera, time.perf_counter() - inicio
+            except OSError:
+                if proceso.poll() is not None:
+                    raise RuntimeError('gunicorn terminó antes de responder')
+            time.sleep(0.1)
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, default=0)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--puerto', type=int, default=8766)
+    parser.add_argument('--sin-gunicorn', action='store_true')
+    args = parser.parse_args()
+
+    directorio = preparar(args.filas) if args.filas else RAIZ
+    resumenes = {}
+    for diferida in (False, True):
+        # Se descarta una primera ejecución: la caché de bytecode y del disco ya caliente
+        perfil_imports(directorio, diferida)
+        resumenes[diferida] = resumir(perfil_imports(directorio, diferida), args.top)
+
+    for diferida, resumen in resumenes.items():
+        print(f"\nCARGA_DIFERIDA={int(diferida)}: import app {resumen['total_s']:.2f} s "
+              f"(propio de app {resumen['app_propio_s']:.2f} s), "
+              f"sklearn={'sí' if resumen['sklearn'] else 'no'}, "
+              f"plotly.express={'sí' if resumen['plotly.express'] else 'no'}")
+        for paquete, propio in resumen['paquetes']:
+            print(f"  {paquete:<28} {propio / 1000:8.1f} ms")
+
+    if not args.sin_gunicorn:
+        print(f"\n{'modo':>10}  {'/ responde (s)':>14}  {'dashboard listo (s)':>19}")
+        for diferida in (False, True):
+            primera, lista = medir_gunicorn(directorio, diferida, args.puerto)
+            print(f"{'diferida' if diferida else 'normal':>10}  {primera:14.2f}  {lista:19.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: bosque compilado (bosque.npz) frente al pickle de sklearn
+
+Uso: python benchmarks/bench_bosque_compilado.py [--entrenamiento 20000] [--lote 100000]
+
+Entrena un bosque sobre datos sintéticos en un directorio temporal y, en un
+subproceso nuevo por variante, mide el tiempo de importar y cargar el
+modelo, el RSS tras la carga, si sklearn llegó a importarse y la latencia
+de predecir_lote para 1 fila (mediana) y para --lote filas.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import warnings
+
+from _sintetico import RAIZ, generar_df
+from src.model import ModeloPrediccion
+
+CODIGO = """
+import json, statistics, sys, time, warnings
+warnings.filterwarnings('ignore')
+inicio = time.perf_counter()
+sys.path.insert(0, {raiz!r})
+from src.artefactos import AlmacenModelos
+from src.model import ModeloPrediccion
+modelo = ModeloPrediccion()
+AlmacenModelos().cargar(modelo, compilado={compilado})
+carga = time.perf_counter() - inicio
+with open('/proc/self/status') as f:
+    rss = next(int(l.split()[1]) for l in f if l.startswith('VmRSS'))
+import pandas as pd
+lote = pd.read_pickle({lote!r})
+fila = lote.head(1)
+tiempos = []
+for _ in range(50):
+    t = time.perf_counter(); modelo.predecir_lote(fila); tiempos.append(time.perf_counter() - t)
+t = time.perf_counter(); modelo.predecir_lote(lote); tiempo_lote = time.perf_counter() - t
+print(json.dumps({{'carga': carga, 'rss': rss / 1024, 'fila_ms': statistics.median(tiempos) * 1000,
+                  'lote': tiempo_lote, 'sklearn': any(m.startswith('sklearn') for m in sys.modules)}}))
+"""
+
+def medir(directorio, compilado, lote):
+    codigo = CODIGO.format(raiz=RAIZ, compilado=compilado, lote=lote)
+    salida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True,
+                            check=True, cwd=directorio).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entrenamiento', type=int, default=20000)
+    parser.add_argument('--lote', type=int, default=100000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # entrenar_modelo guarda artefactos en el directorio actual: no pisar los del proyecto
+    directorio = tempfile.mkdtemp(prefix='bench_bosque_')
+    os.chdir(directorio)
+    ModeloPrediccion('random_forest').entrenar_modelo(generar_df(args.entrenamiento, semilla=1))
+    ruta_lote = os.path.join(directorio, 'lote.pkl')
+    generar_df(args.lote, semilla=2).to_pickle(ruta_lote)
+
+    print(f"{'variante':>10} {'carga (s)':>10} {'RSS (MB)':>9} {'sklearn':>8} {'1 fila (ms)':>12} {'lote (s)':>9}")
+    for nombre, compilado in [('pickle', False), ('compilado', True)]:
+        r = medir(directorio, compilado, ruta_lote)
+        print(f"{nombre:>10} {r['carga']:>10.2f} {r['rss']:>9.0f} {'sí' if r['sklearn'] else 'no':>8} "
+              f"{r['fila_ms']:>12.2f} {r['lote']:>9.3f}")
+
+if __name__ == '__main__':
+    main()
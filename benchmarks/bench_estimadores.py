@@ -0,0 +1,73 @@
+"""
+Benchmark: Random Forest frente a Histogram Gradient Boosting
+
+Uso: python benchmarks/bench_estimadores.py [--entrenamiento 20000 200000] [--lote 100000]
+
+Para cada motor de ML_CONFIG mide, con el mismo reparto entrenamiento/test
+de entrenar_modelo: tiempo de ajuste, latencia de una predicción
+(predecir_tiempo_espera, mediana de --repeticiones llamadas), tiempo de
+predecir_lote sobre --lote filas, tamaño del modelo en disco y MAE/RMSE.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import warnings
+
+from _sintetico import generar_df
+from src.artefactos import AlmacenModelos, FICHEROS
+from src.model import ESTIMADORES, ModeloPrediccion
+
+def medir(estimador, entrenamiento, lote, repeticiones):
+    modelo = ModeloPrediccion(estimador)
+    inicio = time.perf_counter()
+    modelo.entrenar_modelo(entrenamiento)
+    ajuste = time.perf_counter() - inicio
+
+    fila = lote.iloc[0]
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        modelo.predecir_tiempo_espera(fila['DISTRITO_NOMBRE'], fila['TRAMO_EDAD'], fila['SEXO'], fila['BVD'])
+        tiempos.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    modelo.predecir_lote(lote)
+    duracion_lote = time.perf_counter() - inicio
+
+    almacen = AlmacenModelos()
+    tamano = os.path.getsize(os.path.join(almacen.directorio, almacen.actual(), FICHEROS['modelo']))
+    return {
+        'ajuste': ajuste,
+        'fila_ms': statistics.median(tiempos) * 1000,
+        'lote': duracion_lote,
+        'mib': tamano / 2 ** 20,
+        'MAE': modelo.metrics['MAE'],
+        'RMSE': modelo.metrics['RMSE']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entrenamiento', type=int, nargs='+', default=[20000, 200000])
+    parser.add_argument('--lote', type=int, default=100000)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # entrenar_modelo guarda artefactos en el directorio actual: no pisar los del proyecto
+    os.chdir(tempfile.mkdtemp(prefix='bench_estimadores_'))
+    lote = generar_df(args.lote, semilla=2)
+
+    print(f"{'filas':>8} {'motor':>24} {'ajuste (s)':>10} {'1 fila (ms)':>12} "
+          f"{'lote (s)':>9} {'disco (MiB)':>12} {'MAE':>7} {'RMSE':>7}")
+    for filas in args.entrenamiento:
+        entrenamiento = generar_df(filas, semilla=1)
+        for estimador in ESTIMADORES:
+            r = medir(estimador, entrenamiento, lote, args.repeticiones)
+            print(f"{filas:>8} {estimador:>24} {r['ajuste']:>10.2f} {r['fila_ms']:>12.2f} "
+                  f"{r['lote']:>9.3f} {r['mib']:>12.1f} {r['MAE']:>7.2f} {r['RMSE']:>7.2f}")
+
+if __name__ == '__main__':
+    main()
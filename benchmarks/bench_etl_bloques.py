@@ -0,0 +1,63 @@
+"""
+Benchmark: memoria pico de cargar_datos frente a procesar_csv_en_bloques
+
+Uso: python benchmarks/bench_etl_bloques.py [--filas 50000 500000 2000000]
+
+Cada medición corre en un subproceso nuevo y se toma su RSS máximo
+(VmHWM de /proc, que a diferencia de ru_maxrss no hereda el pico del
+proceso padre), de modo que la carga completa crece con el tamaño del CSV
+y la versión por bloques se mantiene plana.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _sintetico import RAIZ, generar_csv
+
+CODIGO = """
+import sys, time
+sys.path.insert(0, {raiz!r})
+from src.etl import cargar_datos, obtener_estadisticas_avanzadas, procesar_csv_en_bloques
+inicio = time.perf_counter()
+if {modo!r} == 'completo':
+    obtener_estadisticas_avanzadas(cargar_datos({ruta!r}, usar_cache=False))
+else:
+    procesar_csv_en_bloques({ruta!r}, salida={salida!r}, tam_bloque={bloque})
+duracion = time.perf_counter() - inicio
+with open('/proc/self/status') as f:
+    hwm = next(l.split()[1] for l in f if l.startswith('VmHWM'))
+print(duracion, hwm)
+"""
+
+def medir(modo, ruta, salida, bloque):
+    """Ejecuta un modo en un subproceso y devuelve (segundos, MiB de RSS máximo)"""
+    codigo = CODIGO.format(raiz=RAIZ, modo=modo, ruta=ruta, salida=salida, bloque=bloque)
+    resultado = subprocess.run([sys.executable, '-c', codigo], capture_output=True,
+                               text=True, check=True, cwd=RAIZ)
+    segundos, rss_kib = resultado.stdout.strip().splitlines()[-1].split()
+    return float(segundos), int(rss_kib) / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, nargs='+', default=[50000, 500000, 2000000])
+    parser.add_argument('--bloque', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'filas':>10} {'modo':>10} {'tiempo (s)':>11} {'RSS máx (MiB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for filas in args.filas:
+            ruta = os.path.join(tmp, f'lista_{filas}.csv')
+            salida = os.path.join(tmp, f'limpio_{filas}.csv')
+            inicio = time.perf_counter()
+            generar_csv(ruta, filas)
+            print(f"# CSV de {filas} filas generado en {time.perf_counter() - inicio:.1f} s")
+            for modo in ['completo', 'bloques']:
+                segundos, rss = medir(modo, ruta, salida, args.bloque)
+                print(f"{filas:>10} {modo:>10} {segundos:>11.2f} {rss:>14.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: construir cada figura frente a servirla precompilada desde disco
+
+Uso: python benchmarks/bench_figuras.py [--filas 200000] [--repeticiones 20]
+
+Para cada gráfico de la pestaña de análisis mide construirlo con
+src.graphics y serializarlo (lo que hacía cada petición sin caché), leerlo
+de AlmacenFiguras (fichero + gunzip + json.loads, lo que hace un worker la
+primera vez) y el tamaño del JSON en claro y en gzip.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from _sintetico import generar_df
+from src.cubo import construir_cubo
+from src.figuras import AlmacenFiguras
+from src.graphics import (
+    crear_grafico_top_distritos, crear_grafico_evolucion_temporal, crear_grafico_bvd_vs_espera,
+    crear_grafico_tiempo_espera, crear_grafico_edad, crear_grafico_sexo
+)
+
+def mediana_ms(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, default=200000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    df = generar_df(args.filas)
+    cubo = construir_cubo(df)
+    graficos = {
+        'distritos': lambda: crear_grafico_top_distritos(cubo),
+        'evolucion': lambda: crear_grafico_evolucion_temporal(cubo),
+        'bvd-espera': lambda: crear_grafico_bvd_vs_espera(df),
+        'tiempo-espera': lambda: crear_grafico_tiempo_espera(cubo),
+        'edad': lambda: crear_grafico_edad(cubo),
+        'sexo': lambda: crear_grafico_sexo(cubo)
+    }
+    directorio = tempfile.mkdtemp(prefix='bench_figuras_')
+    try:
+        almacen = AlmacenFiguras(directorio, comprimir=True)
+        almacen.precompilar('bench', graficos)
+        print(f"\n{'figura':>14}  {'construir (ms)':>14}  {'disco (ms)':>10}  {'JSON (KiB)':>10}  {'gzip (KiB)':>10}")
+        for nombre, construir in graficos.items():
+            t_construir = mediana_ms(lambda: construir().to_json(), args.repeticiones)
+            t_disco = mediana_ms(lambda: almacen.obtener('bench', nombre, construir), args.repeticiones)
+            kib_json = len(almacen.leer('bench', nombre).encode()) / 1024
+            kib_gzip = os.path.getsize(almacen.ruta('bench', nombre)) / 1024
+            print(f"{nombre:>14}  {t_construir:14.1f}  {t_disco:10.2f}  {kib_json:10.1f}  {kib_gzip:10.1f}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark: tamaño y tiempo de las figuras con filas crudas frente a agregadas
+
+Uso: python benchmarks/bench_graficos.py [--filas 1000 10000 100000 1000000]
+
+Para el scatter BVD/espera y el histograma de días compara la versión
+anterior (px.scatter con hover por fila, px.histogram con la columna
+cruda) con crear_grafico_bvd_vs_espera y crear_grafico_tiempo_espera, que
+eligen SVG, WebGL o densidad según las filas y agregan los bins en el
+servidor. Mide el JSON de la figura (lo que viaja al navegador) y el tiempo
+de construirla y serializarla.
+"""
+
+import argparse
+import time
+
+import plotly.express as px
+
+from _sintetico import generar_df
+from src.graphics import crear_grafico_bvd_vs_espera, crear_grafico_tiempo_espera
+
+def scatter_anterior(df):
+    return px.scatter(df, x='BVD', y='DIAS_EN_ESPERA', color='TRAMO_EDAD',
+                      hover_data=['DISTRITO_NOMBRE', 'SEXO'])
+
+def histograma_anterior(df):
+    return px.histogram(df, x='DIAS_EN_ESPERA', nbins=20)
+
+def medir(crear, df):
+    inicio = time.perf_counter()
+    json_figura = crear(df).to_json()
+    return len(json_figura.encode()) / 1024, time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'figura':>10}  {'filas':>8}  {'antes (KiB)':>11}  {'antes (s)':>9}  "
+          f"{'ahora (KiB)':>11}  {'ahora (s)':>9}")
+    for filas in args.filas:
+        df = generar_df(filas)
+        for nombre, anterior, actual in [('scatter', scatter_anterior, crear_grafico_bvd_vs_espera),
+                                         ('histograma', histograma_anterior, crear_grafico_tiempo_espera)]:
+            kib_antes, t_antes = medir(anterior, df)
+            kib_ahora, t_ahora = medir(actual, df)
+            print(f"{nombre:>10}  {filas:>8}  {kib_antes:11.0f}  {t_antes:9.2f}  "
+                  f"{kib_ahora:11.1f}  {t_ahora:9.2f}")
+
+if __name__ == '__main__':
+    main()
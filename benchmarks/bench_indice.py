@@ -0,0 +1,65 @@
+"""
+Benchmark: filtro con máscaras + nlargest frente a IndiceRecomendacion
+
+Uso: python benchmarks/bench_indice.py [--filas 2000000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from _sintetico import generar_df
+from src.indice import IndiceRecomendacion
+
+CONSULTAS = [
+    ("Todos", "Todos", "Todos", 0),
+    ("LATINA", "Todos", "Todos", 50),
+    ("Todos", ">=85", "MUJER", 80),
+    ("MORATALAZ", "80 - 84", "HOMBRE", 95),
+]
+
+def filtrar_con_mascaras(df, distrito, edad, sexo, bvd_min):
+    """Camino anterior: copia, máscaras y nlargest"""
+    filtrado = df.copy()
+    if bvd_min > 0:
+        filtrado = filtrado[filtrado['BVD'] >= bvd_min]
+    if distrito != "Todos":
+        filtrado = filtrado[filtrado['DISTRITO_NOMBRE'] == distrito]
+    if edad != "Todos":
+        filtrado = filtrado[filtrado['TRAMO_EDAD'] == edad]
+    if sexo != "Todos":
+        filtrado = filtrado[filtrado['SEXO'] == sexo]
+    return filtrado.nlargest(5, 'BVD')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, default=2000000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    df = generar_df(args.filas)
+    inicio = time.perf_counter()
+    indice = IndiceRecomendacion(df)
+    construccion = time.perf_counter() - inicio
+    memoria = (indice.orden.nbytes + indice.bvd_descendente.nbytes
+               + sum(r.nbytes for r, _ in indice.grupos.values()))
+    print(f"{args.filas} filas: índice construido en {construccion:.2f} s, {memoria / 2**20:.0f} MiB")
+
+    print(f"{'consulta':>42} {'máscaras (ms)':>14} {'índice (ms)':>12}")
+    for consulta in CONSULTAS:
+        tiempos = {}
+        for nombre, funcion in [('mascaras', lambda: filtrar_con_mascaras(df, *consulta)),
+                                ('indice', lambda: indice.seleccionar(*consulta, k=5))]:
+            muestras = []
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                resultado = funcion()
+                muestras.append(time.perf_counter() - inicio)
+            tiempos[nombre] = np.median(muestras) * 1000
+            tiempos[nombre + '_filas'] = resultado.index.tolist()
+        assert tiempos['mascaras_filas'] == tiempos['indice_filas']
+        print(f"{str(consulta):>42} {tiempos['mascaras']:>14.1f} {tiempos['indice']:>12.3f}")
+
+if __name__ == '__main__':
+    main()
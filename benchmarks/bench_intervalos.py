@@ -0,0 +1,53 @@
+"""
+Benchmark: coste de los intervalos por árbol frente a un predict simple
+
+Uso: python benchmarks/bench_intervalos.py [--filas 1000 100000 1000000]
+
+Compara, con el bosque de ML_CONFIG entrenado sobre datos sintéticos:
+model.predict (sin intervalo), _predecir_con_intervalo (apply + una
+indexación sobre el vector de hojas + cuantiles, por bloques) y el
+recorrido ingenuo de un predict por árbol apilado.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from _sintetico import generar_df
+from src.model import CATEGORICAS, FEATURES, ModeloPrediccion
+
+def cronometrar(funcion):
+    inicio = time.perf_counter()
+    funcion()
+    return time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--entrenamiento', type=int, default=20000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # entrenar_modelo guarda artefactos en el directorio actual: no pisar los del proyecto
+    os.chdir(tempfile.mkdtemp(prefix='bench_intervalos_'))
+    modelo = ModeloPrediccion('random_forest')
+    modelo.entrenar_modelo(generar_df(args.entrenamiento, semilla=1))
+
+    print(f"{'filas':>10} {'predict (s)':>12} {'intervalo (s)':>14} {'sobrecoste':>11} {'por árbol (s)':>14}")
+    for filas in args.filas:
+        df = generar_df(filas, semilla=2)
+        X = df.assign(**{c + '_encoded': modelo.codificar_columna(c, df[c]) for c in CATEGORICAS})[FEATURES]
+        simple = cronometrar(lambda: modelo.model.predict(X))
+        intervalo = cronometrar(lambda: modelo._predecir_con_intervalo(X))
+        valores = X.to_numpy(dtype=np.float32)
+        ingenuo = cronometrar(lambda: np.quantile(
+            np.stack([t.predict(valores) for t in modelo.model.estimators_], axis=1),
+            [0.05, 0.95], axis=1))
+        print(f"{filas:>10} {simple:>12.3f} {intervalo:>14.3f} {intervalo / simple:>10.2f}x {ingenuo:>14.3f}")
+
+if __name__ == '__main__':
+    main()
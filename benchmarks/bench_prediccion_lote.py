@@ -0,0 +1,52 @@
+"""
+Benchmark: predecir_lote frente a predecir_tiempo_espera fila a fila
+
+Uso: python benchmarks/bench_prediccion_lote.py [--filas 1000 100000 1000000]
+
+El camino fila a fila se mide sobre como mucho --muestra filas y se
+extrapola linealmente al tamaño completo (se indica con '~').
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+from _sintetico import generar_df
+from src.model import ModeloPrediccion
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--muestra', type=int, default=2000)
+    parser.add_argument('--entrenamiento', type=int, default=20000)
+    args = parser.parse_args()
+
+    # sklearn avisa en cada llamada fila a fila de que X no tiene nombres de columnas
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # entrenar_modelo guarda artefactos en el directorio actual: no pisar los del proyecto
+    os.chdir(tempfile.mkdtemp(prefix='bench_modelo_'))
+    modelo = ModeloPrediccion()
+    modelo.entrenar_modelo(generar_df(args.entrenamiento, semilla=1))
+
+    print(f"{'filas':>10} {'fila a fila (s)':>16} {'lote (s)':>10} {'aceleración':>12}")
+    for filas in args.filas:
+        df = generar_df(filas, semilla=2)
+
+        muestra = df.head(min(filas, args.muestra))
+        inicio = time.perf_counter()
+        for _, fila in muestra.iterrows():
+            modelo.predecir_tiempo_espera(fila['DISTRITO_NOMBRE'], fila['TRAMO_EDAD'],
+                                          fila['SEXO'], fila['BVD'])
+        por_fila = (time.perf_counter() - inicio) * filas / len(muestra)
+        marca = '~' if len(muestra) < filas else ' '
+
+        inicio = time.perf_counter()
+        modelo.predecir_lote(df)
+        lote = time.perf_counter() - inicio
+
+        print(f"{filas:>10} {marca}{por_fila:>15.2f} {lote:>10.3f} {por_fila / lote:>11.0f}x")
+
+if __name__ == '__main__':
+    main()
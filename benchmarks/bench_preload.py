@@ -0,0 +1,75 @@
+"""
+Benchmark: memoria de gunicorn con y sin preload_app
+
+Uso: python benchmarks/bench_preload.py [--workers 2 4] [--puerto 8765]
+
+Arranca gunicorn con gunicorn.conf.py, espera a que "/" responda y suma el
+PSS (memoria proporcional: las páginas compartidas se reparten entre los
+procesos que las usan) del master y sus workers desde
+/proc/<pid>/smaps_rollup. Con preload los datos y el modelo viven en
+páginas compartidas copy-on-write y el total apenas crece con los workers.
+Solo Linux.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from _sintetico import RAIZ
+
+def pss_kib(pid):
+    """PSS de un proceso en KiB"""
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        return next(int(l.split()[1]) for l in f if l.startswith('Pss:'))
+
+def hijos(pid):
+    """PIDs de los procesos hijos directos"""
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+def medir(preload, workers, puerto):
+    """Devuelve (segundos hasta responder, MiB de PSS total, procesos)"""
+    entorno = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0',
+                   WEB_CONCURRENCY=str(workers))
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:server', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{puerto}'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{puerto}/', timeout=5).read()
+                break
+            except OSError:
+                if proceso.poll() is not None:
+                    raise RuntimeError('gunicorn terminó antes de responder')
+                time.sleep(0.2)
+        # Una petición por worker para que todos hayan cargado la app
+        for _ in range(workers * 2):
+            urllib.request.urlopen(f'http://127.0.0.1:{puerto}/', timeout=30).read()
+        duracion = time.perf_counter() - inicio
+        pids = [proceso.pid] + hijos(proceso.pid)
+        return duracion, sum(pss_kib(p) for p in pids) / 1024, len(pids)
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--puerto', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'preload':>8} {'arranque':>10} {'PSS total':>10}")
+    for workers in args.workers:
+        for preload in (False, True):
+            duracion, pss, _ = medir(preload, workers, args.puerto)
+            print(f"{workers:>8} {'sí' if preload else 'no':>8} {duracion:>9.1f}s {pss:>8.0f}MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: score de recomendación sobre todos los candidatos del filtro
+
+Uso: python benchmarks/bench_recomendacion.py [--filas 1000000] [--presupuesto-ms 100]
+
+Entrena un bosque sobre datos sintéticos en un directorio temporal y, con
+--filas candidatos, mide:
+
+1. El cálculo único del vector de esperas (predecir_filas), que se hace una
+   vez por snapshot de datos y versión del modelo (al precalentar).
+2. La latencia de recomendar_residencia por consulta, que puntúa todas las
+   filas del filtro, frente al camino anterior (top-5 por BVD, predicción
+   y score de esas cinco). Falla si alguna consulta supera el presupuesto.
+3. Cuántas de las recomendaciones nuevas quedaban fuera del top-5 por BVD,
+   es decir, que el camino anterior no llegaba a puntuar.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+from _sintetico import generar_df
+from src.indice import IndiceRecomendacion
+from src.model import ModeloPrediccion, recomendar_residencia
+
+CONSULTAS = [
+    ("Todos", "Todos", "Todos", 0),
+    ("Todos", "Todos", "MUJER", 0),
+    ("LATINA", "Todos", "Todos", 50),
+    ("Todos", ">=85", "MUJER", 80),
+    ("MORATALAZ", "80 - 84", "HOMBRE", 95),
+]
+
+def top5_por_bvd(df, modelo, indice, distrito, edad, sexo, bvd_min):
+    """Camino anterior: solo se puntúan las cinco filas de mayor BVD"""
+    candidatos = indice.seleccionar(distrito, edad, sexo, bvd_min, k=5)
+    predicciones = modelo.predecir_lote(candidatos)
+    score = candidatos['BVD'] * 0.7 + (100 - predicciones['prediccion'].clip(upper=100)) * 0.3
+    return candidatos.index[score.to_numpy().argsort(kind='stable')[::-1][:3]]
+
+def mediana_ms(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000, max(tiempos) * 1000, resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, default=1000000)
+    parser.add_argument('--entrenamiento', type=int, default=20000)
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--presupuesto-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # entrenar_modelo guarda artefactos en el directorio actual: no pisar los del proyecto
+    os.chdir(tempfile.mkdtemp(prefix='bench_recomendacion_'))
+    modelo = ModeloPrediccion('random_forest')
+    modelo.entrenar_modelo(generar_df(args.entrenamiento, semilla=1))
+    df = generar_df(args.filas, semilla=2)
+    indice = IndiceRecomendacion(df)
+
+    inicio = time.perf_counter()
+    modelo.predecir_filas(df)
+    print(f"\nVector de esperas de {args.filas} filas (una vez por datos y modelo): "
+          f"{time.perf_counter() - inicio:.2f} s")
+
+    print(f"\n{'consulta':>42} {'candidatos':>10} {'top-5 (ms)':>10} {'todos (ms)':>10} "
+          f"{'máx. (ms)':>9} {'fuera del top-5':>15}")
+    excedidas = 0
+    for consulta in CONSULTAS:
+        candidatos = len(indice.posiciones(*consulta))
+        anterior, _, _ = mediana_ms(lambda: top5_por_bvd(df, modelo, indice, *consulta), args.repeticiones)
+        nuevo, maximo, resultado = mediana_ms(
+            lambda: recomendar_residencia(df, *consulta[:3], modelo, bvd_min=consulta[3], indice=indice),
+            args.repeticiones)
+        top5 = set(indice.posiciones(*consulta, k=5).tolist())
+        fuera = 0
+        if not isinstance(resultado, str):
+            bvd_top5 = df['BVD'].to_numpy()[sorted(top5)].min()
+            fuera = sum(r['BVD'] < bvd_top5 for r in resultado)
+        excedidas += maximo > args.presupuesto_ms
+        print(f"{str(consulta):>42} {candidatos:>10} {anterior:>10.2f} {nuevo:>10.2f} "
+              f"{maximo:>9.2f} {fuera:>15}")
+
+    if excedidas:
+        print(f"\n{excedidas} consultas superan el presupuesto de {args.presupuesto_ms:.0f} ms")
+        sys.exit(1)
+    print(f"\nTodas las consultas por debajo de {args.presupuesto_ms:.0f} ms")
+
+if __name__ == '__main__':
+    main()
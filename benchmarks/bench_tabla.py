@@ -0,0 +1,49 @@
+"""
+Benchmark: pestaña de datos con todas las filas frente a paginada en el servidor
+
+Uso: python benchmarks/bench_tabla.py [--filas 10000 100000 1000000]
+
+Compara el JSON que recibía el navegador (df.to_dict('records') completo)
+con el de una página de TablaDatos, y mide la latencia de la primera
+consulta (filtro + orden, sin caché) y de pasar de página (posiciones ya
+calculadas).
+"""
+
+import argparse
+import json
+import time
+
+from _sintetico import generar_df
+from src.tabla import TablaDatos
+
+CONSULTA = '{BVD} >= 60 && {DISTRITO_NOMBRE} icontains "la"'
+ORDEN = [{'column_id': 'DIAS_EN_ESPERA', 'direction': 'desc'}, {'column_id': 'BVD', 'direction': 'asc'}]
+
+def kib_json(registros):
+    return len(json.dumps(registros, default=str).encode()) / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'filas':>9}  {'todo (KiB)':>11}  {'todo (s)':>8}  {'página (KiB)':>12}  "
+          f"{'consulta (ms)':>13}  {'pasar página (ms)':>17}")
+    for filas in args.filas:
+        df = generar_df(filas)
+        inicio = time.perf_counter()
+        todo = kib_json(df.to_dict('records'))
+        tiempo_todo = time.perf_counter() - inicio
+
+        tabla = TablaDatos(df)
+        inicio = time.perf_counter()
+        registros, _, _ = tabla.pagina(0, 10, CONSULTA, ORDEN)
+        consulta = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        tabla.pagina(5, 10, CONSULTA, ORDEN)
+        pasar = time.perf_counter() - inicio
+        print(f"{filas:>9}  {todo:11.0f}  {tiempo_todo:8.2f}  {kib_json(registros):12.1f}  "
+              f"{consulta * 1000:13.1f}  {pasar * 1000:17.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Prueba de carga de la API REST (/api/v1) contra un gunicorn local
+
+Uso: python benchmarks/carga_api.py [--endpoint predict] [--formato ndjson] [--pacientes 50000]
+                                    [--peticiones 8] [--concurrencia 2] [--filas 0] [--puerto 8767] [--url URL]
+
+Arranca gunicorn con la configuración del proyecto (o usa --url), espera
+a que la API deje de responder 503 y lanza --peticiones peticiones de
+--pacientes filas cada una con --concurrencia clientes a la vez. Para
+recommend cada fila es un filtro (distrito, edad, sexo, bvd_min) tomado
+de los pacientes. Mide por petición el tiempo hasta las cabeceras (el
+primer bloque ya calculado), el tiempo total leyendo la respuesta en
+streaming y las filas por segundo del conjunto.
+
+Con --filas N el servidor usa un CSV sintético de N filas en un
+directorio temporal (con su modelo ya entrenado) en lugar de
+data/lista_espera.csv.
+"""
+
+import argparse
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from _sintetico import RAIZ, generar_crudo
+from bench_arranque import entorno, preparar
+
+TIPOS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def cuerpo(endpoint, formato, pacientes):
+    """Cuerpo de la petición con `pacientes` filas sintéticas"""
+    crudo = generar_crudo(pacientes, semilla=3).rename(columns={'DISTRITO': 'DISTRITO_NOMBRE'})
+    if endpoint == 'predict':
+        filas = crudo[['DNI', 'DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO', 'BVD']].rename(columns={'DNI': 'id'})
+    else:
+        filas = crudo[['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO', 'BVD']].set_axis(
+            ['distrito', 'edad', 'sexo', 'bvd_min'], axis=1)
+        filas['bvd_min'] = (filas['bvd_min'] // 10 * 10).astype(int)
+    if formato == 'csv':
+        return filas.to_csv(sep=';', index=False).encode()
+    return filas.to_json(orient='records', lines=True, force_ascii=False).encode()
+
+def peticion(url, endpoint, formato, datos):
+    """Tiempo hasta las cabeceras, tiempo total, filas recibidas y cabeceras de tiempo"""
+    destino = urlparse(url)
+    conexion = http.client.HTTPConnection(destino.hostname, destino.port, timeout=600)
+    inicio = time.perf_counter()
+    conexion.request('POST', f'/api/v1/{endpoint}', body=datos,
+                     headers={'Content-Type': TIPOS[formato], 'Content-Length': str(len(datos))})
+    respuesta = conexion.getresponse()
+    cabeceras = time.perf_counter() - inicio
+    if respuesta.status != 200:
+        raise RuntimeError(f"HTTP {respuesta.status}: {respuesta.read()[:200]!r}")
+    lineas = 0
+    while True:
+        trozo = respuesta.read(1 << 16)
+        if not trozo:
+            break
+        lineas += trozo.count(b'\n')
+    total = time.perf_counter() - inicio
+    conexion.close()
+    return {'cabeceras': cabeceras, 'total': total, 'lineas': lineas - (formato == 'csv'),
+            'servidor': respuesta.getheader('Server-Timing')}
+
+def esperar_api(url, proceso=None, limite=600):
+    """Espera a que /api/v1/predict deje de responder 503 (datos y modelo cargados)"""
+    fin = time.time() + limite
+    while time.time() < fin:
+        try:
+            peticion(url, 'predict', 'ndjson',
+                     b'{"DISTRITO_NOMBRE": "CENTRO", "TRAMO_EDAD": ">=85", "SEXO": "MUJER", "BVD": 80}\n')
+            return
+        except (OSError, RuntimeError):
+            if proceso is not None and proceso.poll() is not None:
+                raise RuntimeError('gunicorn terminó antes de responder')
+            time.sleep(0.5)
+    raise RuntimeError('la API no respondió a tiempo')
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endpoint', choices=['predict', 'recommend'], default='predict')
+    parser.add_argument('--formato', choices=list(TIPOS), default='ndjson')
+    parser.add_argument('--pacientes', type=int, default=50000)
+    parser.add_argument('--peticiones', type=int, default=8)
+    parser.add_argument('--concurrencia', type=int, default=2)
+    parser.add_argument('--filas', type=int, default=0)
+    parser.add_argument('--puerto', type=int, default=8767)
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    datos = cuerpo(args.endpoint, args.formato, args.pacientes)
+    proceso = None
+    url = args.url
+    if url is None:
+        url = f'http://127.0.0.1:{args.puerto}'
+        directorio = preparar(args.filas) if args.filas else RAIZ
+        proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:server',
+             '--config', os.path.join(RAIZ, 'gunicorn.conf.py'), '--bind', f'127.0.0.1:{args.puerto}'],
+            cwd=directorio, env=entorno(False, WEB_CONCURRENCY=str(args.concurrencia)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_api(url, proceso)
+        # Una petición de calentamiento: vector de esperas, cachés y bytecode
+        peticion(url, args.endpoint, args.formato, datos)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrencia) as clientes:
+            resultados = list(clientes.map(lambda _: peticion(url, args.endpoint, args.formato, datos),
+                                           range(args.peticiones)))
+        duracion = time.perf_counter() - inicio
+    finally:
+        if proceso is not None:
+            proceso.send_signal(signal.SIGTERM)
+            proceso.wait(timeout=30)
+
+    cabeceras = [r['cabeceras'] * 1000 for r in resultados]
+    totales = [r['total'] for r in resultados]
+    filas = sum(r['lineas'] for r in resultados)
+    print(f"{args.peticiones} peticiones {args.endpoint}/{args.formato} de {args.pacientes} filas "
+          f"({len(datos) / 2**20:.1f} MiB), concurrencia {args.concurrencia}")
+    print(f"  cabeceras (primer bloque): p50 {statistics.median(cabeceras):.0f} ms, "
+          f"p95 {percentil(cabeceras, 95):.0f} ms")
+    print(f"  petición completa:         p50 {statistics.median(totales):.2f} s, "
+          f"p95 {percentil(totales, 95):.2f} s")
+    print(f"  filas devueltas: {filas} en {duracion:.2f} s -> {filas / duracion:,.0f} filas/s")
+    print(f"  Server-Timing de la última: {resultados[-1]['servidor']}")
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@
 Configuración de la aplicación
 """
 
+import os
+
 # Configuración de la aplicación
 APP_CONFIG = {
     'DEBUG': False,
@@ -9,7 +11,29 @@ APP_CONFIG = {
     'DESCRIPTION': 'Sistema de recomendación con Machine Learning para plazas en residencias',
     'AUTHOR': 'Equipo ML',
     'VERSION': '2.0.0',
-    'DATA_PATH': 'data/lista_espera.csv'
+    'DATA_PATH': 'data/lista_espera.csv',
+    'CACHE_DIR': 'data/cache',
+    'COMPACT_DATA': False,
+    'CHUNK_SIZE': 100000,
+    'SNAPSHOT_DIR': 'data/snapshots',
+    # Origen de los datos de la app: 'csv' (DATA_PATH) o 'snapshots' (la
+    # última extracción del almacén de SNAPSHOT_DIR, python -m src.ingesta)
+    'FUENTE_DATOS': os.environ.get('FUENTE_DATOS', 'csv'),
+    # Cargar datos y modelo en un hilo tras arrancar cada worker: el servidor
+    # (y el health check de /) responde desde el primer momento, pero con
+    # preload los datos ya no se comparten entre workers
+    'CARGA_DIFERIDA': os.environ.get('CARGA_DIFERIDA', '0') == '1',
+    # Pestaña de datos: paginada en el servidor y sin datos personales
+    'TABLA_TAMANO_PAGINA': 10,
+    'TABLA_COLUMNAS_OCULTAS': ['DNI', 'NOMBRE'],
+    # Figuras compiladas a JSON por snapshot en CACHE_DIR/figuras
+    'PRECOMPILAR_FIGURAS': True,
+    'FIGURAS_GZIP': True,
+    'FIGURAS_SNAPSHOTS_CONSERVADOS': 3,
+    # API REST (/api/v1): tamaño máximo del cuerpo y filas por bloque
+    # procesado y enviado de una vez
+    'API_MAX_BYTES': 64 * 1024 * 1024,
+    'API_BLOQUE_FILAS': 5000
 }
 
 # Configuración del modelo ML
@@ -19,7 +43,89 @@ ML_CONFIG = {
     'METRICS_PATH': 'modelo_metrics.pkl',
     'N_ESTIMATORS': 100,
     'RANDOM_STATE': 42,
-    'TEST_SIZE': 0.2
+    # Motor de entrenamiento: 'random_forest' o 'hist_gradient_boosting'
+    'ESTIMADOR': os.environ.get('ML_ESTIMADOR', 'random_forest'),
+    'PARAMETROS_ESTIMADOR': {
+        'random_forest': {
+            'max_depth': 10,
+            'min_samples_split': 5,
+            'min_samples_leaf': 2,
+            'n_jobs': -1
+        },
+        'hist_gradient_boosting': {
+            'max_iter': 200,
+            'learning_rate': 0.1,
+            'max_leaf_nodes': 31,
+            'min_samples_leaf': 20
+        }
+    },
+    # Búsqueda de hiperparámetros (python -m src.ajuste [estimador])
+    'ESPACIO_BUSQUEDA': {
+        'random_forest': {
+            'n_estimators': [50, 100, 200],
+            'max_depth': [6, 10, None],
+            'min_samples_leaf': [1, 2, 5]
+        },
+        'hist_gradient_boosting': {
+            'max_iter': [100, 200, 400],
+            'learning_rate': [0.05, 0.1, 0.2],
+            'max_leaf_nodes': [15, 31, 63]
+        }
+    },
+    'AJUSTE_PARTICIONES': 4,
+    'AJUSTE_FACTOR': 3,
+    'AJUSTE_MIN_MUESTRAS': 1000,
+    'AJUSTE_PROCESOS': None,
+    # Intervalo de predicción: cuantiles de los árboles (bosque) o modelos de cuantiles
+    'INTERVALO_CUANTILES': [0.05, 0.95],
+    'BLOQUE_PREDICCION': 50000,
+    # Servir los bosques desde sus arrays planos (bosque.npz) sin importar sklearn
+    'BOSQUE_COMPILADO': True,
+    'TEST_SIZE': 0.2,
+    'USAR_TABLA': False,
+    # Cada modelo compila su tabla en TABLA_PATH con su huella (modelo_tabla_<huella>.npy)
+    'TABLA_PATH': 'modelo_tabla.npy',
+    'TABLA_RESOLUCION_BVD': 0.01,
+    'LOCK_PATH': 'modelo_espera.lock',
+    'ARTEFACTOS_DIR': 'modelos',
+    'VERSIONES_CONSERVADAS': 5,
+    # Reentrenamiento en otro proceso; la versión nueva solo se publica si
+    # su MAE no empeora el del modelo activo en más de TOLERANCIA_MAE
+    'ENTRENAMIENTO_SEGUNDO_PLANO': True,
+    'TOLERANCIA_MAE': 0.10,
+    'MAE_MAXIMO': None,
+    'INTERVALO_COMPROBACION': 30,
+    # Recomendaciones: se puntúan todas las filas del filtro con
+    # PESO_BVD·BVD + PESO_ESPERA·(ESPERA_MAX − min(espera, ESPERA_MAX))
+    # y se devuelven las RECOMENDACIONES_K mejores
+    'RECOMENDACION_PESO_BVD': 0.7,
+    'RECOMENDACION_PESO_ESPERA': 0.3,
+    'RECOMENDACION_ESPERA_MAX': 100,
+    'RECOMENDACIONES_K': 3,
+    # Predicciones concurrentes de pocas filas (src.agrupador): se juntan
+    # durante AGRUPAR_ESPERA_MS (0 = sin agrupar) o hasta AGRUPAR_MAX_FILAS
+    # filas y se predicen de una vez con HILOS_PREDICCION hilos (el n_jobs
+    # del bosque de sklearn o los hilos de OpenMP del gradient boosting, que
+    # se fijan a este valor al entrenar o cargar el modelo). Una llamada sin
+    # lote en AGRUPAR_TIEMPO_MAXIMO_S segundos predice directamente
+    'AGRUPAR_ESPERA_MS': 5,
+    'AGRUPAR_MAX_FILAS': 4096,
+    'AGRUPAR_TIEMPO_MAXIMO_S': 10,
+    'HILOS_PREDICCION': 1
+}
+
+# Configuración de cachés
+CACHE_CONFIG = {
+    'RECOMENDACIONES_MAX': 4096,
+    'PRECALENTAR_RECOMENDACIONES': 50,
+    # Caché compartida entre workers: 'memoria', 'disco' (SQLite) o 'redis'
+    # ('redis_local': la interfaz de Redis sobre memoria, para pruebas sin servidor)
+    'BACKEND': os.environ.get('CACHE_BACKEND', 'disco'),
+    'DISCO_PATH': 'data/cache/dash_cache.sqlite',
+    'REDIS_URL': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    'TTL': 24 * 3600,
+    # Consultas (filtro + orden) de la tabla de datos cuyas posiciones se guardan
+    'TABLA_CONSULTAS_MAX': 32
 }
 
 # Configuración de visualización
@@ -31,5 +137,10 @@ VISUALIZATION_CONFIG = {
         'danger': '#e74c3c',
         'info': '#17a2b8'
     },
-    'CHART_TEMPLATE': 'plotly_white'
+    'CHART_TEMPLATE': 'plotly_white',
+    # Scatter BVD/espera: SVG con hover hasta UMBRAL_SCATTER filas, WebGL
+    # hasta UMBRAL_WEBGL y, por encima, mapa de densidad de BINS_DENSIDAD
+    'UMBRAL_SCATTER': 5000,
+    'UMBRAL_WEBGL': 50000,
+    'BINS_DENSIDAD': 60
 }
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Configuración de gunicorn
+
+Con preload_app el master importa app.py (datos, cubo, índice y modelo) una
+sola vez antes de hacer fork; los workers comparten esa memoria
+copy-on-write. GUNICORN_PRELOAD=0 vuelve al arranque independiente por
+worker. Con CARGA_DIFERIDA=1 el master solo importa el código y cada worker
+carga datos y modelo en un hilo nada más arrancar: cada worker tiene su
+propia copia, así que con preload anula el reparto copy-on-write. Es un
+modo opcional (desactivado en render.yaml) para arrancar rápido con un
+solo worker o sin preload.
+"""
+
+import gc
+import os
+import sys
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Varios hilos por worker (gthread): las peticiones simultáneas comparten
+# datos y modelo del worker y sus predicciones se agrupan en un lote
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 120
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+def pre_fork(server, worker):
+    # Los objetos cargados en el master pasan a la generación permanente del
+    # GC: las colecciones de los workers no los recorren ni ensucian sus páginas
+    gc.collect()
+    gc.freeze()
+
+def when_ready(server):
+    modulo = sys.modules.get('app')
+    if preload_app and modulo is not None and modulo.APP_CONFIG['CARGA_DIFERIDA']:
+        server.log.warning("CARGA_DIFERIDA con preload: cada worker cargará su propia copia "
+                           "de datos y modelo (GUNICORN_PRELOAD=0 o CARGA_DIFERIDA=0)")
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} listo (preload={'sí' if preload_app else 'no'})")
+
+def post_worker_init(worker):
+    # Con CARGA_DIFERIDA la carga empieza ya, sin esperar a la primera petición
+    modulo = sys.modules.get('app')
+    if modulo is not None and hasattr(modulo, 'iniciar_carga') and modulo.APP_CONFIG['CARGA_DIFERIDA']:
+        modulo.iniciar_carga()
+    # Primera comprobación de modelo y datos ya en el worker: el entrenamiento
+    # pendiente del arranque nunca se lanza desde el master
+    elif getattr(modulo, 'gestor_modelo', None) is not None:
+        modulo.gestor_modelo.comprobar_en_segundo_plano()
@@ -5,24 +5,44 @@ Paquete src para el sistema de residencias Alzheimer
 __version__ = "2.0.0"
 __author__ = "Equipo ML"
 
-from .etl import cargar_datos, obtener_estadisticas_avanzadas, cargar_o_entrenar_modelo
-from .graphics import (
-    crear_grafico_distritos,
-    crear_grafico_edad,
-    crear_grafico_sexo,
-    crear_grafico_evolucion_temporal,
-    crear_grafico_tiempo_espera,
-    crear_grafico_bvd_vs_espera,
-    crear_grafico_top_distritos,
-    crear_grafico_bvd_distribucion,
-    crear_grafico_correlacion
-)
-from .model import ModeloPrediccion, recomendar_residencia
+# Los submódulos se importan al pedir el nombre (PEP 562): `import src` no
+# arrastra pandas, plotly ni sklearn hasta que hacen falta
+_ORIGENES = {
+    'cargar_datos': 'etl',
+    'obtener_estadisticas_avanzadas': 'etl',
+    'cargar_o_entrenar_modelo': 'etl',
+    'CuboAgregados': 'cubo',
+    'construir_cubo': 'cubo',
+    'crear_grafico_distritos': 'graphics',
+    'crear_grafico_edad': 'graphics',
+    'crear_grafico_sexo': 'graphics',
+    'crear_grafico_evolucion_temporal': 'graphics',
+    'crear_grafico_tiempo_espera': 'graphics',
+    'crear_grafico_bvd_vs_espera': 'graphics',
+    'crear_grafico_top_distritos': 'graphics',
+    'crear_grafico_bvd_distribucion': 'graphics',
+    'crear_grafico_correlacion': 'graphics',
+    'ModeloPrediccion': 'model',
+    'recomendar_residencia': 'model'
+}
+
+def __getattr__(nombre):
+    if nombre not in _ORIGENES:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    import importlib
+    valor = getattr(importlib.import_module(f'.{_ORIGENES[nombre]}', __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
+def __dir__():
+    return sorted(list(globals()) + list(_ORIGENES))
 
 __all__ = [
     'cargar_datos',
     'obtener_estadisticas_avanzadas',
     'cargar_o_entrenar_modelo',
+    'CuboAgregados',
+    'construir_cubo',
     'crear_grafico_distritos',
     'crear_grafico_edad',
     'crear_grafico_sexo',
@@ -0,0 +1,204 @@
+"""
+Agrupación de predicciones concurrentes en lotes (micro-batching)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+from config import ML_CONFIG
+from src.model import CATEGORICAS
+
+COLUMNAS_ENTRADA = CATEGORICAS + ['BVD']
+
+class _Pendiente:
+    """Una llamada a predecir_lote esperando su parte del lote"""
+
+    def __init__(self, modelo, df):
+        self.modelo = modelo
+        self.df = df
+        self.llegada = time.monotonic()
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        # El lote no se pudo hacer (fallo del propio agrupador): predecir directo
+        self.directo = False
+
+class AgrupadorPredicciones:
+    """Junta las llamadas concurrentes a predecir_lote en una sola
+
+    Cada llamada se encola y espera. Un hilo del proceso recoge lo que llega
+    durante `espera_ms` desde la primera llamada pendiente (o hasta juntar
+    `max_filas` filas), hace una única predicción por modelo y devuelve a
+    cada llamada sus filas, con su índice. La ventana
+    solo se abre cuando ya hay más de una llamada pendiente: una llamada
+    sola sale en cuanto el hilo queda libre, así que un usuario solo no la
+    paga y, con carga, lo que llega mientras se calcula un lote forma el
+    siguiente. Así muchos
+    clics a la vez cuestan una pasada por el bosque en lugar de una por
+    clic, y el bosque de sklearn no arranca su pool de hilos (n_jobs=-1)
+    para una sola fila (los hilos de predicción se fijan una vez al cargar
+    el modelo, ver src.artefactos.fijar_hilos_prediccion). Las llamadas de
+    `max_filas` filas o más ya son un lote y van directas. Con `espera_ms=0`
+    no se agrupa nada.
+
+    Si el lote no llega en `tiempo_maximo` segundos (el hilo del agrupador
+    ha muerto o está atascado) o el agrupador falla fuera de la
+    predicción, la llamada predice directamente con el modelo.
+    """
+
+    def __init__(self, espera_ms=None, max_filas=None, tiempo_maximo=None):
+        self.espera = (ML_CONFIG['AGRUPAR_ESPERA_MS'] if espera_ms is None else espera_ms) / 1000
+        self.max_filas = max_filas or ML_CONFIG['AGRUPAR_MAX_FILAS']
+        self.tiempo_maximo = tiempo_maximo or ML_CONFIG['AGRUPAR_TIEMPO_MAXIMO_S']
+        self._cola = deque()
+        self._filas_en_cola = 0
+        self._condicion = threading.Condition()
+        self._pid = None
+        self._hilo = None
+        self.lotes = 0
+        self.llamadas = 0
+        self.filas = 0
+
+    def envolver(self, modelo):
+        """El modelo con predecir_lote y predecir_tiempo_espera pasando por el agrupador"""
+        return ModeloAgrupado(modelo, self)
+
+    def predecir(self, modelo, df):
+        """modelo.predecir_lote(df), agrupado con las demás llamadas en curso"""
+        if self.espera <= 0 or len(df) >= self.max_filas:
+            return modelo.predecir_lote(df)
+        pendiente = _Pendiente(modelo, df)
+        with self._condicion:
+            self._arrancar()
+            self._cola.append(pendiente)
+            self._filas_en_cola += len(df)
+            self._condicion.notify()
+        if not pendiente.listo.wait(self.tiempo_maximo):
+            with self._condicion:
+                if pendiente in self._cola:
+                    self._cola.remove(pendiente)
+                    self._filas_en_cola -= len(df)
+            print(f"Agrupador sin respuesta en {self.tiempo_maximo} s: predicción directa")
+            return modelo.predecir_lote(df)
+        if pendiente.directo:
+            return modelo.predecir_lote(df)
+        if pendiente.error is not None:
+            raise pendiente.error
+        return pendiente.resultado
+
+    def _arrancar(self):
+        # El hilo no sobrevive al fork de gunicorn (uno por proceso) y se
+        # vuelve a lanzar si ha terminado por un error
+        if self._pid != os.getpid() or not self._hilo.is_alive():
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name='agrupador-predicciones', daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            lote = []
+            try:
+                with self._condicion:
+                    while not self._cola:
+                        self._condicion.wait()
+                    limite = self._cola[0].llegada + self.espera
+                    while len(self._cola) > 1 and self._filas_en_cola < self.max_filas:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            break
+                        self._condicion.wait(restante)
+                    filas = 0
+                    while self._cola and (not lote or filas + len(self._cola[0].df) <= self.max_filas):
+                        pendiente = self._cola.popleft()
+                        lote.append(pendiente)
+                        filas += len(pendiente.df)
+                    self._filas_en_cola -= filas
+                self._ejecutar(lote)
+            except Exception as e:
+                # Los errores del modelo ya van en cada llamada; esto es un
+                # fallo del agrupador: sus llamadas predicen directamente
+                print(f"Error en el agrupador de predicciones: {e}")
+                for pendiente in lote:
+                    if not pendiente.listo.is_set():
+                        pendiente.directo = True
+                        pendiente.listo.set()
+
+    def _ejecutar(self, lote):
+        """Una predicción por modelo del lote (un cambio de versión en caliente puede mezclar dos)"""
+        grupos = {}
+        for pendiente in lote:
+            grupos.setdefault(id(pendiente.modelo), []).append(pendiente)
+        for pendientes in grupos.values():
+            try:
+                if len(pendientes) == 1:
+                    entrada = pendientes[0].df
+                else:
+                    entrada = pd.concat([p.df[COLUMNAS_ENTRADA] for p in pendientes], ignore_index=True)
+                resultado = pendientes[0].modelo.predecir_lote(entrada)
+                inicio = 0
+                for p in pendientes:
+                    if len(pendientes) == 1:
+                        p.resultado = resultado
+                        break
+                    parte = resultado.iloc[inicio:inicio + len(p.df)].copy()
+                    parte.index = p.df.index
+                    p.resultado = parte
+                    inicio += len(p.df)
+                self.lotes += 1
+                self.llamadas += len(pendientes)
+                self.filas += len(entrada)
+            except Exception as e:
+                for p in pendientes:
+                    p.error = e
+            finally:
+                for p in pendientes:
+                    p.listo.set()
+
+    def estadisticas(self):
+        return {
+            'lotes': self.lotes,
+            'llamadas': self.llamadas,
+            'filas': self.filas,
+            'llamadas_por_lote': self.llamadas / self.lotes if self.lotes else 0.0
+        }
+
+class ModeloAgrupado:
+    """ModeloPrediccion cuyas predicciones de pocas filas pasan por un AgrupadorPredicciones
+
+    El resto de atributos y métodos (version, disponible, predecir_filas...)
+    son los del modelo envuelto.
+    """
+
+    def __init__(self, modelo, agrupador):
+        self._modelo = modelo
+        self._agrupador = agrupador
+
+    def __getattr__(self, nombre):
+        return getattr(self._modelo, nombre)
+
+    def predecir_lote(self, df):
+        return self._agrupador.predecir(self._modelo, df)
+
+    def predecir_tiempo_espera(self, distrito, edad, sexo, bvd):
+        """Como ModeloPrediccion.predecir_tiempo_espera, como una fila de un lote"""
+        try:
+            if not self._modelo.disponible:
+                return "Modelo no disponible"
+            fila = pd.DataFrame({'DISTRITO_NOMBRE': [distrito], 'TRAMO_EDAD': [edad],
+                                 'SEXO': [sexo], 'BVD': [bvd]})
+            prediccion = self.predecir_lote(fila).iloc[0]
+            if not prediccion['valido']:
+                return prediccion['motivo']
+            return {
+                'prediccion': int(prediccion['prediccion']),
+                'intervalo_min': int(prediccion['intervalo_min']),
+                'intervalo_max': int(prediccion['intervalo_max']),
+                'confianza': float(prediccion['confianza'])
+            }
+        except Exception as e:
+            print(f"Error en predicción: {e}")
+            return f"Error en predicción: {str(e)}"
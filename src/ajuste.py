@@ -0,0 +1,189 @@
+"""
+Búsqueda de hiperparámetros con validación cruzada temporal y successive halving
+"""
+
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from threadpoolctl import threadpool_limits
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import ParameterGrid
+from sklearn.preprocessing import LabelEncoder
+
+from config import APP_CONFIG, ML_CONFIG
+
+# Datos de la búsqueda en cada proceso del pool (se envían una vez, al arrancarlo)
+_DATOS = {}
+
+def _iniciar_proceso(X, y, particiones):
+    _DATOS.update(X=X, y=y, particiones=particiones)
+
+def particiones_temporales(fechas, n_particiones):
+    """Particiones de ventana creciente ordenadas por fecha
+
+    Cada partición entrena con todo lo anterior a su bloque de validación,
+    así que el modelo nunca ve filas posteriores a las que valida.
+    """
+    orden = np.argsort(fechas, kind='stable')
+    bloques = np.array_split(orden, n_particiones + 1)
+    return [(np.concatenate(bloques[:i]), bloques[i]) for i in range(1, n_particiones + 1)]
+
+def _evaluar(estimador, parametros, particion, muestras):
+    """Ajusta en una partición con las `muestras` filas más recientes; devuelve MAE y tiempos"""
+    from src.model import crear_estimador
+
+    entrenamiento, validacion = _DATOS['particiones'][particion]
+    entrenamiento = entrenamiento[-muestras:]
+    X, y = _DATOS['X'], _DATOS['y']
+    # Un solo hilo por tarea (joblib y OpenMP): el paralelismo lo pone el pool de procesos
+    extra = {'n_jobs': 1} if estimador == 'random_forest' else {}
+    modelo = crear_estimador(estimador, **parametros, **extra)
+
+    with threadpool_limits(1):
+        inicio = time.perf_counter()
+        modelo.fit(X[entrenamiento], y[entrenamiento])
+        ajuste = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        prediccion = modelo.predict(X[validacion])
+        prediccion_s = time.perf_counter() - inicio
+    return {
+        'MAE': float(mean_absolute_error(y[validacion], prediccion)),
+        'ajuste_s': ajuste,
+        'prediccion_us_fila': prediccion_s / len(validacion) * 1e6
+    }
+
+def _clave(huella, estimador, parametros, particion, n_particiones, muestras):
+    texto = json.dumps([huella, estimador, parametros, particion, n_particiones, muestras,
+                        ML_CONFIG['RANDOM_STATE']], sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()[:24]
+
+def _leer_resultados(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _escribir_resultados(ruta, resultados):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f)
+    os.replace(tmp, ruta)
+
+def preparar_datos(df):
+    """Matriz de características (mismos códigos que entrenar_modelo), objetivo y fechas"""
+    from src.model import CATEGORICAS
+
+    columnas = [LabelEncoder().fit_transform(df[col].astype(str)) for col in CATEGORICAS]
+    X = np.column_stack(columnas + [df['BVD'].to_numpy(dtype=float)])
+    y = df['DIAS_EN_ESPERA'].to_numpy(dtype=float)
+    validas = ~np.isnan(y)
+    fechas = df['FECHA_DE_ENTRADA'].to_numpy()
+    return X[validas], y[validas], fechas[validas]
+
+def buscar_hiperparametros(df, estimador=None, espacio=None, n_particiones=None, factor=None,
+                           min_muestras=None, procesos=None):
+    """Successive halving sobre la rejilla `espacio` con particiones temporales
+
+    Todas las configuraciones empiezan con una fracción de las filas de
+    entrenamiento de cada partición (las más recientes, como mínimo
+    `min_muestras`); en cada ronda sigue el mejor 1/`factor` (por MAE medio)
+    con `factor` veces más filas, y la última ronda usa todas. Los resultados de
+    cada (configuración, partición, filas) se guardan en disco por huella de
+    los datos, de modo que repetir la búsqueda solo calcula lo que falta.
+    Devuelve un diccionario con la mejor configuración y el detalle por
+    configuración y ronda.
+    """
+    inicio = time.perf_counter()
+    estimador = estimador or ML_CONFIG['ESTIMADOR']
+    espacio = espacio or ML_CONFIG['ESPACIO_BUSQUEDA'][estimador]
+    n_particiones = n_particiones or ML_CONFIG['AJUSTE_PARTICIONES']
+    factor = factor or ML_CONFIG['AJUSTE_FACTOR']
+    min_muestras = min_muestras or ML_CONFIG['AJUSTE_MIN_MUESTRAS']
+    procesos = procesos or ML_CONFIG['AJUSTE_PROCESOS'] or os.cpu_count()
+
+    X, y, fechas = preparar_datos(df)
+    particiones = particiones_temporales(fechas, n_particiones)
+    huella = joblib.hash((X, y))
+    configuraciones = list(ParameterGrid(espacio))
+    rondas = math.ceil(math.log(len(configuraciones), factor)) + 1 if len(configuraciones) > 1 else 1
+    # Filas de entrenamiento por ronda y partición
+    muestras_ronda = [[max(min(len(e), min_muestras), len(e) // factor ** (rondas - 1 - r))
+                       for e, _ in particiones] for r in range(rondas)]
+
+    ruta_cache = os.path.join(APP_CONFIG['CACHE_DIR'], 'ajuste_resultados.json')
+    resultados = _leer_resultados(ruta_cache)
+    calculadas = reutilizadas = 0
+    vivas = list(range(len(configuraciones)))
+    historial = []
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                             initargs=(X, y, particiones)) as pool:
+        for ronda, muestras in enumerate(muestras_ronda):
+            tareas = {}
+            for i in vivas:
+                for particion in range(n_particiones):
+                    clave = _clave(huella, estimador, configuraciones[i], particion, n_particiones,
+                                   muestras[particion])
+                    if clave not in resultados and clave not in tareas:
+                        tareas[clave] = pool.submit(_evaluar, estimador, configuraciones[i], particion,
+                                                    muestras[particion])
+            for clave, futuro in tareas.items():
+                resultados[clave] = futuro.result()
+            calculadas += len(tareas)
+            reutilizadas += len(vivas) * n_particiones - len(tareas)
+            _escribir_resultados(ruta_cache, resultados)
+
+            puntuaciones = []
+            for i in vivas:
+                folds = [resultados[_clave(huella, estimador, configuraciones[i], p, n_particiones, muestras[p])]
+                         for p in range(n_particiones)]
+                resumen = {
+                    'ronda': ronda,
+                    'muestras': sum(muestras),
+                    'parametros': configuraciones[i],
+                    'MAE': float(np.mean([f['MAE'] for f in folds])),
+                    'MAE_std': float(np.std([f['MAE'] for f in folds])),
+                    'ajuste_s': float(np.mean([f['ajuste_s'] for f in folds])),
+                    'prediccion_us_fila': float(np.mean([f['prediccion_us_fila'] for f in folds]))
+                }
+                historial.append(resumen)
+                puntuaciones.append((resumen['MAE'], i))
+            puntuaciones.sort()
+            print(f"Ronda {ronda}: {len(vivas)} configuraciones con {sum(muestras)} filas de entrenamiento, "
+                  f"mejor MAE {puntuaciones[0][0]:.2f}")
+            vivas = [i for _, i in puntuaciones[:max(1, math.ceil(len(vivas) / factor))]]
+
+    mejor = next(r for r in reversed(historial) if r['parametros'] == configuraciones[vivas[0]])
+    duracion = time.perf_counter() - inicio
+    print(f"Búsqueda de hiperparámetros: {len(configuraciones)} configuraciones, {rondas} rondas, "
+          f"{calculadas} ajustes ({reutilizadas} reutilizados) en {duracion:.1f} s. "
+          f"Mejor: {mejor['parametros']} (MAE {mejor['MAE']:.2f})")
+    return {
+        'estimador': estimador,
+        'mejor': mejor,
+        'particiones': n_particiones,
+        'factor': factor,
+        'ajustes_calculados': calculadas,
+        'ajustes_reutilizados': reutilizadas,
+        'duracion_s': duracion,
+        'configuraciones': historial
+    }
+
+if __name__ == '__main__':
+    import sys
+
+    from src.etl import cargar_datos
+    from src.model import ModeloPrediccion
+
+    modelo_ml = ModeloPrediccion(sys.argv[1] if len(sys.argv) > 1 else None)
+    modelo_ml.ajustar_hiperparametros(cargar_datos())
+    print(f"Versión guardada sin activar: {modelo_ml.artefacto.get('version')} "
+          f"(python -m src.artefactos activar <versión> para publicarla)")
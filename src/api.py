@@ -0,0 +1,272 @@
+"""
+API REST de puntuación por lotes sobre el servidor Flask de la app
+
+POST /api/v1/predict    pacientes -> espera prevista de cada uno
+POST /api/v1/recommend  filtros -> recomendaciones de cada uno
+
+El cuerpo es NDJSON (application/x-ndjson, un objeto por línea) o CSV
+(text/csv, con cabecera, separado por ';' o ','), y la respuesta usa el
+mismo formato. Se lee y se responde por bloques de API_BLOQUE_FILAS
+filas, así que un lote de cientos de miles de pacientes no se carga
+entero en memoria y los resultados empiezan a llegar con el primer
+bloque.
+"""
+
+import csv
+import io
+import itertools
+import json
+import math
+import time
+
+import pandas as pd
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from config import APP_CONFIG
+from src.cache import a_json
+
+FORMATOS = {'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson', 'text/csv': 'csv'}
+TIPOS_SALIDA = {'ndjson': 'application/x-ndjson; charset=utf-8', 'csv': 'text/csv; charset=utf-8'}
+COLUMNAS_PACIENTE = ['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO', 'BVD']
+SALIDA_PREDICCION = ['prediccion', 'intervalo_min', 'intervalo_max', 'confianza', 'valido', 'motivo']
+FILTROS_RECOMENDACION = {'distrito': "Todos", 'edad': "Todos", 'sexo': "Todos", 'bvd_min': 0}
+SALIDA_RECOMENDACION = ['consulta', 'posicion', 'DISTRITO_NOMBRE', 'BVD', 'TRAMO_EDAD', 'SEXO', 'DIAS_EN_ESPERA',
+                        'TIEMPO_ESPERA_DIAS', 'INTERVALO_ESPERA', 'CONFIANZA_PREDICCION', 'SCORE_RECOMENDACION',
+                        'mensaje']
+
+class ErrorPeticion(Exception):
+    """Petición no válida; `estado` es el código HTTP con el que se responde"""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+def _limpiar(valor):
+    """NaN -> None para que el JSON y el CSV salgan vacíos en vez de 'NaN'"""
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+class FlujoLimitado(io.RawIOBase):
+    """Flujo binario que corta con 413 al leer más de `max_bytes` bytes
+
+    Se cuentan los bytes leídos, así que el límite vale también para
+    cuerpos sin Content-Length (chunked). Cerrarlo no cierra `flujo`.
+    """
+
+    def __init__(self, flujo, max_bytes=None):
+        self.flujo = flujo
+        self.max_bytes = max_bytes
+        self.leidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        datos = self.flujo.read(len(destino))
+        self.leidos += len(datos)
+        if self.max_bytes is not None and self.leidos > self.max_bytes:
+            raise ErrorPeticion(f"El cuerpo supera {self.max_bytes} bytes", 413)
+        destino[:len(datos)] = datos
+        return len(datos)
+
+def leer_lineas(flujo, tamano=1 << 16, max_bytes=None):
+    """Líneas (str, con su salto tal cual) de un cuerpo UTF-8 leído en trozos de `tamano` bytes
+
+    Con newline='' los saltos no se traducen: csv.reader recibe los
+    '\r\n' y puede seguir un campo entre comillas que contiene saltos de
+    línea. El BOM inicial se descarta.
+    """
+    texto = io.TextIOWrapper(io.BufferedReader(FlujoLimitado(flujo, max_bytes), tamano),
+                             encoding='utf-8-sig', newline='')
+    try:
+        yield from texto
+    except UnicodeDecodeError:
+        raise ErrorPeticion("El cuerpo no está codificado en UTF-8")
+
+def leer_filas(flujo, formato, max_bytes=None):
+    """Dicts de las filas de un cuerpo NDJSON o CSV sin leerlo entero"""
+    texto = leer_lineas(flujo, max_bytes=max_bytes)
+    if formato == 'csv':
+        cabecera = next(texto, '')
+        separador = ';' if ';' in cabecera else ','
+        lector = csv.reader(itertools.chain([cabecera], texto), delimiter=separador)
+        try:
+            columnas = next(lector, [])
+            for valores in lector:
+                if valores:
+                    yield dict(zip(columnas, valores))
+        except csv.Error as e:
+            raise ErrorPeticion(f"Línea {lector.line_num}: CSV no válido ({e})")
+        return
+    for numero, linea in enumerate(texto, 1):
+        linea = linea.rstrip('\r\n')
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            raise ErrorPeticion(f"Línea {numero}: JSON no válido")
+        if not isinstance(fila, dict):
+            raise ErrorPeticion(f"Línea {numero}: se esperaba un objeto JSON")
+        yield fila
+
+def en_bloques(filas, tamano):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+class Serializador:
+    """Escribe registros (dicts) como líneas NDJSON o CSV con `columnas`"""
+
+    def __init__(self, formato, columnas):
+        self.formato = formato
+        self.columnas = columnas
+
+    def cabecera(self):
+        return ';'.join(self.columnas) + '\r\n' if self.formato == 'csv' else ''
+
+    def registros(self, registros):
+        if self.formato == 'ndjson':
+            return ''.join(a_json({k: _limpiar(v) for k, v in r.items()}) + '\n' for r in registros)
+        salida = io.StringIO()
+        escritor = csv.DictWriter(salida, self.columnas, delimiter=';', extrasaction='ignore')
+        escritor.writerows({k: _limpiar(v) for k, v in r.items()} for r in registros)
+        return salida.getvalue()
+
+    def error(self, mensaje):
+        if self.formato == 'ndjson':
+            return a_json({'error': mensaje}) + '\n'
+        return f"error;{mensaje}\r\n"
+
+def predecir_bloque(contexto, filas, desplazamiento):
+    """Espera prevista de un bloque de pacientes con una sola llamada a predecir_lote"""
+    df = pd.DataFrame.from_records(filas)
+    faltan = [c for c in COLUMNAS_PACIENTE if c not in df.columns]
+    if faltan:
+        raise ErrorPeticion(f"Faltan columnas: {', '.join(faltan)}")
+    pacientes = df[COLUMNAS_PACIENTE].copy()
+    bvd = pacientes['BVD']
+    if not pd.api.types.is_numeric_dtype(bvd):
+        # CSV exportado con coma decimal (Excel en español)
+        bvd = bvd.astype(str).str.replace(',', '.', regex=False)
+    pacientes['BVD'] = pd.to_numeric(bvd, errors='coerce')
+    resultado = contexto['modelo'].predecir_lote(pacientes)
+    resultado.insert(0, 'fila', range(desplazamiento, desplazamiento + len(df)))
+    if 'id' in df.columns:
+        # De los registros tal cual: en el DataFrame un id que falta pasa
+        # los ids enteros a float64
+        resultado.insert(1, 'id', pd.Series([f.get('id') for f in filas], dtype=object,
+                                             index=resultado.index))
+    return resultado.astype(object).to_dict('records')
+
+def recomendar_bloque(contexto, filas, desplazamiento):
+    """Recomendaciones de cada filtro del bloque (camino vectorizado y su caché)"""
+    registros = []
+    for i, fila in enumerate(filas, desplazamiento):
+        filtro = {campo: fila.get(campo) or defecto for campo, defecto in FILTROS_RECOMENDACION.items()}
+        try:
+            bvd_min = float(filtro['bvd_min'])
+            k = int(fila['k']) if fila.get('k') not in (None, '') else None
+        except (TypeError, ValueError):
+            registros.append({'consulta': i, 'mensaje': "bvd_min y k deben ser numéricos"})
+            continue
+        recomendaciones = contexto['recomendar'](
+            contexto['df'], filtro['distrito'], filtro['edad'], filtro['sexo'], contexto['modelo'],
+            bvd_min=bvd_min, indice=contexto['indice'], k=k)
+        if isinstance(recomendaciones, str):
+            registros.append({'consulta': i, 'mensaje': recomendaciones})
+        else:
+            registros.append({'consulta': i, 'recomendaciones': recomendaciones})
+    return registros
+
+def aplanar_recomendaciones(registros):
+    """Una fila por recomendación para la salida CSV"""
+    for registro in registros:
+        if 'recomendaciones' not in registro:
+            yield registro
+            continue
+        for posicion, recomendacion in enumerate(registro['recomendaciones'], 1):
+            yield {'consulta': registro['consulta'], 'posicion': posicion, **recomendacion}
+
+def crear_api(obtener_contexto):
+    """Blueprint con los endpoints de /api/v1
+
+    `obtener_contexto()` devuelve un dict con df, indice, modelo y
+    recomendar (la caché de recomendaciones) o None mientras los datos se
+    están cargando.
+    """
+    api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+    def servir(procesar, columnas, aplanar=None):
+        inicio = time.perf_counter()
+        tipo = (request.mimetype or '').lower()
+        if tipo not in FORMATOS:
+            raise ErrorPeticion(f"Content-Type no soportado: {tipo or 'ninguno'} "
+                                f"(use {' o '.join(FORMATOS)})", 415)
+        formato = FORMATOS[tipo]
+        max_bytes = APP_CONFIG['API_MAX_BYTES']
+        if request.content_length is not None and request.content_length > max_bytes:
+            raise ErrorPeticion(f"El cuerpo supera {max_bytes} bytes", 413)
+        contexto = obtener_contexto()
+        if contexto is None:
+            raise ErrorPeticion("Datos y modelo cargándose, reintente en unos segundos", 503)
+
+        # El primer bloque se procesa antes de responder: los errores de
+        # formato salen con su código HTTP y su tiempo va en las cabeceras
+        bloques = en_bloques(leer_filas(request.stream, formato, max_bytes), APP_CONFIG['API_BLOQUE_FILAS'])
+        primero = next(bloques, [])
+        lectura = time.perf_counter()
+        salida = procesar(contexto, primero, 0)
+        calculo = time.perf_counter()
+        serializador = Serializador(formato, columnas)
+        aplanar = aplanar if formato == 'csv' else None
+
+        def generar():
+            filas = len(primero)
+            yield serializador.cabecera()
+            yield serializador.registros(aplanar(salida) if aplanar else salida)
+            try:
+                for bloque in bloques:
+                    registros = procesar(contexto, bloque, filas)
+                    filas += len(bloque)
+                    yield serializador.registros(aplanar(registros) if aplanar else registros)
+            except ErrorPeticion as e:
+                # La respuesta ya empezó: el error va como última línea
+                yield serializador.error(str(e))
+            except Exception as e:
+                print(f"Error en API {request.path} tras {filas} filas: {e}")
+                yield serializador.error(f"Error interno: {e}")
+            print(f"API {request.path}: {filas} filas en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+        respuesta = Response(stream_with_context(generar()), mimetype=TIPOS_SALIDA[formato])
+        respuesta.headers['Server-Timing'] = (f"lectura;dur={(lectura - inicio) * 1000:.1f}, "
+                                              f"primer-bloque;dur={(calculo - lectura) * 1000:.1f}")
+        respuesta.headers['X-Tiempo-Primer-Bloque-Ms'] = f"{(calculo - inicio) * 1000:.1f}"
+        respuesta.headers['X-Filas-Por-Bloque'] = str(APP_CONFIG['API_BLOQUE_FILAS'])
+        respuesta.headers['X-Version-Modelo'] = str(contexto['modelo'].version)
+        return respuesta
+
+    @api.errorhandler(ErrorPeticion)
+    def error_peticion(error):
+        respuesta = jsonify({'error': str(error)})
+        respuesta.status_code = error.estado
+        if error.estado == 503:
+            respuesta.headers['Retry-After'] = '5'
+        return respuesta
+
+    @api.route('/predict', methods=['POST'])
+    def predict():
+        columnas = ['fila', 'id'] + SALIDA_PREDICCION
+        return servir(predecir_bloque, columnas)
+
+    @api.route('/recommend', methods=['POST'])
+    def recommend():
+        return servir(recomendar_bloque, SALIDA_RECOMENDACION, aplanar_recomendaciones)
+
+    return api
@@ -0,0 +1,244 @@
+"""
+Almacén versionado de artefactos del modelo
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from config import ML_CONFIG
+
+FICHERO_ACTUAL = 'ACTUAL'
+FICHEROS = {'modelo': 'modelo.joblib', 'encoders': 'encoders.joblib', 'cuantiles': 'cuantiles.joblib',
+            'bosque': 'bosque.npz'}
+
+def _sha256(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def fijar_hilos_prediccion(estimador):
+    """Deja los hilos de predicción en ML_CONFIG['HILOS_PREDICCION']
+
+    En un bosque de sklearn es su n_jobs; en el gradient boosting, los
+    hilos de OpenMP del proceso (threadpoolctl, dependencia de sklearn).
+    Se hace una sola vez, al entrenar o cargar el modelo y antes de
+    servirlo: ni el estimador compartido ni el estado de OpenMP se tocan
+    después en cada predicción.
+    """
+    if hasattr(estimador, 'n_jobs'):
+        estimador.n_jobs = ML_CONFIG['HILOS_PREDICCION']
+    elif hasattr(estimador, 'max_iter'):
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(ML_CONFIG['HILOS_PREDICCION'], user_api='openmp')
+
+def _version_sklearn():
+    import sklearn
+    return sklearn.__version__
+
+class AlmacenModelos:
+    """Versiones del modelo en `directorio`, cada una en su propia carpeta
+
+    Cada versión guarda el modelo sin comprimir (se puede abrir con
+    joblib.load(mmap_mode='r')), los encoders y un manifiesto.json con
+    métricas, esquema de características, huella de los datos de
+    entrenamiento, versión de sklearn y sha256 de cada fichero. Los bosques
+    se guardan además compilados en arrays planos (bosque.npz), que se
+    pueden servir sin importar sklearn. La versión
+    activa la indica el fichero ACTUAL, que se sustituye con os.replace:
+    publicar o revertir una versión es un único cambio atómico. Se conservan
+    las últimas `conservar` versiones.
+    """
+
+    def __init__(self, directorio=None, conservar=None):
+        self.directorio = directorio or ML_CONFIG['ARTEFACTOS_DIR']
+        self.conservar = conservar or ML_CONFIG['VERSIONES_CONSERVADAS']
+
+    def versiones(self):
+        """Versiones completas disponibles, de la más antigua a la más reciente"""
+        if not os.path.isdir(self.directorio):
+            return []
+        return sorted(v for v in os.listdir(self.directorio)
+                      if v.startswith('v') and os.path.exists(os.path.join(self.directorio, v, 'manifiesto.json')))
+
+    def actual(self):
+        """Nombre de la versión activa o None"""
+        ruta = os.path.join(self.directorio, FICHERO_ACTUAL)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, encoding='utf-8') as f:
+            version = f.read().strip()
+        return version if version in self.versiones() else None
+
+    def activar(self, version):
+        """Marca `version` como la activa"""
+        if version not in self.versiones():
+            raise ValueError(f"Versión de modelo desconocida: {version}")
+        ruta = os.path.join(self.directorio, FICHERO_ACTUAL)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp, ruta)
+        print(f"Versión de modelo activa: {version}")
+
+    def revertir(self):
+        """Vuelve a la versión anterior a la activa; devuelve su nombre o None"""
+        versiones = self.versiones()
+        actual = self.actual()
+        if actual is None or versiones.index(actual) == 0:
+            print("No hay una versión anterior del modelo a la que volver")
+            return None
+        anterior = versiones[versiones.index(actual) - 1]
+        self.activar(anterior)
+        return anterior
+
+    def manifiesto(self, version=None):
+        """Manifiesto de `version` (por defecto la activa)"""
+        version = version or self.actual()
+        if version is None:
+            return None
+        with open(os.path.join(self.directorio, version, 'manifiesto.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def guardar(self, modelo_ml, huella_datos=None, activar=True):
+        """Escribe una versión nueva con el modelo, encoders y métricas de `modelo_ml`"""
+        import joblib
+
+        from src.model import CATEGORICAS, FEATURES
+
+        os.makedirs(self.directorio, exist_ok=True)
+        versiones = self.versiones()
+        numero = int(versiones[-1][1:5]) + 1 if versiones else 1
+        version = f"v{numero:04d}-{time.strftime('%Y%m%d%H%M%S')}"
+        tmp = os.path.join(self.directorio, f".{version}.{os.getpid()}.tmp")
+        os.makedirs(tmp)
+
+        # Sin compresión para que los arrays se puedan abrir memory-mapped
+        joblib.dump(modelo_ml.model, os.path.join(tmp, FICHEROS['modelo']))
+        joblib.dump(modelo_ml.label_encoders, os.path.join(tmp, FICHEROS['encoders']))
+        joblib.dump(modelo_ml.modelos_cuantiles, os.path.join(tmp, FICHEROS['cuantiles']))
+        modelo_ml.exportar_bosque(os.path.join(tmp, FICHEROS['bosque']))
+        manifiesto = {
+            'version': version,
+            'creado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sklearn': _version_sklearn(),
+            'estimador': type(modelo_ml.model).__name__,
+            'motor': modelo_ml.estimador,
+            'parametros': modelo_ml.parametros,
+            'ajuste': modelo_ml.ajuste or None,
+            'features': FEATURES,
+            'categoricas': {col: [str(c) for c in modelo_ml.label_encoders[col].classes_] for col in CATEGORICAS},
+            'metricas': {k: v.item() if hasattr(v, 'item') else v for k, v in modelo_ml.metrics.items()},
+            'huella_datos': huella_datos,
+            'huella_modelo': modelo_ml.huella_modelo(),
+            'sha256': {nombre: _sha256(os.path.join(tmp, fichero)) for nombre, fichero in FICHEROS.items()
+                       if os.path.exists(os.path.join(tmp, fichero))}
+        }
+        with open(os.path.join(tmp, 'manifiesto.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+        # La carpeta solo aparece con su nombre definitivo cuando está completa
+        os.replace(tmp, os.path.join(self.directorio, version))
+        print(f"Modelo guardado como versión {version}")
+        if activar:
+            self.activar(version)
+        self.purgar()
+        return version
+
+    def cargar(self, modelo_ml, version=None, mmap=True, compilado=None):
+        """Carga `version` (por defecto la activa) en `modelo_ml`
+
+        Con `compilado` (por defecto ML_CONFIG['BOSQUE_COMPILADO']) y si la
+        versión tiene bosque.npz, solo se carga el bosque compilado y sklearn
+        no llega a importarse. Comprueba el sha256 de cada fichero que carga
+        antes de deserializar. Devuelve el manifiesto o None si no hay
+        versión o no supera la verificación.
+        """
+        from src.bosque import BosqueCompilado
+
+        version = version or self.actual()
+        if version is None:
+            return None
+        manifiesto = self.manifiesto(version)
+        carpeta = os.path.join(self.directorio, version)
+        compilado = ML_CONFIG['BOSQUE_COMPILADO'] if compilado is None else compilado
+        usar_bosque = compilado and 'bosque' in manifiesto['sha256']
+        # Las versiones anteriores no tienen cuantiles ni bosque compilado
+        ficheros = {n: f for n, f in FICHEROS.items() if n in manifiesto['sha256']
+                    and (n == 'bosque') == usar_bosque}
+        for nombre, fichero in ficheros.items():
+            if _sha256(os.path.join(carpeta, fichero)) != manifiesto['sha256'][nombre]:
+                print(f"Checksum incorrecto en {version}/{fichero}, no se carga")
+                return None
+
+        if usar_bosque:
+            bosque = BosqueCompilado.cargar(os.path.join(carpeta, FICHEROS['bosque']))
+            modelo, encoders, cuantiles = None, bosque.codificadores(), None
+        else:
+            import joblib
+
+            if manifiesto['sklearn'] != _version_sklearn():
+                print(f"Aviso: la versión {version} se entrenó con sklearn {manifiesto['sklearn']} "
+                      f"y está instalado {_version_sklearn()}")
+            modo = 'r' if mmap else None
+            bosque = None
+            modelo = joblib.load(os.path.join(carpeta, FICHEROS['modelo']), mmap_mode=modo)
+            fijar_hilos_prediccion(modelo)
+            encoders = joblib.load(os.path.join(carpeta, FICHEROS['encoders']), mmap_mode=modo)
+            cuantiles = (joblib.load(os.path.join(carpeta, FICHEROS['cuantiles']), mmap_mode=modo)
+                         if 'cuantiles' in ficheros else None)
+        # Se asignan juntos al final: nunca queda un modelo a medio cargar
+        modelo_ml.model, modelo_ml.label_encoders = modelo, encoders
+        modelo_ml.modelos_cuantiles = cuantiles
+        modelo_ml.bosque = bosque
+        modelo_ml.metrics = manifiesto['metricas']
+        modelo_ml.estimador = manifiesto.get('motor', modelo_ml.estimador)
+        modelo_ml.parametros = manifiesto.get('parametros') or {}
+        modelo_ml._version = (modelo if modelo is not None else bosque, manifiesto['huella_modelo'])
+        modelo_ml.artefacto = manifiesto
+        print(f"Modelo cargado desde la versión {version}")
+        return manifiesto
+
+    def borrar(self, version):
+        """Elimina una versión que no esté activa"""
+        if version == self.actual():
+            raise ValueError(f"No se puede borrar la versión activa {version}")
+        shutil.rmtree(os.path.join(self.directorio, version), ignore_errors=True)
+
+    def purgar(self):
+        """Borra las versiones más antiguas por encima de `conservar` (nunca la activa)"""
+        actual = self.actual()
+        for version in self.versiones()[:-self.conservar]:
+            if version != actual:
+                shutil.rmtree(os.path.join(self.directorio, version), ignore_errors=True)
+
+    def importar_pickles(self, modelo_ml):
+        """Migra los pkl sueltos de versiones anteriores a una versión del almacén"""
+        import joblib
+
+        if not (os.path.exists(ML_CONFIG['MODEL_PATH']) and os.path.exists(ML_CONFIG['ENCODERS_PATH'])):
+            return None
+        modelo_ml.model = joblib.load(ML_CONFIG['MODEL_PATH'])
+        modelo_ml.label_encoders = joblib.load(ML_CONFIG['ENCODERS_PATH'])
+        if os.path.exists(ML_CONFIG['METRICS_PATH']):
+            modelo_ml.metrics = joblib.load(ML_CONFIG['METRICS_PATH'])
+        print("Modelo importado desde los pkl sueltos")
+        return self.guardar(modelo_ml)
+
+if __name__ == '__main__':
+    import sys
+
+    almacen = AlmacenModelos()
+    if sys.argv[1:] == ['revertir']:
+        almacen.revertir()
+    elif sys.argv[1:2] == ['activar'] and len(sys.argv) == 3:
+        almacen.activar(sys.argv[2])
+    actual = almacen.actual()
+    for version in almacen.versiones():
+        metricas = almacen.manifiesto(version)['metricas']
+        print(f"{'*' if version == actual else ' '} {version}  "
+              f"MAE={metricas.get('MAE', float('nan')):.2f}  R2={metricas.get('R2', float('nan')):.4f}")
@@ -0,0 +1,110 @@
+"""
+Bosque compilado en arrays planos de NumPy para servir predicciones sin sklearn
+"""
+
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+# Filas por paso del recorrido: bloques pequeños mantienen los nodos en caché
+BLOQUE_RECORRIDO = 2048
+NODO = np.dtype([('umbral', 'f4'), ('feature', 'i4'), ('hijos', 'i4', (2,))])
+
+def exportar_bosque(model, label_encoders, ruta, huella):
+    """Aplana los árboles de un RandomForestRegressor entrenado en un único .npz
+
+    Los nodos de todos los árboles van seguidos en los mismos arrays y los
+    hijos usan índices globales. Las hojas apuntan a sí mismas con umbral
+    +inf, de modo que el recorrido puede dar siempre `profundidad` pasos sin
+    comprobar si ya ha llegado.
+
+    sklearn compara X en float32 con umbrales float64; aquí los umbrales se
+    redondean hacia abajo a float32, que da exactamente las mismas ramas
+    (x > u64 equivale a x > u32 para cualquier x float32).
+    """
+    arboles = [e.tree_ for e in model.estimators_]
+    raices = np.cumsum([0] + [t.node_count for t in arboles[:-1]]).astype(np.int64)
+    feature = np.concatenate([t.feature for t in arboles]).astype(np.int64)
+    umbral = np.concatenate([t.threshold for t in arboles])
+    hijos = np.column_stack([
+        np.concatenate([t.children_left + r for t, r in zip(arboles, raices)]),
+        np.concatenate([t.children_right + r for t, r in zip(arboles, raices)])
+    ]).astype(np.int64)
+    valor = np.concatenate([t.value[:, 0, 0] for t in arboles]).astype(np.float64)
+
+    hojas = np.concatenate([t.children_left == -1 for t in arboles])
+    indices = np.arange(len(feature))
+    hijos[hojas] = indices[hojas, None]
+    feature[hojas] = 0
+    umbral[hojas] = np.inf
+    umbral32 = umbral.astype(np.float32)
+    redondeados_arriba = umbral32.astype(np.float64) > umbral
+    umbral32[redondeados_arriba] = np.nextafter(umbral32[redondeados_arriba], np.float32(-np.inf))
+
+    with open(ruta, 'wb') as f:
+        np.savez(f, feature=feature.astype(np.int32), umbral=umbral32, hijos=hijos.astype(np.int32),
+                 valor=valor, raices=raices,
+                 profundidad=np.int64(max(t.max_depth for t in arboles)), huella=np.str_(huella),
+                 **{f'clases_{col}': np.asarray(le.classes_).astype(str)
+                    for col, le in label_encoders.items()})
+
+class BosqueCompilado:
+    """Evaluador vectorizado de un bosque exportado con exportar_bosque
+
+    Recorre a la vez todos los árboles para todas las filas de un bloque:
+    cada paso es una indexación sobre matrices filas × árboles, así que el
+    coste en Python es `profundidad` pasos por bloque, no por fila ni por
+    árbol. Cada nodo (umbral, feature, hijos) va en un registro de 16 bytes
+    para leerlo con una sola indexación por paso.
+    """
+
+    def __init__(self, arrays):
+        self.nodos = np.empty(len(arrays['feature']), dtype=NODO)
+        self.nodos['umbral'] = arrays['umbral']
+        self.nodos['feature'] = arrays['feature']
+        self.nodos['hijos'] = arrays['hijos']
+        self.valor = arrays['valor']
+        self.raices = arrays['raices'].astype(np.int32)
+        self.profundidad = int(arrays['profundidad'])
+        self.huella = str(arrays['huella'])
+        self.clases = {k[len('clases_'):]: arrays[k] for k in arrays if k.startswith('clases_')}
+
+    @classmethod
+    def cargar(cls, ruta):
+        inicio = time.perf_counter()
+        with np.load(ruta, allow_pickle=False) as datos:
+            bosque = cls({k: datos[k] for k in datos.files})
+        print(f"Bosque compilado: {bosque.n_arboles} árboles, {len(bosque.valor)} nodos "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return bosque
+
+    @property
+    def n_arboles(self):
+        return len(self.raices)
+
+    def codificadores(self):
+        """Objetos con `classes_`, como los LabelEncoder, para codificar las entradas"""
+        return {col: SimpleNamespace(classes_=clases) for col, clases in self.clases.items()}
+
+    def predicciones_arboles(self, X):
+        """Matriz filas × árboles con la predicción de cada árbol
+
+        X se pasa a float32 igual que hace sklearn antes de comparar con los
+        umbrales, así que el resultado coincide con el del bosque original.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        resultado = np.empty((len(X), self.n_arboles))
+        for inicio in range(0, len(X), BLOQUE_RECORRIDO):
+            Xb = X[inicio:inicio + BLOQUE_RECORRIDO]
+            n = len(Xb)
+            # Columnas de X seguidas: el valor de la feature f de la fila i está en f * n + i
+            columnas = np.ascontiguousarray(Xb.T).ravel()
+            filas = np.arange(n, dtype=np.int32)[:, None]
+            nodo = np.broadcast_to(self.raices, (n, self.n_arboles)).copy()
+            for _ in range(self.profundidad):
+                registro = self.nodos[nodo]
+                derecha = columnas[registro['feature'] * n + filas] > registro['umbral']
+                nodo = np.where(derecha, registro['hijos'][..., 1], registro['hijos'][..., 0])
+            resultado[inicio:inicio + BLOQUE_RECORRIDO] = self.valor[nodo]
+        return resultado
@@ -0,0 +1,317 @@
+"""
+Cachés de resultados para los callbacks del dashboard
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import CACHE_CONFIG
+from src.model import recomendar_residencia
+
+class CacheLRU:
+    """Caché LRU acotada con contadores de aciertos, fallos y expulsiones"""
+
+    def __init__(self, capacidad=1024):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave, calcular):
+        """Devuelve el valor de `clave`, calculándolo con `calcular()` si no está"""
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+
+        # El cálculo se hace fuera del lock para no serializar los callbacks
+        valor = calcular()
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._datos),
+            'capacidad': self.capacidad,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expulsiones': self.expulsiones,
+            'tasa_aciertos': self.aciertos / total if total else 0.0
+        }
+
+def _json_por_defecto(valor):
+    """Convierte escalares de NumPy y fechas de pandas a tipos JSON"""
+    if hasattr(valor, 'item'):
+        return valor.item()
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+def a_json(valor):
+    return json.dumps(valor, default=_json_por_defecto, ensure_ascii=False)
+
+class BackendMemoria:
+    """Backend en el propio proceso: no se comparte entre workers"""
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            valor, expira = self._datos.get(clave, (None, None))
+            if expira is not None and expira < time.time():
+                del self._datos[clave]
+                return None
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        with self._lock:
+            self._datos[clave] = (valor, time.time() + ttl if ttl else None)
+
+    def add(self, clave, valor, ttl=None):
+        """Guarda solo si la clave no existe; devuelve si se guardó"""
+        if self.get(clave) is not None:
+            return False
+        with self._lock:
+            if clave in self._datos:
+                return False
+            self._datos[clave] = (valor, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+class BackendDisco:
+    """Backend SQLite en disco, compartido por todos los workers de la máquina
+
+    La conexión se abre en el primer uso de cada hilo y proceso, nunca al
+    construirlo: con preload_app el backend se crea en el master de
+    gunicorn y los workers no deben heredar su conexión tras el fork.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso: no se heredan tras un fork
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute('CREATE TABLE IF NOT EXISTS cache '
+                             '(clave TEXT PRIMARY KEY, valor BLOB, expira REAL)')
+            self._local.conexion, self._local.pid = conexion, os.getpid()
+        return conexion
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            'SELECT valor FROM cache WHERE clave = ? AND (expira IS NULL OR expira >= ?)',
+            (clave, time.time())).fetchone()
+        return fila[0] if fila else None
+
+    def set(self, clave, valor, ttl=None):
+        conexion = self._conexion()
+        conexion.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                         (clave, valor, time.time() + ttl if ttl else None))
+        conexion.execute('DELETE FROM cache WHERE expira < ?', (time.time(),))
+
+    def add(self, clave, valor, ttl=None):
+        conexion = self._conexion()
+        conexion.execute('DELETE FROM cache WHERE clave = ? AND expira < ?', (clave, time.time()))
+        cursor = conexion.execute('INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+                                  (clave, valor, time.time() + ttl if ttl else None))
+        return cursor.rowcount == 1
+
+    def delete(self, clave):
+        self._conexion().execute('DELETE FROM cache WHERE clave = ?', (clave,))
+
+class BackendRedis:
+    """Backend sobre cualquier cliente con la interfaz de redis-py (get/set con ex y nx)"""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    @classmethod
+    def desde_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, clave):
+        return self.cliente.get(clave)
+
+    def set(self, clave, valor, ttl=None):
+        self.cliente.set(clave, valor, ex=ttl)
+
+    def add(self, clave, valor, ttl=None):
+        return bool(self.cliente.set(clave, valor, ex=ttl, nx=True))
+
+    def delete(self, clave):
+        self.cliente.delete(clave)
+
+class RedisLocal:
+    """Sustituto en memoria del cliente de Redis para pruebas locales"""
+
+    def __init__(self):
+        self._backend = BackendMemoria()
+
+    def get(self, clave):
+        valor = self._backend.get(clave)
+        return valor.encode('utf-8') if isinstance(valor, str) else valor
+
+    def set(self, clave, valor, ex=None, nx=False):
+        if nx:
+            return self._backend.add(clave, valor, ex) or None
+        self._backend.set(clave, valor, ex)
+        return True
+
+    def delete(self, clave):
+        self._backend.delete(clave)
+
+def crear_backend(tipo=None):
+    """Crea el backend configurado en CACHE_CONFIG['BACKEND']"""
+    tipo = tipo or CACHE_CONFIG['BACKEND']
+    if tipo == 'memoria':
+        return BackendMemoria()
+    if tipo == 'disco':
+        return BackendDisco(CACHE_CONFIG['DISCO_PATH'])
+    if tipo == 'redis':
+        return BackendRedis.desde_url(CACHE_CONFIG['REDIS_URL'])
+    if tipo == 'redis_local':
+        return BackendRedis(RedisLocal())
+    raise ValueError(f"Backend de caché desconocido: {tipo}")
+
+class CacheCompartida:
+    """Resultados serializados en JSON y compartidos entre workers a través de un backend
+
+    Solo un worker calcula cada clave: el primero toma un candado en el
+    backend y el resto espera (hasta `espera` segundos) a que aparezca el
+    valor antes de calcularlo por su cuenta.
+    """
+
+    def __init__(self, backend, prefijo='residencias', ttl=None, espera=30):
+        self.backend = backend
+        self.prefijo = prefijo
+        self.ttl = ttl
+        self.espera = espera
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, calcular, serializar=a_json):
+        """Devuelve el valor deserializado de `clave`, calculándolo una sola vez"""
+        clave = f"{self.prefijo}:{clave}"
+        valor = self.backend.get(clave)
+        if valor is None:
+            candado = clave + ':calculando'
+            if not self.backend.add(candado, '1', ttl=self.espera):
+                limite = time.time() + self.espera
+                while valor is None and time.time() < limite:
+                    time.sleep(0.05)
+                    valor = self.backend.get(clave)
+            if valor is None:
+                try:
+                    valor = serializar(calcular())
+                    self.backend.set(clave, valor, self.ttl)
+                finally:
+                    self.backend.delete(candado)
+                self.fallos += 1
+                return json.loads(valor)
+        self.aciertos += 1
+        return json.loads(valor)
+
+class CacheRecomendaciones(CacheLRU):
+    """Memoriza recomendar_residencia por filtro, snapshot de datos y versión del modelo
+
+    Cada clave incluye los datos (df.attrs['huella'] más un hash del índice,
+    porque un subconjunto filtrado hereda los attrs del total) y
+    modelo_ml.version. Tras una recarga de datos o de modelo las entradas
+    anteriores dejan de ser alcanzables y salen por LRU; no se vacía la
+    caché, así que dos DataFrames o dos versiones pueden convivir. Con
+    `compartida` (CacheCompartida) los fallos se buscan antes en la caché
+    común a todos los workers.
+    """
+
+    def __init__(self, capacidad=4096, compartida=None):
+        super().__init__(capacidad)
+        self.compartida = compartida
+        self._ultimo_df = (lambda: None, None)
+
+    def _id_datos(self, df):
+        """Identidad de las filas de `df`; se calcula una vez por objeto"""
+        referencia, id_datos = self._ultimo_df
+        if referencia() is not df:
+            indice = pd.util.hash_pandas_object(df.index, index=False).to_numpy()
+            id_datos = (df.attrs.get('huella', id(df)), len(df), hashlib.sha256(indice.tobytes()).hexdigest()[:16])
+            self._ultimo_df = (weakref.ref(df), id_datos)
+        return id_datos
+
+    def recomendar(self, df, distrito, edad, sexo, modelo_ml, bvd_min=0, indice=None, k=None):
+        """recomendar_residencia con memoización"""
+        version_modelo = modelo_ml.version if modelo_ml is not None else None
+        clave = (distrito, edad, sexo, bvd_min, k) + self._id_datos(df) + (version_modelo,)
+
+        def calcular():
+            calculo = lambda: recomendar_residencia(
+                df, distrito, edad, sexo, modelo_ml, bvd_min=bvd_min, indice=indice, k=k)
+            if self.compartida is None:
+                return calculo()
+            # Segundo nivel: el resultado de otro worker, si ya lo calculó
+            return self.compartida.obtener('recomendacion:' + a_json(clave), calculo)
+
+        resultado = self.obtener(clave, calcular)
+        # Copia superficial: los callbacks no deben alterar la entrada cacheada
+        return [dict(r) for r in resultado] if isinstance(resultado, list) else resultado
+
+    def precalentar(self, df, modelo_ml, indice=None, n=50):
+        """Precalcula las `n` combinaciones de filtro más frecuentes en los datos
+
+        Se incluyen los comodines "Todos" de cada combinación observada y se
+        usa el BVD mínimo por defecto del slider (0).
+        """
+        if df.empty or n <= 0:
+            return 0
+        inicio = time.perf_counter()
+        grupos = df.groupby(['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO'], observed=True).size()
+        frecuencias = {}
+        for (distrito, edad, sexo), conteo in grupos.items():
+            for d in (distrito, "Todos"):
+                for e in (edad, "Todos"):
+                    for s in (sexo, "Todos"):
+                        frecuencias[(d, e, s)] = frecuencias.get((d, e, s), 0) + conteo
+        combinaciones = pd.Series(frecuencias).sort_values(ascending=False).index[:n]
+        for distrito, edad, sexo in combinaciones:
+            self.recomendar(df, distrito, edad, sexo, modelo_ml, 0, indice)
+        print(f"Caché de recomendaciones precalentada: {len(combinaciones)} combinaciones "
+              f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+        return len(combinaciones)
@@ -0,0 +1,228 @@
+"""
+Cubo de agregados precalculado para estadísticas y gráficos
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.etl import DISTRITOS, TRAMOS_EDAD, SEXOS, _orden_categorias
+
+# Dimensiones del cubo y su orden fijo de categorías (los valores nuevos van al final)
+DIMENSIONES = [
+    ('DISTRITO_NOMBRE', DISTRITOS),
+    ('TRAMO_EDAD', TRAMOS_EDAD),
+    ('SEXO', SEXOS),
+    ('MES_ENTRADA', list(range(1, 13)))
+]
+ANCHO_BIN_BVD = 0.1
+# Códigos de celda (sin mes) de los conteos por valor de BVD
+CODIGOS_BVD = ['distrito', 'edad', 'sexo']
+ANCHO_BIN_DIAS = 7
+
+def _codificar(serie, orden):
+    """Códigos de categoría con el orden fijo; los nulos van a la última posición"""
+    categorias = _orden_categorias(serie, orden)
+    codigos = pd.Categorical(serie, categories=categorias).codes.astype(np.int64)
+    codigos[codigos < 0] = len(categorias)
+    return codigos, categorias
+
+class CuboAgregados:
+    """Agregados por DISTRITO_NOMBRE × TRAMO_EDAD × SEXO × MES_ENTRADA
+
+    Cada celda guarda conteo, suma y suma de cuadrados de BVD, suma de
+    DIAS_EN_ESPERA. Los histogramas de
+    ambas medidas se guardan sin el eje del mes (el dashboard no filtra por
+    mes), lo que permite bins finos. Cada eje tiene una posición extra al
+    final para los nulos, que se excluyen de los conteos igual que en
+    value_counts. Para la mediana exacta se guarda además cuántas veces
+    aparece cada valor de BVD en cada celda sin mes (`bvd`: códigos de
+    distrito, edad y sexo, valor y conteo). Las consultas cuestan
+    O(celdas), y la mediana O(valores distintos por celda), no O(filas).
+    """
+
+    def __init__(self, categorias, medidas, inicios, bvd):
+        self.categorias = categorias
+        self.medidas = medidas
+        self.inicios = inicios
+        self.bvd = bvd
+
+    @property
+    def empty(self):
+        return self.total == 0
+
+    @property
+    def total(self):
+        return int(self.medidas['conteo'].sum())
+
+    def filtrar(self, distrito="Todos", edad="Todos", sexo="Todos"):
+        """Devuelve el sub-cubo de un filtro del dashboard, sin copiar datos"""
+        indices = []
+        for (nombre, _), valor in zip(DIMENSIONES, [distrito, edad, sexo, "Todos"]):
+            if valor in (None, "Todos"):
+                indices.append(slice(None))
+            elif valor in self.categorias[nombre]:
+                i = self.categorias[nombre].index(valor)
+                indices.append(slice(i, i + 1))
+            else:
+                indices.append(slice(0, 0))
+        categorias = {nombre: cats[ix] for (nombre, cats), ix in zip(self.categorias.items(), indices)}
+        medidas = {k: v[tuple(indices[:v.ndim if k.startswith('hist_') else 4])]
+                   for k, v in self.medidas.items()}
+        dentro = np.ones(len(self.bvd['valor']), dtype=bool)
+        codigos = {}
+        for nombre, ix in zip(CODIGOS_BVD, indices):
+            inicio = ix.start or 0
+            codigos[nombre] = self.bvd[nombre] - inicio
+            if ix.stop is not None:
+                dentro &= (self.bvd[nombre] >= inicio) & (self.bvd[nombre] < ix.stop)
+        bvd = {k: v[dentro] for k, v in {**self.bvd, **codigos}.items()}
+        return CuboAgregados(categorias, medidas, self.inicios, bvd)
+
+    def _marginal(self, medida, dimension):
+        """Suma una medida sobre todos los ejes salvo `dimension`"""
+        eje = list(self.categorias).index(dimension)
+        otros = tuple(i for i in range(4) if i != eje)
+        return self.medidas[medida].sum(axis=otros)
+
+    def conteos(self, dimension):
+        """Equivalente a contar_valores(df[dimension]) sobre el cubo
+
+        Conteo descendente y, en los empates, el orden de categorías del
+        eje, que es el mismo que usa contar_valores.
+        """
+        n = len(self.categorias[dimension])
+        valores = self._marginal('conteo', dimension)[:n]
+        orden = np.lexsort((np.arange(n), -valores))
+        orden = orden[valores[orden] > 0]
+        return pd.Series(valores[orden], index=pd.Index(self.categorias[dimension], name=dimension)[orden],
+                         name='count')
+
+    def histograma(self, medida, nbins=None):
+        """Devuelve (conteos, bordes) del histograma de 'BVD' o 'DIAS_EN_ESPERA'
+
+        Con `nbins` se agrupan bins contiguos hasta quedar como mucho en
+        `nbins`, recortando los extremos vacíos.
+        """
+        clave, ancho = (('hist_bvd', ANCHO_BIN_BVD) if medida == 'BVD'
+                        else ('hist_dias', ANCHO_BIN_DIAS))
+        conteos = self.medidas[clave].sum(axis=(0, 1, 2))
+        inicio = self.inicios[clave]
+        ocupados = np.flatnonzero(conteos)
+        if len(ocupados) == 0:
+            return conteos[:0], np.array([inicio])
+        conteos = conteos[ocupados[0]:ocupados[-1] + 1]
+        inicio = inicio + ocupados[0] * ancho
+        if nbins:
+            factor = int(np.ceil(len(conteos) / nbins))
+            relleno = (-len(conteos)) % factor
+            conteos = np.pad(conteos, (0, relleno)).reshape(-1, factor).sum(axis=1)
+            ancho *= factor
+        bordes = inicio + ancho * np.arange(len(conteos) + 1)
+        return conteos, bordes
+
+    def mediana_bvd(self):
+        """Mediana exacta de BVD (la de Series.median) a partir de los conteos por valor"""
+        n = int(self.bvd['conteo'].sum())
+        if n == 0:
+            return np.nan
+        orden = np.argsort(self.bvd['valor'], kind='stable')
+        valores = self.bvd['valor'][orden]
+        acumulado = np.cumsum(self.bvd['conteo'][orden])
+        # Posiciones (desde 0) de los dos valores centrales; iguales si n es impar
+        centrales = np.searchsorted(acumulado, [(n - 1) // 2, n // 2], side='right')
+        return float(valores[centrales].mean())
+
+    def desviacion_bvd(self):
+        """Desviación típica muestral de BVD a partir de suma y suma de cuadrados"""
+        n = self.medidas['n_bvd'].sum()
+        if n < 2:
+            return np.nan
+        suma = self.medidas['suma_bvd'].sum()
+        varianza = (self.medidas['suma_bvd2'].sum() - suma * suma / n) / (n - 1)
+        return float(np.sqrt(max(varianza, 0.0)))
+
+    def estadisticas(self):
+        """Devuelve el mismo diccionario que obtener_estadisticas_avanzadas"""
+        if self.empty:
+            return {}
+
+        n_bvd = self.medidas['n_bvd'].sum()
+        n_dias = self.medidas['n_dias'].sum()
+        distritos = self.conteos('DISTRITO_NOMBRE')
+        return {
+            'total_personas': self.total,
+            'promedio_bvd': self.medidas['suma_bvd'].sum() / n_bvd if n_bvd else np.nan,
+            'mediana_bvd': self.mediana_bvd(),
+            'distritos_unicos': len(distritos),
+            'distribucion_sexo': self.conteos('SEXO').to_dict(),
+            'distribucion_edad': self.conteos('TRAMO_EDAD').to_dict(),
+            'top_distritos': distritos.head(5).to_dict(),
+            'promedio_dias_espera': self.medidas['suma_dias'].sum() / n_dias if n_dias else np.nan,
+            'tendencia_mensual': self.conteos('MES_ENTRADA').sort_index().to_dict()
+        }
+
+def construir_cubo(df):
+    """Construye el cubo en una sola pasada sobre las filas"""
+    inicio = time.perf_counter()
+    categorias = {}
+    celda = np.zeros(len(df), dtype=np.int64)
+    forma = []
+    for nombre, orden in DIMENSIONES:
+        codigos, cats = _codificar(df[nombre], orden) if nombre in df else (
+            np.zeros(len(df), dtype=np.int64), list(orden))
+        categorias[nombre] = cats
+        forma.append(len(cats) + 1)
+        celda = celda * forma[-1] + codigos
+    n_celdas = int(np.prod(forma))
+
+    def sumar(pesos=None, mascara=None):
+        indices = celda if mascara is None else celda[mascara]
+        if pesos is not None and mascara is not None:
+            pesos = pesos[mascara]
+        return np.bincount(indices, weights=pesos, minlength=n_celdas).reshape(forma)
+
+    bvd = pd.to_numeric(df['BVD'], errors='coerce').to_numpy(dtype=float)
+    dias = pd.to_numeric(df['DIAS_EN_ESPERA'], errors='coerce').to_numpy(dtype=float)
+    hay_bvd = ~np.isnan(bvd)
+    hay_dias = ~np.isnan(dias)
+
+    medidas = {
+        'conteo': sumar().astype(np.int64),
+        'n_bvd': sumar(mascara=hay_bvd).astype(np.int64),
+        'suma_bvd': sumar(bvd, hay_bvd),
+        'suma_bvd2': sumar(bvd * bvd, hay_bvd),
+        'n_dias': sumar(mascara=hay_dias).astype(np.int64),
+        'suma_dias': sumar(dias, hay_dias)
+    }
+
+    # Histogramas por celda sin mes: índice combinado celda × bin
+    celda_sin_mes = celda // forma[-1]
+    forma_sin_mes = forma[:-1]
+    n_celdas_sin_mes = n_celdas // forma[-1]
+    inicios = {}
+    for clave, valores, mascara, ancho in [('hist_bvd', bvd, hay_bvd, ANCHO_BIN_BVD),
+                                           ('hist_dias', dias, hay_dias, ANCHO_BIN_DIAS)]:
+        v = valores[mascara]
+        inicio_bins = np.floor(v.min() / ancho) * ancho if len(v) else 0.0
+        # El redondeo evita que 52.5 / 0.1 = 524.999... caiga en el bin anterior
+        bins = np.floor(np.round((v - inicio_bins) / ancho, 6)).astype(np.int64)
+        n_bins = int(bins.max()) + 1 if len(v) else 1
+        conteos = np.bincount(celda_sin_mes[mascara] * n_bins + bins,
+                              minlength=n_celdas_sin_mes * n_bins)
+        medidas[clave] = conteos.reshape(forma_sin_mes + [n_bins]).astype(np.int32)
+        inicios[clave] = float(inicio_bins)
+
+    # Conteo de cada valor de BVD por celda sin mes, para la mediana exacta
+    codigos_valor, distintos = pd.factorize(bvd[hay_bvd])
+    pares, conteos = np.unique(celda_sin_mes[hay_bvd] * len(distintos) + codigos_valor, return_counts=True)
+    codigos = np.unravel_index(pares // max(len(distintos), 1), forma_sin_mes)
+    bvd_valores = {nombre: c.astype(np.int64) for nombre, c in zip(CODIGOS_BVD, codigos)}
+    bvd_valores['valor'] = np.asarray(distintos, dtype=float)[pares % max(len(distintos), 1)]
+    bvd_valores['conteo'] = conteos.astype(np.int64)
+
+    cubo = CuboAgregados(categorias, medidas, inicios, bvd_valores)
+    print(f"Cubo de agregados: {len(df)} filas -> {n_celdas} celdas "
+          f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+    return cubo
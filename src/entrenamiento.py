@@ -0,0 +1,290 @@
+"""
+Reentrenamiento del modelo en segundo plano y cambio en caliente
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from config import APP_CONFIG, ML_CONFIG
+from src.artefactos import AlmacenModelos
+from src.etl import bloqueo_fichero, cargar_datos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Procesos lanzados desde aquí, para recoger su código de salida
+_LANZADOS = []
+# Entrenamiento apuntado al arrancar: con preload_app el arranque ocurre en
+# el master de gunicorn, que no lanza procesos; lo lanza el GestorModelo
+# del primer worker que comprueba
+_PENDIENTES = []
+
+def _ruta_estado():
+    return os.path.join(ML_CONFIG['ARTEFACTOS_DIR'], 'estado_entrenamiento.json')
+
+def leer_estado():
+    """Último estado de entrenamiento escrito por el proceso entrenador"""
+    try:
+        with open(_ruta_estado(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _escribir_estado(**estado):
+    os.makedirs(ML_CONFIG['ARTEFACTOS_DIR'], exist_ok=True)
+    tmp = f"{_ruta_estado()}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False)
+    os.replace(tmp, _ruta_estado())
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def firma_fuente():
+    """Ruta, tamaño y mtime de la fuente de datos (el CSV o el manifiesto de snapshots)
+
+    Es un stat, así que se puede comprobar a menudo; cambia cuando llegan
+    datos nuevos. None si la fuente no existe.
+    """
+    ruta = os.path.join(APP_CONFIG['SNAPSHOT_DIR'], 'manifiesto.json')
+    if APP_CONFIG['FUENTE_DATOS'] != 'snapshots' or not os.path.exists(ruta):
+        ruta = APP_CONFIG['DATA_PATH']
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    return [os.path.abspath(ruta), st.st_size, st.st_mtime_ns]
+
+def programar_entrenamiento(df):
+    """Apunta `df` para que lo entrene en segundo plano el GestorModelo de un worker"""
+    _PENDIENTES[:] = [df]
+
+def entrenamiento_en_curso():
+    for proceso in _LANZADOS:
+        proceso.poll()
+    estado = leer_estado()
+    return estado.get('estado') == 'en_curso' and _proceso_vivo(estado.get('pid'))
+
+def lanzar_entrenamiento(df=None, firma=None):
+    """Arranca el entrenamiento en un proceso aparte; no espera a que termine
+
+    Con `df` se entrena ese DataFrame; sin él, el proceso carga la fuente
+    de datos configurada (la de `firma`). Devuelve False si ya hay un
+    entrenamiento en curso (de este o de otro worker) o si esos datos ya
+    se entrenaron.
+    """
+    with bloqueo_fichero(ML_CONFIG['LOCK_PATH']):
+        if entrenamiento_en_curso():
+            print("Ya hay un entrenamiento en curso")
+            return False
+        estado = leer_estado()
+        if firma is not None and estado.get('firma') == firma:
+            print("El entrenamiento de estos datos ya se lanzó")
+            return False
+        huella = df.attrs.get('huella') if df is not None else None
+        if df is not None:
+            if estado.get('estado') == 'rechazado' and estado.get('huella_datos') == huella:
+                print("Estos datos ya se entrenaron y el modelo no pasó la validación")
+                return False
+            activo = AlmacenModelos().manifiesto()
+            if activo and activo.get('huella_datos') == huella and activo.get('motor') == ML_CONFIG['ESTIMADOR']:
+                print(f"La versión activa {activo['version']} ya está entrenada con estos datos")
+                return False
+        os.makedirs(ML_CONFIG['ARTEFACTOS_DIR'], exist_ok=True)
+        argumentos = [sys.executable, '-m', 'src.entrenamiento']
+        if df is not None:
+            ruta = os.path.abspath(os.path.join(ML_CONFIG['ARTEFACTOS_DIR'], f'.datos_{os.getpid()}.pkl'))
+            df.to_pickle(ruta)
+            argumentos.append(ruta)
+        # Mismo directorio de trabajo que la app (las rutas de ML_CONFIG son relativas)
+        entorno = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+        proceso = subprocess.Popen(argumentos, env=entorno)
+        _LANZADOS.append(proceso)
+        _escribir_estado(estado='en_curso', pid=proceso.pid, inicio=time.time(), huella_datos=huella,
+                         filas=len(df) if df is not None else 0, firma=firma)
+    print(f"Entrenamiento en segundo plano lanzado (pid {proceso.pid}, "
+          f"{f'{len(df)} filas' if df is not None else 'datos nuevos de la fuente'})")
+    return True
+
+def validar_metricas(nuevas, actuales):
+    """Devuelve el motivo de rechazo de las métricas nuevas o None si se aceptan"""
+    if ML_CONFIG['MAE_MAXIMO'] is not None and nuevas['MAE'] > ML_CONFIG['MAE_MAXIMO']:
+        return f"MAE {nuevas['MAE']:.2f} por encima del máximo {ML_CONFIG['MAE_MAXIMO']}"
+    if actuales and 'MAE' in actuales:
+        limite = actuales['MAE'] * (1 + ML_CONFIG['TOLERANCIA_MAE'])
+        if nuevas['MAE'] > limite:
+            return f"MAE {nuevas['MAE']:.2f} peor que el del modelo activo ({actuales['MAE']:.2f})"
+    return None
+
+def entrenar_y_publicar(df):
+    """Entrena, valida y, si pasa, activa la nueva versión en el almacén"""
+    from src.model import ModeloPrediccion
+
+    estado = leer_estado()
+    inicio = estado.get('inicio', time.time())
+    base = {'pid': os.getpid(), 'inicio': inicio, 'huella_datos': df.attrs.get('huella'), 'filas': len(df),
+            'firma': estado.get('firma')}
+    try:
+        almacen = AlmacenModelos()
+        activo = almacen.manifiesto()
+        modelo_ml = ModeloPrediccion()
+        # Se conservan los hiperparámetros del modelo activo (p. ej. los de una búsqueda)
+        parametros = activo.get('parametros') if activo and activo.get('motor') == modelo_ml.estimador else None
+        if not modelo_ml.entrenar_modelo(df, activar=False, parametros=parametros):
+            raise RuntimeError("entrenar_modelo no terminó")
+        version = modelo_ml.artefacto['version']
+        motivo = validar_metricas(modelo_ml.metrics, activo['metricas'] if activo else None)
+        if motivo:
+            print(f"Versión {version} rechazada: {motivo}")
+            almacen.borrar(version)
+            _escribir_estado(estado='rechazado', version=version, motivo=motivo,
+                             metricas=modelo_ml.artefacto['metricas'], duracion=time.time() - inicio, **base)
+            return False
+        # La tabla se compila antes de publicar: los workers solo tienen que abrirla
+        if ML_CONFIG['USAR_TABLA']:
+            modelo_ml.compilar_tabla()
+        almacen.activar(version)
+        _escribir_estado(estado='completado', version=version, metricas=modelo_ml.artefacto['metricas'],
+                         duracion=time.time() - inicio, **base)
+        return True
+    except Exception as e:
+        print(f"Error en el entrenamiento en segundo plano: {e}")
+        _escribir_estado(estado='error', motivo=str(e), duracion=time.time() - inicio, **base)
+        return False
+
+def entrenar_fuente():
+    """Carga la fuente de datos configurada y la entrena si la versión activa no es de esos datos
+
+    Es lo que hace `python -m src.entrenamiento` sin argumentos: lo lanza
+    GestorModelo al ver datos nuevos y se puede llamar desde cron.
+    """
+    # La firma se toma antes de leer: si la fuente vuelve a cambiar se verá otra
+    inicio, firma = time.time(), firma_fuente()
+    df = cargar_datos()
+    base = {'pid': os.getpid(), 'inicio': inicio, 'huella_datos': df.attrs.get('huella'),
+            'filas': len(df), 'firma': firma}
+    activo = AlmacenModelos().manifiesto()
+    if df.empty or (activo and activo.get('huella_datos') == base['huella_datos']
+                    and activo.get('motor') == ML_CONFIG['ESTIMADOR']):
+        print("La versión activa ya está entrenada con los datos de la fuente")
+        _escribir_estado(estado='sin_cambios', duracion=time.time() - base['inicio'], **base)
+        return True
+    _escribir_estado(estado='en_curso', **base)
+    return entrenar_y_publicar(df)
+
+class GestorModelo:
+    """Da acceso al modelo activo y lo sustituye cuando el almacén publica otro
+
+    Como mucho cada `intervalo` segundos se lanza un hilo que mira el
+    puntero de versión del almacén; si ha cambiado, el hilo carga el modelo
+    nuevo completo (y su tabla) en un objeto aparte y después cambia la
+    referencia. Las peticiones nunca esperan a la carga: siguen con el
+    modelo anterior entero hasta el cambio. `preparar(modelo)`, si se da,
+    se llama en ese hilo con el modelo nuevo antes de publicarlo (p. ej.
+    para memorizar sus predicciones de todo el snapshot).
+
+    Con `vigilar_datos` (por defecto ENTRENAMIENTO_SEGUNDO_PLANO) el mismo
+    hilo lanza el reentrenamiento: el pendiente del arranque y, cuando
+    cambia la firma de la fuente de datos, el de los datos nuevos. Así el
+    proceso entrenador sale siempre de un worker, no del master.
+    """
+
+    def __init__(self, modelo_ml, almacen=None, intervalo=None, preparar=None, vigilar_datos=None):
+        self._modelo = modelo_ml
+        self.preparar = preparar
+        self.vigilar_datos = ML_CONFIG['ENTRENAMIENTO_SEGUNDO_PLANO'] if vigilar_datos is None else vigilar_datos
+        self._firma = firma_fuente()
+        self.almacen = almacen or AlmacenModelos()
+        self.intervalo = ML_CONFIG['INTERVALO_COMPROBACION'] if intervalo is None else intervalo
+        self._comprobado = time.monotonic()
+        self._hilo = None
+        self._bloqueo = threading.Lock()
+
+    @property
+    def modelo(self):
+        if time.monotonic() - self._comprobado >= self.intervalo:
+            self.comprobar_en_segundo_plano()
+        return self._modelo
+
+    def comprobar_en_segundo_plano(self):
+        """Lanza comprobar() en un hilo si no hay ya uno en marcha; devuelve el hilo o None"""
+        with self._bloqueo:
+            # Tras el fork de gunicorn el hilo del master ya no está vivo
+            if self._hilo is not None and self._hilo.is_alive():
+                return None
+            self._comprobado = time.monotonic()
+            self._hilo = threading.Thread(target=self.comprobar, name='gestor-modelo', daemon=True)
+            self._hilo.start()
+            return self._hilo
+
+    def comprobar_datos(self):
+        """Lanza el entrenamiento pendiente o el de los datos nuevos de la fuente; devuelve si lo lanzó"""
+        if not self.vigilar_datos:
+            return False
+        try:
+            if _PENDIENTES:
+                return lanzar_entrenamiento(_PENDIENTES.pop())
+            firma = firma_fuente()
+            if firma is None or firma == self._firma:
+                return False
+            self._firma = firma
+            print(f"Datos nuevos en {firma[0]}: se reentrena el modelo")
+            return lanzar_entrenamiento(firma=firma)
+        except Exception as e:
+            print(f"Error lanzando el entrenamiento: {e}")
+            return False
+
+    def comprobar(self):
+        """Carga la versión activa del almacén si no es la que se está sirviendo
+
+        Antes mira si hay que reentrenar (comprobar_datos).
+        """
+        from src.model import ModeloPrediccion
+
+        self.comprobar_datos()
+        version = self.almacen.actual()
+        if version is None or version == self._modelo.artefacto.get('version'):
+            return False
+        try:
+            nuevo = ModeloPrediccion()
+            if self.almacen.cargar(nuevo, version) is None:
+                return False
+            if ML_CONFIG['USAR_TABLA'] and not nuevo.cargar_tabla():
+                with bloqueo_fichero(ML_CONFIG['LOCK_PATH']):
+                    if not nuevo.cargar_tabla():
+                        nuevo.compilar_tabla()
+            if self.preparar is not None:
+                self.preparar(nuevo)
+        except Exception as e:
+            print(f"Error cargando la versión {version}: {e}")
+            return False
+        self._modelo = nuevo
+        print(f"Modelo cambiado en caliente a la versión {version}")
+        return True
+
+    def estado(self):
+        """Estado del último entrenamiento y del modelo servido, para el dashboard"""
+        estado = leer_estado()
+        if estado.get('estado') == 'en_curso':
+            if entrenamiento_en_curso():
+                estado['duracion'] = time.time() - estado['inicio']
+            else:
+                estado['estado'] = 'interrumpido'
+        estado['version_servida'] = self._modelo.artefacto.get('version')
+        return estado
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(0 if entrenar_fuente() else 1)
+    ruta = sys.argv[1]
+    datos = pd.read_pickle(ruta)
+    os.remove(ruta)
+    sys.exit(0 if entrenar_y_publicar(datos) else 1)
@@ -1,34 +1,336 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import hashlib
+import json
 import os
-import joblib
+import time
+from contextlib import contextmanager
 
-def cargar_datos():
-    """Carga y limpia los datos de lista de espera"""
+from config import APP_CONFIG, ML_CONFIG
+
+# Versión del formato de caché: se incrementa cuando cambia la limpieza
+VERSION_CACHE = 2
+
+# Fecha de carga usada si el CSV no trae FX_CARGA
+FECHA_REFERENCIA_DEFECTO = '2025-10-26'
+
+# Orden fijo de categorías, compartido por todos los workers y cargas
+DISTRITOS = [
+    'CENTRO', 'ARGANZUELA', 'RETIRO', 'SALAMANCA', 'CHAMARTÍN', 'TETUÁN',
+    'CHAMBERÍ', 'FUENCARRAL-EL PARDO', 'MONCLOA-ARAVACA', 'LATINA',
+    'CARABANCHEL', 'USERA', 'PUENTE DE VALLECAS', 'MORATALAZ', 'CIUDAD LINEAL',
+    'HORTALEZA', 'VILLAVERDE', 'VILLA DE VALLECAS', 'VICÁLVARO',
+    'SAN BLAS-CANILLEJAS', 'BARAJAS'
+]
+TRAMOS_EDAD = ['<=59', '60 - 64', '65 - 69', '70 - 74', '75 - 79', '80 - 84', '>=85']
+SEXOS = ['HOMBRE', 'MUJER']
+DIAS_SEMANA = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+CATEGORIAS_COMPACTAS = {
+    'DISTRITO_NOMBRE': DISTRITOS,
+    'DISTRITO': None,
+    'TRAMO_EDAD': TRAMOS_EDAD,
+    'SEXO': SEXOS,
+    'DIA_SEMANA': DIAS_SEMANA,
+    'FX_CARGA': None
+}
+TIPOS_COMPACTOS = {
+    'NUMERO_ORDEN': 'int32',
+    'DISTRITO_COD': 'int8',
+    'MES_ENTRADA': 'int8',
+    'DIAS_EN_ESPERA': 'int16',
+    'BVD': 'float32'
+}
+COLUMNAS_PII = ['DNI', 'NOMBRE']
+
+def limpiar_datos(df):
+    """Aplica la limpieza y las características derivadas a un DataFrame crudo"""
+    # Limpieza avanzada
+    df['BVD'] = pd.to_numeric(df['BVD'], errors='coerce')
+    df['FECHA_DE_ENTRADA'] = pd.to_datetime(df['FECHA_DE_ENTRADA'])
+    df['DISTRITO_NOMBRE'] = df['DISTRITO'].str.strip()
+
+    # Crear características adicionales
+    df['MES_ENTRADA'] = df['FECHA_DE_ENTRADA'].dt.month
+    df['DIA_SEMANA'] = df['FECHA_DE_ENTRADA'].dt.day_name()
+
+    # Calcular "días en espera" respecto a la fecha de carga de cada extracción
+    fecha_referencia = pd.Timestamp(FECHA_REFERENCIA_DEFECTO)
+    if 'FX_CARGA' in df.columns:
+        fecha_referencia = pd.to_datetime(df['FX_CARGA'], errors='coerce').fillna(fecha_referencia)
+    df['DIAS_EN_ESPERA'] = (fecha_referencia - df['FECHA_DE_ENTRADA']).dt.days
+
+    return df
+
+def _orden_categorias(serie, orden):
+    """El orden fijo `orden` y detrás los demás valores de `serie`, ordenados"""
+    observados = pd.unique(serie.dropna())
+    return list(orden or []) + sorted(v for v in observados if orden is None or v not in orden)
+
+def _categorizar(serie, orden):
+    """Convierte a `category` con el orden fijo dado; los valores nuevos van al final"""
+    return pd.Categorical(serie, categories=_orden_categorias(serie, orden))
+
+def compactar_datos(df):
+    """Devuelve una versión compacta del DataFrame: categorías, tipos estrechos y sin PII"""
+    if df.empty:
+        return df
+
+    memoria_antes = df.memory_usage(deep=True).sum()
+    compacto = df.drop(columns=[c for c in COLUMNAS_PII if c in df.columns])
+
+    for col, orden in CATEGORIAS_COMPACTAS.items():
+        if col in compacto.columns:
+            compacto[col] = _categorizar(compacto[col], orden)
+
+    for col, tipo in TIPOS_COMPACTOS.items():
+        if col not in compacto.columns:
+            continue
+        serie = compacto[col]
+        if np.dtype(tipo).kind == 'i':
+            # Solo se estrecha si no hay nulos y los valores caben en el tipo
+            info = np.iinfo(tipo)
+            if serie.isna().any() or serie.min() < info.min or serie.max() > info.max:
+                tipo = 'float32'
+        compacto[col] = serie.astype(tipo)
+
+    compacto.attrs = dict(df.attrs)
+    memoria_despues = compacto.memory_usage(deep=True).sum()
+    print(f"Modo compacto: memoria {memoria_antes / 1024:.1f} KiB -> "
+          f"{memoria_despues / 1024:.1f} KiB ({memoria_despues / memoria_antes:.0%})")
+    return compacto
+
+def congelar_datos(df):
+    """Pasa las columnas numéricas y de fecha a buffers NumPy propios de solo lectura
+
+    Pensado para cargar los datos en el master de gunicorn antes del fork:
+    los buffers se comparten copy-on-write entre workers y cualquier
+    escritura accidental falla en vez de duplicar páginas.
+    """
+    if df.empty:
+        return df
+
+    columnas = {}
+    for col in df.columns:
+        serie = df[col]
+        if (pd.api.types.is_numeric_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype)) \
+                or pd.api.types.is_datetime64_dtype(serie):
+            valores = np.array(serie.to_numpy(), copy=True)
+            valores.flags.writeable = False
+            columnas[col] = valores
+        else:
+            columnas[col] = serie
+    congelado = pd.DataFrame(columnas, index=df.index, copy=False)
+    congelado.attrs = dict(df.attrs)
+    return congelado
+
+def _hash_fichero(ruta, bloque=1 << 20):
+    """Calcula el SHA-256 de un fichero leyendo por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for trozo in iter(lambda: f.read(bloque), b''):
+            h.update(trozo)
+    return h.hexdigest()
+
+def _rutas_cache(ruta, dir_cache):
+    """Devuelve las rutas del fichero de columnas y de su metadato
+
+    El nombre lleva un hash de la ruta absoluta: dos CSV con el mismo
+    nombre en directorios distintos no comparten caché.
+    """
+    ruta_absoluta = os.path.abspath(ruta)
+    sufijo = hashlib.sha256(ruta_absoluta.encode('utf-8')).hexdigest()[:12]
+    base = f"{os.path.splitext(os.path.basename(ruta_absoluta))[0]}_{sufijo}"
+    return (os.path.join(dir_cache, base + '.npz'),
+            os.path.join(dir_cache, base + '.json'))
+
+def _guardar_npz(df, ruta):
+    """Guarda un DataFrame columna a columna en un .npz sin objetos Python"""
+    columnas = {}
+    tipos = {}
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            columnas[col] = serie.to_numpy()
+            tipos[col] = 'fecha'
+        elif pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            columnas[col] = serie.to_numpy()
+            tipos[col] = 'numero'
+        else:
+            nulos = serie.isna().to_numpy()
+            columnas[col] = serie.where(~nulos, '').astype(str).to_numpy(dtype='U')
+            columnas['__nulos__' + col] = nulos
+            tipos[col] = 'texto'
+
+    # Escritura atómica: nunca se deja un .npz a medias
+    tmp = ruta + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **columnas)
+    os.replace(tmp, ruta)
+    return tipos
+
+def _leer_npz(ruta, tipos):
+    """Reconstruye un DataFrame guardado con _guardar_npz"""
+    with np.load(ruta, allow_pickle=False) as datos:
+        columnas = {}
+        for col, tipo in tipos.items():
+            valores = datos[col]
+            if tipo == 'texto':
+                serie = pd.Series(valores.astype(object))
+                serie[datos['__nulos__' + col]] = np.nan
+                columnas[col] = serie
+            else:
+                columnas[col] = valores
+    return pd.DataFrame(columnas)
+
+def _huella_csv(ruta):
+    """Tamaño y mtime del CSV; el sha256 se rellena solo cuando hace falta"""
+    st = os.stat(ruta)
+    return {'tamano': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': None}
+
+def _leer_cache(ruta, dir_cache, huella):
+    """DataFrame de la caché si es válida para el CSV de `huella`, o None
+
+    Completa huella['sha256'] cuando lo calcula o lo lee del metadato.
+    """
+    ruta_npz, ruta_meta = _rutas_cache(ruta, dir_cache)
+    if not (os.path.exists(ruta_npz) and os.path.exists(ruta_meta)):
+        return None
+
+    with open(ruta_meta, encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != VERSION_CACHE or meta.get('tamano') != huella['tamano']:
+        return None
+
+    # Si solo cambia el mtime (p. ej. un `touch`) se confirma con el hash
+    if meta.get('mtime_ns') != huella['mtime_ns']:
+        huella['sha256'] = _hash_fichero(ruta)
+        if meta.get('sha256') != huella['sha256']:
+            return None
+        meta['mtime_ns'] = huella['mtime_ns']
+        _escribir_meta(ruta_meta, meta)
+
+    df = _leer_npz(ruta_npz, meta['columnas'])
+    huella['sha256'] = meta['sha256']
+    return df
+
+def _borrar_cache(ruta, dir_cache):
+    """Elimina una caché ilegible para que la siguiente carga la reescriba"""
+    for fichero in _rutas_cache(ruta, dir_cache):
+        try:
+            os.remove(fichero)
+        except OSError:
+            pass
+
+def _escribir_meta(ruta_meta, meta):
+    """Escribe el metadato de la caché de forma atómica"""
+    tmp = ruta_meta + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta_meta)
+
+def _escribir_cache(df, ruta, dir_cache, huella):
+    """Guarda el DataFrame limpio y la huella del CSV del que procede"""
+    os.makedirs(dir_cache, exist_ok=True)
+    ruta_npz, ruta_meta = _rutas_cache(ruta, dir_cache)
+    if huella['sha256'] is None:
+        huella['sha256'] = _hash_fichero(ruta)
+    tipos = _guardar_npz(df, ruta_npz)
+    _escribir_meta(ruta_meta, {
+        'version': VERSION_CACHE,
+        'tamano': huella['tamano'],
+        'mtime_ns': huella['mtime_ns'],
+        'sha256': huella['sha256'],
+        'columnas': tipos,
+        'filas': len(df)
+    })
+
+def _cargar_snapshot_actual():
+    """Última extracción del almacén de APP_CONFIG['SNAPSHOT_DIR']"""
+    from src.ingesta import AlmacenSnapshots
+
+    inicio = time.perf_counter()
     try:
-        df = pd.read_csv('data/lista_espera.csv', sep=';', encoding='utf-8')
-        
-        # Limpieza avanzada
-        df['BVD'] = pd.to_numeric(df['BVD'], errors='coerce')
-        df['FECHA_DE_ENTRADA'] = pd.to_datetime(df['FECHA_DE_ENTRADA'])
-        df['DISTRITO_NOMBRE'] = df['DISTRITO'].str.strip()
-        
-        # Crear características adicionales
-        df['MES_ENTRADA'] = df['FECHA_DE_ENTRADA'].dt.month
-        df['DIA_SEMANA'] = df['FECHA_DE_ENTRADA'].dt.day_name()
-        
-        # Calcular "días en espera" (simulado para el ejemplo)
-        fecha_referencia = pd.to_datetime('2025-10-26')
-        df['DIAS_EN_ESPERA'] = (fecha_referencia - df['FECHA_DE_ENTRADA']).dt.days
-        
+        almacen = AlmacenSnapshots()
+        df = almacen.cargar_snapshot()
+        if not df.empty:
+            print(f"Snapshot {almacen.snapshots()[-1]}: {len(df)} filas en "
+                  f"{(time.perf_counter() - inicio) * 1000:.1f} ms ({almacen.directorio})")
         return df
+    except Exception as e:
+        print(f"Error cargando el snapshot: {e}")
+        return pd.DataFrame()
+
+def cargar_datos(ruta=None, usar_cache=True, compacto=False):
+    """Carga y limpia los datos de lista de espera
+
+    El resultado limpio se guarda en una caché columnar (.npz) en
+    APP_CONFIG['CACHE_DIR'], invalidada por tamaño, fecha y hash del CSV.
+    Con `compacto=True` se devuelve la representación de compactar_datos.
+    Sin `ruta` y con APP_CONFIG['FUENTE_DATOS'] == 'snapshots' se carga la
+    última extracción del almacén de snapshots (el CSV si está vacío).
+    """
+    if ruta is None and APP_CONFIG['FUENTE_DATOS'] == 'snapshots':
+        df = _cargar_snapshot_actual()
+        if not df.empty:
+            return compactar_datos(df) if compacto else df
+        print("Almacén de snapshots vacío, se cargan los datos del CSV")
+    ruta = ruta or APP_CONFIG['DATA_PATH']
+    dir_cache = APP_CONFIG['CACHE_DIR']
+    inicio = time.perf_counter()
+    try:
+        df, huella = None, _huella_csv(ruta)
+        if usar_cache:
+            try:
+                df = _leer_cache(ruta, dir_cache, huella)
+            except Exception as e:
+                print(f"Caché de datos no válida, se regenera: {e}")
+                _borrar_cache(ruta, dir_cache)
+        estado = 'HIT' if df is not None else 'MISS'
+
+        if df is None:
+            df = pd.read_csv(ruta, sep=';', encoding='utf-8')
+            df = limpiar_datos(df)
+            if usar_cache:
+                try:
+                    _escribir_cache(df, ruta, dir_cache, huella)
+                except Exception as e:
+                    print(f"No se pudo escribir la caché de datos: {e}")
+
+        # Identificador del snapshot de datos (claves de caché entre workers).
+        # Sin sha256 (caché desactivada o sin escribir) basta tamaño + mtime:
+        # no se relee el CSV entero solo para etiquetarlo
+        df.attrs['huella'] = (huella['sha256'] or hashlib.sha256(
+            f"{huella['tamano']}:{huella['mtime_ns']}".encode()).hexdigest())[:16]
+
+        duracion = (time.perf_counter() - inicio) * 1000
+        print(f"Caché de datos {estado if usar_cache else 'DESACTIVADA'}: "
+              f"{len(df)} filas en {duracion:.1f} ms ({ruta})")
+        return compactar_datos(df) if compacto else df
     except Exception as e:
         print(f"Error cargando datos: {e}")
         return pd.DataFrame()
 
+def contar_valores(serie):
+    """Conteo de cada valor de mayor a menor, sin nulos ni categorías vacías
+
+    Los empates van en el orden de categorías de la columna (el fijo de
+    CATEGORIAS_COMPACTAS y detrás los demás valores, ordenados), no en el
+    que deje el algoritmo de ordenación de value_counts, que cambia entre
+    versiones de pandas. CuboAgregados.conteos sigue el mismo orden.
+    """
+    conteos = serie.value_counts(sort=False)
+    conteos = conteos[conteos > 0]
+    categorias = pd.Index(_orden_categorias(serie, CATEGORIAS_COMPACTAS.get(serie.name)))
+    return conteos.iloc[np.lexsort((categorias.get_indexer(conteos.index), -conteos.to_numpy()))]
+
 def obtener_estadisticas_avanzadas(df):
-    """Calcula estadísticas avanzadas"""
+    """Calcula estadísticas avanzadas a partir de un DataFrame o de un CuboAgregados"""
+    from src.cubo import CuboAgregados
+
+    if isinstance(df, CuboAgregados):
+        return df.estadisticas()
     if df.empty:
         return {}
     
@@ -37,35 +339,190 @@ def obtener_estadisticas_avanzadas(df):
         'promedio_bvd': df['BVD'].mean(),
         'mediana_bvd': df['BVD'].median(),
         'distritos_unicos': df['DISTRITO_NOMBRE'].nunique(),
-        'distribucion_sexo': df['SEXO'].value_counts().to_dict(),
-        'distribucion_edad': df['TRAMO_EDAD'].value_counts().to_dict(),
-        'top_distritos': df['DISTRITO_NOMBRE'].value_counts().head(5).to_dict(),
+        'distribucion_sexo': contar_valores(df['SEXO']).to_dict(),
+        'distribucion_edad': contar_valores(df['TRAMO_EDAD']).to_dict(),
+        'top_distritos': contar_valores(df['DISTRITO_NOMBRE']).head(5).to_dict(),
         'promedio_dias_espera': df['DIAS_EN_ESPERA'].mean(),
         'tendencia_mensual': df['MES_ENTRADA'].value_counts().sort_index().to_dict()
     }
     
     return stats
 
-def cargar_o_entrenar_modelo(df):
-    """Carga el modelo si existe, de lo contrario lo entrena"""
+class AcumuladorEstadisticas:
+    """Acumula por bloques los agregados que usa obtener_estadisticas_avanzadas
+
+    La mediana de BVD sale de un histograma con paso de 0.01 en [0, 100]: es
+    exacta para BVD con dos decimales y aproximada (al paso) en otro caso.
+    """
+
+    PASO_BVD = 0.01
+
+    def __init__(self):
+        self.total = 0
+        self.suma_bvd = 0.0
+        self.n_bvd = 0
+        self.suma_dias = 0.0
+        self.n_dias = 0
+        self.hist_bvd = np.zeros(int(round(100 / self.PASO_BVD)) + 1, dtype=np.int64)
+        self.conteos = {col: pd.Series(dtype='int64')
+                        for col in ['SEXO', 'TRAMO_EDAD', 'DISTRITO_NOMBRE', 'MES_ENTRADA']}
+
+    def agregar(self, bloque):
+        """Incorpora un bloque ya limpio"""
+        self.total += len(bloque)
+
+        bvd = bloque['BVD'].dropna().to_numpy(dtype=float)
+        self.suma_bvd += bvd.sum()
+        self.n_bvd += len(bvd)
+        indices = np.clip(np.rint(bvd / self.PASO_BVD), 0, len(self.hist_bvd) - 1).astype(np.int64)
+        self.hist_bvd += np.bincount(indices, minlength=len(self.hist_bvd))
+
+        dias = bloque['DIAS_EN_ESPERA'].dropna()
+        self.suma_dias += float(dias.sum())
+        self.n_dias += len(dias)
+
+        for col in self.conteos:
+            self.conteos[col] = self.conteos[col].add(bloque[col].value_counts(), fill_value=0)
+
+    def _mediana_bvd(self):
+        """Mediana a partir del histograma, con la misma regla que pandas para n par"""
+        if self.n_bvd == 0:
+            return np.nan
+        acumulado = np.cumsum(self.hist_bvd)
+        bajo = np.searchsorted(acumulado, (self.n_bvd - 1) // 2 + 1)
+        alto = np.searchsorted(acumulado, self.n_bvd // 2 + 1)
+        return (bajo + alto) / 2 * self.PASO_BVD
+
+    def estadisticas(self):
+        """Devuelve el mismo diccionario que obtener_estadisticas_avanzadas"""
+        if self.total == 0:
+            return {}
+
+        conteos = {col: serie[serie > 0].astype('int64').sort_values(ascending=False, kind='stable')
+                   for col, serie in self.conteos.items()}
+        return {
+            'total_personas': self.total,
+            'promedio_bvd': self.suma_bvd / self.n_bvd if self.n_bvd else np.nan,
+            'mediana_bvd': self._mediana_bvd(),
+            'distritos_unicos': len(conteos['DISTRITO_NOMBRE']),
+            'distribucion_sexo': conteos['SEXO'].to_dict(),
+            'distribucion_edad': conteos['TRAMO_EDAD'].to_dict(),
+            'top_distritos': conteos['DISTRITO_NOMBRE'].head(5).to_dict(),
+            'promedio_dias_espera': self.suma_dias / self.n_dias if self.n_dias else np.nan,
+            'tendencia_mensual': conteos['MES_ENTRADA'].sort_index().to_dict()
+        }
+
+def iterar_bloques(ruta=None, tam_bloque=None):
+    """Generador de bloques del CSV ya limpios con limpiar_datos"""
+    ruta = ruta or APP_CONFIG['DATA_PATH']
+    tam_bloque = tam_bloque or APP_CONFIG['CHUNK_SIZE']
+    with pd.read_csv(ruta, sep=';', encoding='utf-8', chunksize=tam_bloque) as lector:
+        for bloque in lector:
+            yield limpiar_datos(bloque)
+
+def procesar_csv_en_bloques(ruta=None, salida=None, tam_bloque=None):
+    """Limpia un CSV por bloques con memoria acotada
+
+    Cada bloque se añade a las estadísticas acumuladas y, si se indica
+    `salida`, se escribe limpio en ese CSV a medida que se procesa.
+    Devuelve el diccionario de obtener_estadisticas_avanzadas.
+    """
+    acumulador = AcumuladorEstadisticas()
+    inicio = time.perf_counter()
+    n_bloques = 0
+    try:
+        if salida:
+            tmp = salida + '.tmp'
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        for bloque in iterar_bloques(ruta, tam_bloque):
+            acumulador.agregar(bloque)
+            if salida:
+                bloque.to_csv(tmp, sep=';', index=False, mode='a',
+                              header=(n_bloques == 0), encoding='utf-8')
+            n_bloques += 1
+        if salida and n_bloques:
+            os.replace(tmp, salida)
+
+        duracion = time.perf_counter() - inicio
+        print(f"ETL por bloques: {acumulador.total} filas en {n_bloques} bloques "
+              f"({duracion:.2f} s)")
+        return acumulador.estadisticas()
+    except Exception as e:
+        print(f"Error procesando datos por bloques: {e}")
+        return {}
+
+@contextmanager
+def bloqueo_fichero(ruta):
+    """Bloqueo exclusivo entre procesos sobre `ruta` (fcntl en Unix, msvcrt en Windows)"""
+    with open(ruta, 'a+b') as f:
+        try:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            try:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_UN)
+            except ImportError:
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def cargar_o_entrenar_modelo(df, cubo=None):
+    """Carga el modelo si existe, de lo contrario lo entrena
+
+    Todo ocurre bajo un bloqueo de fichero: si varios workers arrancan a la
+    vez sin modelo, solo el primero entrena y el resto carga lo que guardó.
+    Con ENTRENAMIENTO_SEGUNDO_PLANO el entrenamiento (sin modelo o con datos
+    nuevos) se apunta para lanzarlo en otro proceso (GestorModelo) y se
+    devuelve el modelo disponible.
+    """
+    from src.artefactos import AlmacenModelos
     from src.model import ModeloPrediccion
     
     modelo_ml = ModeloPrediccion()
-    stats = obtener_estadisticas_avanzadas(df)
+    stats = obtener_estadisticas_avanzadas(cubo if cubo is not None else df)
+    almacen = AlmacenModelos()
     
-    # Verificar si el modelo ya está guardado
-    if os.path.exists('modelo_espera.pkl') and os.path.exists('label_encoders.pkl'):
+    with bloqueo_fichero(ML_CONFIG['LOCK_PATH']):
+        # Versión activa del almacén (o los pkl sueltos de versiones anteriores)
+        manifiesto = None
         try:
-            modelo_ml.model = joblib.load('modelo_espera.pkl')
-            modelo_ml.label_encoders = joblib.load('label_encoders.pkl')
-            print("Modelo cargado desde archivos guardados")
+            manifiesto = almacen.cargar(modelo_ml)
+            if manifiesto is None and almacen.importar_pickles(modelo_ml):
+                manifiesto = almacen.cargar(modelo_ml)
         except Exception as e:
-            print(f"Error cargando modelo: {e}. Entrenando nuevo modelo...")
-            if len(df) > 10:
+            print(f"Error cargando modelo: {e}")
+
+        segundo_plano = ML_CONFIG['ENTRENAMIENTO_SEGUNDO_PLANO'] and len(df) > 10
+        if manifiesto is None:
+            if len(df) > 10 and not segundo_plano:
+                print("Entrenando modelo ML...")
                 modelo_ml.entrenar_modelo(df)
-    else:
-        if len(df) > 10:
-            print("Entrenando modelo ML...")
-            modelo_ml.entrenar_modelo(df)
+        elif manifiesto['huella_datos'] != df.attrs.get('huella'):
+            print(f"Aviso: el modelo {manifiesto['version']} se entrenó con otros datos "
+                  f"({manifiesto['huella_datos'] or 'desconocidos'})")
+        elif manifiesto.get('motor', 'random_forest') != ML_CONFIG['ESTIMADOR']:
+            print(f"Aviso: el modelo {manifiesto['version']} usa {manifiesto.get('motor', 'random_forest')} "
+                  f"y ML_CONFIG pide {ML_CONFIG['ESTIMADOR']}")
+        else:
+            segundo_plano = False
+
+        # Tabla de predicción precompilada (opcional): se reutiliza si sigue vigente
+        if ML_CONFIG['USAR_TABLA'] and modelo_ml.disponible:
+            if not modelo_ml.cargar_tabla():
+                modelo_ml.compilar_tabla()
+
+    # No se lanza aquí: con preload_app esto corre en el master de gunicorn.
+    # Lo lanza el GestorModelo del primer worker que comprueba
+    if segundo_plano:
+        from src.entrenamiento import programar_entrenamiento
+        programar_entrenamiento(df)
     
     return modelo_ml, stats
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Figuras precompiladas en JSON por snapshot de datos, guardadas en disco
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from config import APP_CONFIG, VISUALIZATION_CONFIG
+from src.etl import bloqueo_fichero
+
+# Claves de APP_CONFIG que cambian lo que dibujan las figuras
+CLAVES_APP_GRAFICOS = ['COMPACT_DATA']
+
+def version_graficos():
+    """Huella del código y la configuración que dibujan las figuras
+
+    Forma parte de la carpeta de cada snapshot: si cambia src/graphics.py,
+    src/cubo.py (los agregados de los que salen), VISUALIZATION_CONFIG o
+    las claves de APP_CONFIG que cambian la representación de los datos,
+    las figuras guardadas dejan de usarse.
+    """
+    configuracion = {'visualizacion': VISUALIZATION_CONFIG,
+                     'app': {clave: APP_CONFIG[clave] for clave in CLAVES_APP_GRAFICOS}}
+    h = hashlib.sha256(json.dumps(configuracion, sort_keys=True).encode())
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    for modulo in ('graphics.py', 'cubo.py'):
+        with open(os.path.join(directorio, modulo), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:8]
+
+class AlmacenFiguras:
+    """JSON de cada figura en `directorio`/<huella de datos>-<versión>/
+
+    Cada figura se construye (plotly.express, validadores, to_json) una sola
+    vez por snapshot de datos en la máquina; después los workers leen el
+    fichero y lo devuelven sin volver a pasar por plotly. Un candado de
+    fichero por figura evita que dos workers la construyan a la vez. Con
+    `comprimir` se guarda en gzip. Se conservan las carpetas de los últimos
+    `conservar` snapshots.
+    """
+
+    def __init__(self, directorio=None, comprimir=None, conservar=None):
+        self.directorio = directorio or os.path.join(APP_CONFIG['CACHE_DIR'], 'figuras')
+        self.comprimir = APP_CONFIG['FIGURAS_GZIP'] if comprimir is None else comprimir
+        self.conservar = conservar or APP_CONFIG['FIGURAS_SNAPSHOTS_CONSERVADOS']
+        self.version = version_graficos()
+
+    def ruta(self, huella, nombre):
+        extension = '.json.gz' if self.comprimir else '.json'
+        return os.path.join(self.directorio, f"{huella}-{self.version}", nombre + extension)
+
+    def leer(self, huella, nombre):
+        """JSON guardado de la figura o None"""
+        ruta = self.ruta(huella, nombre)
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+        except OSError:
+            return None
+        return (gzip.decompress(contenido) if self.comprimir else contenido).decode('utf-8')
+
+    def guardar(self, huella, nombre, texto):
+        ruta = self.ruta(huella, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        contenido = texto.encode('utf-8')
+        if self.comprimir:
+            # mtime fijo: el mismo JSON da siempre los mismos bytes
+            contenido = gzip.compress(contenido, compresslevel=6, mtime=0)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+
+    def compilar(self, huella, nombre, construir):
+        """JSON de la figura; la construye con `construir()` solo si no está en disco"""
+        texto = self.leer(huella, nombre)
+        if texto is None:
+            ruta = self.ruta(huella, nombre)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with bloqueo_fichero(ruta + '.lock'):
+                # Otro worker puede haberla guardado mientras se esperaba el candado
+                texto = self.leer(huella, nombre)
+                if texto is None:
+                    inicio = time.perf_counter()
+                    texto = construir().to_json()
+                    self.guardar(huella, nombre, texto)
+                    print(f"Figura {nombre} compilada para {huella} "
+                          f"({(time.perf_counter() - inicio) * 1000:.0f} ms, {len(texto) / 1024:.0f} KiB)")
+            self.purgar()
+        return texto
+
+    def obtener(self, huella, nombre, construir):
+        """Figura como dict listo para devolverlo desde un callback"""
+        return json.loads(self.compilar(huella, nombre, construir))
+
+    def precompilar(self, huella, figuras):
+        """Construye y guarda las figuras de `figuras` (nombre -> función) que falten"""
+        inicio = time.perf_counter()
+        for nombre, construir in figuras.items():
+            try:
+                self.compilar(huella, nombre, construir)
+            except Exception as e:
+                print(f"Error precompilando {nombre}: {e}")
+        print(f"Figuras precompiladas para {huella}: {len(figuras)} "
+              f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+    def purgar(self):
+        """Borra las carpetas de snapshots más antiguas por encima de `conservar`"""
+        if not os.path.isdir(self.directorio):
+            return
+        carpetas = []
+        for carpeta in os.listdir(self.directorio):
+            try:
+                carpetas.append((os.path.getmtime(os.path.join(self.directorio, carpeta)), carpeta))
+            except OSError:
+                continue  # la ha borrado otro worker
+        carpetas = [os.path.join(self.directorio, c) for _, c in sorted(carpetas)]
+        for carpeta in carpetas[:-self.conservar]:
+            shutil.rmtree(carpeta, ignore_errors=True)
@@ -1,13 +1,60 @@
-import plotly.express as px
+# plotly.express (~0.2 s de import) se importa en cada función al construir la
+# primera figura, no al arrancar el worker
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+
+from config import VISUALIZATION_CONFIG
+from src.etl import contar_valores
+from src.cubo import CuboAgregados
+
+def _conteos(fuente, columna):
+    """Conteos por columna desde un DataFrame o un CuboAgregados"""
+    if isinstance(fuente, CuboAgregados):
+        return fuente.conteos(columna)
+    return contar_valores(fuente[columna])
+
+def _barras_histograma(conteos, bordes, **kwargs):
+    """Histograma ya agregado como barras contiguas: la figura lleva bins, no filas"""
+    fig = go.Figure(go.Bar(x=(bordes[:-1] + bordes[1:]) / 2, y=conteos,
+                           width=np.diff(bordes), **kwargs))
+    fig.update_layout(bargap=0)
+    return fig
+
+def _histograma_cubo(cubo, medida, nbins, **kwargs):
+    """Histograma de barras con los bins ya agregados en el cubo"""
+    conteos, bordes = cubo.histograma(medida, nbins)
+    return _barras_histograma(conteos, bordes, **kwargs)
+
+def _numerico(serie):
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+
+def _histograma_filas(serie, nbins, **kwargs):
+    """Histograma de barras con los bins calculados en el servidor con np.histogram"""
+    valores = _numerico(serie)
+    conteos, bordes = np.histogram(valores[~np.isnan(valores)], bins=nbins)
+    return _barras_histograma(conteos, bordes, **kwargs)
+
+def _densidad(x, y, bins):
+    """Mapa de calor con los conteos de un histograma 2D calculado con NumPy"""
+    x, y = _numerico(x), _numerico(y)
+    validos = ~(np.isnan(x) | np.isnan(y))
+    conteos, bordes_x, bordes_y = np.histogram2d(x[validos], y[validos], bins=bins)
+    # Las celdas vacías quedan transparentes
+    z = np.where(conteos > 0, conteos, np.nan).T
+    return go.Figure(go.Heatmap(
+        x=(bordes_x[:-1] + bordes_x[1:]) / 2, y=(bordes_y[:-1] + bordes_y[1:]) / 2, z=z,
+        colorscale='Viridis', colorbar={'title': 'Registros'},
+        hovertemplate='BVD %{x:.1f}<br>Días %{y:.0f}<br>%{z} registros<extra></extra>'))
 
 def crear_grafico_distritos(df):
     """Crea gráfico de barras por distrito (todos)"""
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
-    distrito_counts = df['DISTRITO_NOMBRE'].value_counts().reset_index()
+    distrito_counts = _conteos(df, 'DISTRITO_NOMBRE').reset_index()
     distrito_counts.columns = ['Distrito', 'Cantidad']
     
     fig = px.bar(distrito_counts, 
@@ -21,10 +68,12 @@ def crear_grafico_distritos(df):
 
 def crear_grafico_top_distritos(df, n=10):
     """Crea gráfico de barras para los top n distritos"""
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
-    distrito_counts = df['DISTRITO_NOMBRE'].value_counts().head(n).reset_index()
+    distrito_counts = _conteos(df, 'DISTRITO_NOMBRE').head(n).reset_index()
     distrito_counts.columns = ['Distrito', 'Cantidad']
     
     fig = px.bar(distrito_counts, 
@@ -38,10 +87,12 @@ def crear_grafico_top_distritos(df, n=10):
 
 def crear_grafico_edad(df):
     """Crea gráfico de distribución por edad"""
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
-    edad_counts = df['TRAMO_EDAD'].value_counts().reset_index()
+    edad_counts = _conteos(df, 'TRAMO_EDAD').reset_index()
     edad_counts.columns = ['Tramo_Edad', 'Cantidad']
     
     fig = px.pie(edad_counts, 
@@ -53,10 +104,12 @@ def crear_grafico_edad(df):
 
 def crear_grafico_sexo(df):
     """Crea gráfico de distribución por sexo"""
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
-    sexo_counts = df['SEXO'].value_counts().reset_index()
+    sexo_counts = _conteos(df, 'SEXO').reset_index()
     sexo_counts.columns = ['Sexo', 'Cantidad']
     
     fig = px.bar(sexo_counts, 
@@ -69,10 +122,15 @@ def crear_grafico_sexo(df):
 
 def crear_grafico_evolucion_temporal(df):
     """Crea gráfico de evolución temporal de entradas"""
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
-    mensual = df.groupby('MES_ENTRADA').size().reset_index(name='count')
+    if isinstance(df, CuboAgregados):
+        mensual = df.conteos('MES_ENTRADA').sort_index().reset_index(name='count')
+    else:
+        mensual = df.groupby('MES_ENTRADA', observed=True).size().reset_index(name='count')
     
     fig = px.line(mensual, 
                  x='MES_ENTRADA', 
@@ -88,25 +146,40 @@ def crear_grafico_tiempo_espera(df):
     if df.empty:
         return go.Figure()
     
-    fig = px.histogram(df, 
-                      x='DIAS_EN_ESPERA',
-                      title='Distribución de Días en Lista de Espera',
-                      nbins=20)
+    if isinstance(df, CuboAgregados):
+        fig = _histograma_cubo(df, 'DIAS_EN_ESPERA', 20)
+    else:
+        fig = _histograma_filas(df['DIAS_EN_ESPERA'], 20)
     
-    fig.update_layout(xaxis_title="Días en Espera", yaxis_title="Frecuencia")
+    fig.update_layout(title='Distribución de Días en Lista de Espera',
+                      xaxis_title="Días en Espera", yaxis_title="Frecuencia")
     return fig
 
 def crear_grafico_bvd_vs_espera(df):
-    """Crea scatter plot de BVD vs tiempo de espera"""
+    """Crea scatter plot de BVD vs tiempo de espera
+
+    Por encima de UMBRAL_SCATTER filas se dibuja con WebGL y sin datos de
+    hover, y por encima de UMBRAL_WEBGL como mapa de densidad agregado en el
+    servidor, cuyo tamaño depende de BINS_DENSIDAD y no de las filas.
+    """
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
-    fig = px.scatter(df, 
-                    x='BVD', 
-                    y='DIAS_EN_ESPERA',
-                    color='TRAMO_EDAD',
-                    title='Relación entre BVD y Tiempo de Espera',
-                    hover_data=['DISTRITO_NOMBRE', 'SEXO'])
+    filas = len(df)
+    if filas > VISUALIZATION_CONFIG['UMBRAL_WEBGL']:
+        fig = _densidad(df['BVD'], df['DIAS_EN_ESPERA'], VISUALIZATION_CONFIG['BINS_DENSIDAD'])
+        fig.update_layout(title=f'Relación entre BVD y Tiempo de Espera (densidad de {filas:,} registros)')
+    else:
+        webgl = filas > VISUALIZATION_CONFIG['UMBRAL_SCATTER']
+        fig = px.scatter(df, 
+                        x='BVD', 
+                        y='DIAS_EN_ESPERA',
+                        color='TRAMO_EDAD',
+                        title='Relación entre BVD y Tiempo de Espera',
+                        hover_data=None if webgl else ['DISTRITO_NOMBRE', 'SEXO'],
+                        render_mode='webgl' if webgl else 'auto')
     
     fig.update_layout(xaxis_title="BVD", yaxis_title="Días en Espera")
     return fig
@@ -116,17 +189,19 @@ def crear_grafico_bvd_distribucion(df):
     if df.empty:
         return go.Figure()
     
-    fig = px.histogram(df, 
-                      x='BVD',
-                      title='Distribución de Baremo de Valoración de la Dependencia (BVD)',
-                      nbins=20,
-                      color_discrete_sequence=['#3498db'])
+    if isinstance(df, CuboAgregados):
+        fig = _histograma_cubo(df, 'BVD', 20, marker_color='#3498db')
+    else:
+        fig = _histograma_filas(df['BVD'], 20, marker_color='#3498db')
     
-    fig.update_layout(xaxis_title="BVD", yaxis_title="Frecuencia")
+    fig.update_layout(title='Distribución de Baremo de Valoración de la Dependencia (BVD)',
+                      xaxis_title="BVD", yaxis_title="Frecuencia")
     return fig
 
 def crear_grafico_correlacion(df):
     """Crea heatmap de correlación entre variables numéricas"""
+    import plotly.express as px
+
     if df.empty:
         return go.Figure()
     
@@ -0,0 +1,91 @@
+"""
+Índice precalculado para los filtros de recomendación
+"""
+
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_FILTRO = ['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO']
+
+class IndiceRecomendacion:
+    """Posiciones de filas por (distrito, tramo de edad, sexo), ordenadas por BVD
+
+    Las filas se ordenan una vez por BVD descendente y cada grupo guarda el
+    rango global de sus filas en ese orden. Hay un grupo por cada
+    combinación de valores, incluidas las que usan "Todos" como comodín, así
+    que "top-k con BVD >= x" en cualquier filtro es una búsqueda binaria y
+    un slice, sin copiar ni recorrer el DataFrame.
+    """
+
+    def __init__(self, df):
+        inicio = time.perf_counter()
+        self.df = df
+        # Se conserva el dtype de la columna (float32 en modo compacto) para
+        # comparar con bvd_min igual que lo hace pandas
+        bvd = pd.to_numeric(df['BVD'], errors='coerce').to_numpy()
+        if bvd.dtype.kind != 'f':
+            bvd = bvd.astype(float)
+
+        # Orden global por BVD descendente, estable como nlargest(keep='first');
+        # las filas sin BVD quedan fuera, igual que en nlargest
+        validas = np.flatnonzero(~np.isnan(bvd))
+        self.orden = validas[np.argsort(-bvd[validas], kind='stable')]
+        self.bvd_descendente = bvd[self.orden]
+
+        self.valores = []
+        codigos = []
+        for col in COLUMNAS_FILTRO:
+            cod, uniques = pd.factorize(df[col].to_numpy()[self.orden])
+            self.valores.append({v: i for i, v in enumerate(uniques)})
+            codigos.append(cod.astype(np.int64))
+        self.tamanos = [len(v) + 1 for v in self.valores]
+
+        # Un juego de grupos por patrón de comodines (2^3 patrones)
+        self.grupos = {}
+        for patron in itertools.product([False, True], repeat=len(COLUMNAS_FILTRO)):
+            clave = np.zeros(len(self.orden), dtype=np.int64)
+            for cod, tam, comodin in zip(codigos, self.tamanos, patron):
+                clave = clave * tam + (tam - 1 if comodin else cod)
+            # argsort estable: dentro de cada grupo los rangos siguen ascendentes
+            rangos = np.argsort(clave, kind='stable').astype(np.int32)
+            claves, cortes = np.unique(clave[rangos], return_index=True)
+            limites = np.append(cortes, len(rangos))
+            self.grupos[patron] = (rangos, dict(zip(claves.tolist(), zip(limites[:-1], limites[1:]))))
+
+        print(f"Índice de recomendación: {len(self.orden)} filas "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+    def _rangos(self, distrito, edad, sexo):
+        """Rangos globales (orden BVD descendente) de las filas del filtro"""
+        patron = []
+        clave = 0
+        for valores, tam, valor in zip(self.valores, self.tamanos, [distrito, edad, sexo]):
+            comodin = valor in (None, "Todos")
+            if not comodin and valor not in valores:
+                return np.empty(0, dtype=np.int32)
+            patron.append(comodin)
+            clave = clave * tam + (tam - 1 if comodin else valores[valor])
+        rangos, limites = self.grupos[tuple(patron)]
+        if clave not in limites:
+            return np.empty(0, dtype=np.int32)
+        a, b = limites[clave]
+        return rangos[a:b]
+
+    def posiciones(self, distrito="Todos", edad="Todos", sexo="Todos", bvd_min=0, k=None):
+        """Posiciones (iloc) de las filas con BVD >= bvd_min, de mayor a menor BVD"""
+        rangos = self._rangos(distrito, edad, sexo)
+        if bvd_min and bvd_min > 0:
+            # Las filas con BVD >= bvd_min son un prefijo del orden global
+            umbral = np.asarray(bvd_min, dtype=self.bvd_descendente.dtype)
+            limite = np.searchsorted(-self.bvd_descendente, -umbral, side='right')
+            rangos = rangos[:np.searchsorted(rangos, limite)]
+        if k is not None:
+            rangos = rangos[:k]
+        return self.orden[rangos]
+
+    def seleccionar(self, distrito="Todos", edad="Todos", sexo="Todos", bvd_min=0, k=None):
+        """Filas del filtro como DataFrame; solo se copian las filas devueltas"""
+        return self.df.iloc[self.posiciones(distrito, edad, sexo, bvd_min, k)]
@@ -0,0 +1,267 @@
+"""
+Almacén incremental de extracciones diarias de la lista de espera
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import APP_CONFIG
+from src.etl import limpiar_datos, _guardar_npz, _leer_npz
+
+# Una persona en lista se identifica por su DNI enmascarado y su fecha de entrada
+COLUMNAS_CLAVE = ['DNI', 'FECHA_DE_ENTRADA']
+# Columnas cuyo cambio genera una nueva versión de la fila. NUMERO_ORDEN no
+# entra: es la posición por BVD y cambia a diario aunque la fila no cambie.
+COLUMNAS_CONTENIDO = ['NOMBRE', 'TRAMO_EDAD', 'SEXO', 'DISTRITO_COD', 'DISTRITO', 'BVD']
+SIN_FIN = np.iinfo(np.int32).max
+# Tipo fijo de cada columna de una extracción (los de _guardar_npz); no
+# depende de lo que infiera pandas al leer cada CSV
+ESQUEMA_EXTRACCION = {
+    'NUMERO_ORDEN': 'numero',
+    'DNI': 'texto',
+    'NOMBRE': 'texto',
+    'TRAMO_EDAD': 'texto',
+    'SEXO': 'texto',
+    'DISTRITO_COD': 'numero',
+    'DISTRITO': 'texto',
+    'BVD': 'numero',
+    'FECHA_DE_ENTRADA': 'fecha',
+    'FX_CARGA': 'texto'
+}
+
+def normalizar_extraccion(extraccion):
+    """Columnas de ESQUEMA_EXTRACCION con su tipo fijo
+
+    Los números pasan a float64 (admiten coma decimal: '50', '50.0', '50,0'
+    y '050' son el mismo valor), los textos a str sin espacios en los
+    extremos y las fechas a datetime64. ValueError si falta alguna columna.
+    """
+    faltan = [col for col in ESQUEMA_EXTRACCION if col not in extraccion.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas en la extracción: {', '.join(faltan)}")
+    columnas = {}
+    for col, tipo in ESQUEMA_EXTRACCION.items():
+        serie = extraccion[col]
+        if tipo == 'numero':
+            if not pd.api.types.is_numeric_dtype(serie):
+                serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
+            columnas[col] = pd.to_numeric(serie, errors='coerce').astype('float64')
+        elif tipo == 'fecha':
+            columnas[col] = pd.to_datetime(serie, errors='coerce', format='ISO8601')
+        else:
+            columnas[col] = serie.astype(str).str.strip().where(serie.notna())
+    return pd.DataFrame(columnas, index=extraccion.index)
+
+def _hash_filas(df, columnas):
+    """Hash de 64 bits por fila de las columnas indicadas (ya normalizadas)"""
+    return pd.util.hash_pandas_object(df[columnas], index=False).to_numpy()
+
+class AlmacenSnapshots:
+    """Guarda cada extracción (FX_CARGA) solo con las filas nuevas o cambiadas
+
+    Cada fila almacenada tiene un intervalo de vigencia [desde, hasta) en
+    ordinales de snapshot, así que cualquier extracción, la última o una
+    histórica, se reconstruye desde el almacén sin volver a leer los CSV.
+
+    Cada snapshot escribe su segmento y su propia tabla de vigencia
+    (vigencia_NNNNN.npz) y solo después el manifiesto, que es quien dice
+    cuál es el último. Si el proceso se corta antes, el manifiesto sigue
+    apuntando a la vigencia anterior y al reintentar se vuelve a aplicar
+    el diff sobre ella, no dos veces.
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or APP_CONFIG['SNAPSHOT_DIR']
+        self.ruta_manifiesto = os.path.join(self.directorio, 'manifiesto.json')
+        self._segmentos = {}
+        self.manifiesto = self._leer_manifiesto()
+
+    def _leer_manifiesto(self):
+        if not os.path.exists(self.ruta_manifiesto):
+            return {'snapshots': [], 'columnas': None}
+        with open(self.ruta_manifiesto, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _escribir_manifiesto(self):
+        tmp = self.ruta_manifiesto + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifiesto, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.ruta_manifiesto)
+
+    def _ruta_vigencia(self, ordinal):
+        return os.path.join(self.directorio, f'vigencia_{ordinal:05d}.npz')
+
+    def _leer_vigencia(self):
+        """Vigencia del último snapshot del manifiesto"""
+        ordinal = len(self.manifiesto['snapshots']) - 1
+        if ordinal < 0:
+            return {
+                'clave': np.empty(0, dtype=np.uint64),
+                'contenido': np.empty(0, dtype=np.uint64),
+                'segmento': np.empty(0, dtype=np.int32),
+                'fila': np.empty(0, dtype=np.int32),
+                'desde': np.empty(0, dtype=np.int32),
+                'hasta': np.empty(0, dtype=np.int32)
+            }
+        with np.load(self._ruta_vigencia(ordinal), allow_pickle=False) as datos:
+            return {k: datos[k] for k in datos.files}
+
+    def _escribir_vigencia(self, vigencia, ordinal):
+        ruta = self._ruta_vigencia(ordinal)
+        tmp = ruta + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **vigencia)
+        os.replace(tmp, ruta)
+
+    def _ruta_segmento(self, ordinal):
+        return os.path.join(self.directorio, f'segmento_{ordinal:05d}.npz')
+
+    def _leer_segmento(self, ordinal):
+        """Lee (y recuerda) las filas añadidas por un snapshot"""
+        if ordinal not in self._segmentos:
+            self._segmentos[ordinal] = _leer_npz(self._ruta_segmento(ordinal),
+                                                 self.manifiesto['columnas'])
+        return self._segmentos[ordinal]
+
+    def snapshots(self):
+        """Fechas de carga disponibles, de la más antigua a la más reciente"""
+        return [s['fx_carga'] for s in self.manifiesto['snapshots']]
+
+    def ingerir(self, ruta):
+        """Añade al almacén las extracciones de un CSV, una por cada FX_CARGA
+
+        Todo se lee como texto y se normaliza con normalizar_extraccion, de
+        modo que el esquema y los hashes son los mismos en todos los CSV.
+        """
+        crudo = pd.read_csv(ruta, sep=';', encoding='utf-8', dtype=str)
+        try:
+            crudo = normalizar_extraccion(crudo)
+        except ValueError as e:
+            print(f"{ruta} no se ingiere: {e}")
+            return [{'fx_carga': None, 'omitido': True, 'motivo': str(e)}]
+        resumenes = []
+        for fx_carga, extraccion in crudo.groupby('FX_CARGA', sort=True):
+            resumenes.append(self._ingerir_extraccion(str(fx_carga), extraccion))
+        return resumenes
+
+    def _ingerir_extraccion(self, fx_carga, extraccion):
+        inicio = time.perf_counter()
+        conocidos = self.snapshots()
+        if fx_carga in conocidos:
+            print(f"Snapshot {fx_carga} ya ingerido, se omite")
+            return {'fx_carga': fx_carga, 'omitido': True}
+        if conocidos and fx_carga < conocidos[-1]:
+            print(f"Snapshot {fx_carga} anterior al último ({conocidos[-1]}), se omite")
+            return {'fx_carga': fx_carga, 'omitido': True}
+        if self.manifiesto['columnas'] not in (None, ESQUEMA_EXTRACCION):
+            motivo = f"el almacén tiene otro esquema ({self.manifiesto['columnas']})"
+            print(f"Snapshot {fx_carga} no se ingiere: {motivo}")
+            return {'fx_carga': fx_carga, 'omitido': True, 'motivo': motivo}
+
+        extraccion = extraccion.drop_duplicates(COLUMNAS_CLAVE).reset_index(drop=True)
+        claves = _hash_filas(extraccion, COLUMNAS_CLAVE)
+        contenidos = _hash_filas(extraccion, COLUMNAS_CONTENIDO)
+
+        vigencia = self._leer_vigencia()
+        ordinal = len(conocidos)
+        abiertas = np.flatnonzero(vigencia['hasta'] == SIN_FIN)
+
+        # Emparejar la extracción con las filas vigentes del snapshot anterior
+        posiciones = pd.Index(vigencia['clave'][abiertas]).get_indexer(claves)
+        nuevas = posiciones < 0
+        cambiadas = np.zeros(len(extraccion), dtype=bool)
+        if len(abiertas):
+            previos = vigencia['contenido'][abiertas[np.maximum(posiciones, 0)]]
+            cambiadas = ~nuevas & (previos != contenidos)
+        seguidas = abiertas[posiciones[~nuevas & ~cambiadas]]
+
+        # Se cierran las vigentes que cambian o que ya no aparecen (bajas)
+        cerrar = np.setdiff1d(abiertas, seguidas)
+        vigencia['hasta'][cerrar] = ordinal
+
+        anadir = nuevas | cambiadas
+        segmento = extraccion[anadir].reset_index(drop=True)
+        n = len(segmento)
+        os.makedirs(self.directorio, exist_ok=True)
+        columnas = _guardar_npz(segmento, self._ruta_segmento(ordinal))
+        if columnas != ESQUEMA_EXTRACCION:
+            raise ValueError(f"Segmento {ordinal} con esquema {columnas}, se esperaba {ESQUEMA_EXTRACCION}")
+        self.manifiesto['columnas'] = columnas
+
+        for nombre, valores in [('clave', claves[anadir]), ('contenido', contenidos[anadir]),
+                                ('segmento', np.full(n, ordinal, dtype=np.int32)),
+                                ('fila', np.arange(n, dtype=np.int32)),
+                                ('desde', np.full(n, ordinal, dtype=np.int32)),
+                                ('hasta', np.full(n, SIN_FIN, dtype=np.int32))]:
+            vigencia[nombre] = np.concatenate([vigencia[nombre], valores])
+        self._escribir_vigencia(vigencia, ordinal)
+
+        resumen = {
+            'fx_carga': fx_carga,
+            'filas': len(extraccion),
+            'nuevas': int(nuevas.sum()),
+            'cambiadas': int(cambiadas.sum()),
+            'bajas': int(len(cerrar) - cambiadas.sum()),
+            'sin_cambios': int(len(seguidas))
+        }
+        # El manifiesto se escribe al final: un snapshot solo existe si está completo
+        self.manifiesto['snapshots'].append(resumen)
+        self._escribir_manifiesto()
+        if ordinal > 0:
+            # La vigencia anterior ya no es la del manifiesto
+            try:
+                os.remove(self._ruta_vigencia(ordinal - 1))
+            except OSError:
+                pass
+
+        print(f"Snapshot {fx_carga}: {resumen['nuevas']} nuevas, {resumen['cambiadas']} cambiadas, "
+              f"{resumen['bajas']} bajas ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return resumen
+
+    def cargar_snapshot(self, fx_carga=None):
+        """Devuelve la extracción de `fx_carga` (por defecto la última) ya limpia
+
+        DIAS_EN_ESPERA se calcula respecto a la FX_CARGA de ese snapshot y
+        NUMERO_ORDEN se recalcula como la posición por BVD descendente.
+        """
+        conocidos = self.snapshots()
+        if not conocidos:
+            return pd.DataFrame()
+        fx_carga = fx_carga or conocidos[-1]
+        if fx_carga not in conocidos:
+            print(f"Snapshot {fx_carga} no encontrado")
+            return pd.DataFrame()
+        ordinal = conocidos.index(fx_carga)
+
+        vigencia = self._leer_vigencia()
+        vigentes = np.flatnonzero((vigencia['desde'] <= ordinal) & (vigencia['hasta'] > ordinal))
+        partes = []
+        for segmento in np.unique(vigencia['segmento'][vigentes]):
+            filas = vigencia['fila'][vigentes[vigencia['segmento'][vigentes] == segmento]]
+            partes.append(self._leer_segmento(int(segmento)).iloc[filas])
+        if not partes:
+            return pd.DataFrame()
+
+        df = pd.concat(partes, ignore_index=True)
+        # Columnas numéricas enteras y sin nulos como las infiere read_csv
+        for col in [c for c, tipo in ESQUEMA_EXTRACCION.items() if tipo == 'numero']:
+            if df[col].notna().all() and (df[col] == np.trunc(df[col])).all():
+                df[col] = df[col].astype('int64')
+        df = df.sort_values('BVD', ascending=False, kind='stable').reset_index(drop=True)
+        df['NUMERO_ORDEN'] = np.arange(1, len(df) + 1)
+        df['FX_CARGA'] = fx_carga
+        df = limpiar_datos(df)
+        df.attrs['huella'] = f'snapshot-{fx_carga}'
+        return df
+
+if __name__ == '__main__':
+    import sys
+
+    almacen = AlmacenSnapshots()
+    for ruta in sys.argv[1:]:
+        almacen.ingerir(ruta)
+    print(f"Snapshots disponibles: {almacen.snapshots()}")
@@ -1,50 +1,114 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import joblib
+import glob
+import importlib
+import json
+import os
+import time
+import weakref
+
+from config import ML_CONFIG
+from src.artefactos import AlmacenModelos, fijar_hilos_prediccion
+from src.bosque import exportar_bosque
+
+# sklearn solo se importa al entrenar: para predecir basta el bosque compilado
+
+CATEGORICAS = ['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO']
+FEATURES = ['DISTRITO_NOMBRE_encoded', 'TRAMO_EDAD_encoded', 'SEXO_encoded', 'BVD']
+ESTIMADORES = {
+    'random_forest': 'sklearn.ensemble.RandomForestRegressor',
+    'hist_gradient_boosting': 'sklearn.ensemble.HistGradientBoostingRegressor'
+}
+NOMBRES_ESTIMADOR = {
+    'random_forest': 'Random Forest',
+    'hist_gradient_boosting': 'Histogram Gradient Boosting'
+}
+MENSAJES_DESCONOCIDO = {
+    'DISTRITO_NOMBRE': "Distrito '{}' no encontrado en datos de entrenamiento",
+    'TRAMO_EDAD': "Edad '{}' no encontrada en datos de entrenamiento",
+    'SEXO': "Sexo '{}' no encontrado en datos de entrenamiento"
+}
+
+def crear_estimador(nombre=None, **parametros):
+    """Instancia el estimador `nombre` con los parámetros de ML_CONFIG (y `parametros` encima)
+
+    El gradient boosting trata distrito, edad y sexo como categóricas
+    nativas en vez de como enteros ordinales.
+    """
+    nombre = nombre or ML_CONFIG['ESTIMADOR']
+    if nombre not in ESTIMADORES:
+        raise ValueError(f"Estimador desconocido: {nombre}")
+    config = {**ML_CONFIG['PARAMETROS_ESTIMADOR'].get(nombre, {}), **parametros}
+    config.setdefault('random_state', ML_CONFIG['RANDOM_STATE'])
+    if nombre == 'random_forest':
+        config.setdefault('n_estimators', ML_CONFIG['N_ESTIMATORS'])
+    if nombre == 'hist_gradient_boosting':
+        config['categorical_features'] = [f.endswith('_encoded') for f in FEATURES]
+    modulo, clase = ESTIMADORES[nombre].rsplit('.', 1)
+    return getattr(importlib.import_module(modulo), clase)(**config)
 
 class ModeloPrediccion:
-    def __init__(self):
+    def __init__(self, estimador=None):
+        self.estimador = estimador or ML_CONFIG['ESTIMADOR']
         self.model = None
         self.label_encoders = {}
         self.metrics = {}
+        self.parametros = {}
+        self.ajuste = {}
+        self.artefacto = {}
+        self.modelos_cuantiles = None
+        self.bosque = None
+        self.tabla = None
+        self.tabla_info = {}
+        self._version = (None, None)
+        self._hojas = (None, None)
+        self._esperas = (lambda: None, None, None)
         
-    def entrenar_modelo(self, df):
-        """Entrena un modelo para predecir tiempo de espera"""
+    def entrenar_modelo(self, df, activar=True, parametros=None):
+        """Entrena un modelo para predecir tiempo de espera
+
+        El modelo se guarda como versión nueva del almacén de artefactos;
+        con `activar=False` se guarda sin publicarla (para validarla antes).
+        `parametros` sustituye a los de ML_CONFIG para este entrenamiento.
+        """
+        from sklearn.preprocessing import LabelEncoder
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
         try:
             # Preparar datos para ML
             df_ml = df.copy()
             
             # Codificar variables categóricas
-            categorical_cols = ['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO']
-            for col in categorical_cols:
+            for col in CATEGORICAS:
                 le = LabelEncoder()
                 df_ml[col + '_encoded'] = le.fit_transform(df_ml[col].astype(str))
                 self.label_encoders[col] = le
             
             # Características y objetivo
-            features = ['DISTRITO_NOMBRE_encoded', 'TRAMO_EDAD_encoded', 'SEXO_encoded', 'BVD']
-            X = df_ml[features]
+            X = df_ml[FEATURES]
             y = df_ml['DIAS_EN_ESPERA']  # Usamos días en espera como objetivo
             
             # Dividir datos en entrenamiento y prueba
             X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
+                X, y, test_size=ML_CONFIG['TEST_SIZE'], random_state=ML_CONFIG['RANDOM_STATE']
             )
             
             # Entrenar modelo
-            self.model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                min_samples_split=5,
-                min_samples_leaf=2,
-                random_state=42,
-                n_jobs=-1
-            )
+            parametros = parametros or {}
+            self.model = crear_estimador(self.estimador, **parametros)
+            self.parametros = {**ML_CONFIG['PARAMETROS_ESTIMADOR'].get(self.estimador, {}), **parametros}
             self.model.fit(X_train, y_train)
+            self.bosque = None
+
+            # Sin árboles de los que sacar el intervalo: un modelo por cuantil
+            self.modelos_cuantiles = None
+            if not hasattr(self.model, 'estimators_'):
+                self.modelos_cuantiles = {}
+                for nombre, q in zip(['inferior', 'superior'], ML_CONFIG['INTERVALO_CUANTILES']):
+                    self.modelos_cuantiles[nombre] = crear_estimador(self.estimador, **parametros,
+                                                                     loss='quantile', quantile=q)
+                    self.modelos_cuantiles[nombre].fit(X_train, y_train)
             
             # Evaluar modelo
             y_pred = self.model.predict(X_test)
@@ -55,16 +119,16 @@ class ModeloPrediccion:
                 'train_size': len(X_train),
                 'test_size': len(X_test)
             }
+            fijar_hilos_prediccion(self.model)
             
             print(f"Modelo entrenado. Métricas:")
             print(f"  MAE: {self.metrics['MAE']:.2f}")
             print(f"  RMSE: {self.metrics['RMSE']:.2f}")
             print(f"  R²: {self.metrics['R2']:.4f}")
             
-            # Guardar modelo
-            joblib.dump(self.model, 'modelo_espera.pkl')
-            joblib.dump(self.label_encoders, 'label_encoders.pkl')
-            joblib.dump(self.metrics, 'modelo_metrics.pkl')
+            # Guardar modelo como nueva versión del almacén de artefactos
+            version = AlmacenModelos().guardar(self, huella_datos=df.attrs.get('huella'), activar=activar)
+            self.artefacto = AlmacenModelos().manifiesto(version)
             
             return True
             
@@ -72,10 +136,35 @@ class ModeloPrediccion:
             print(f"Error entrenando modelo: {e}")
             return False
     
+    def ajustar_hiperparametros(self, df, activar=False, **opciones):
+        """Busca hiperparámetros con validación cruzada temporal y entrena con los mejores
+
+        La búsqueda (ver src.ajuste.buscar_hiperparametros) queda en el
+        manifiesto de la versión, con el MAE y los tiempos de ajuste y
+        predicción de cada configuración. Por defecto la versión se guarda
+        sin activar.
+        """
+        from src.ajuste import buscar_hiperparametros
+
+        self.ajuste = buscar_hiperparametros(df, self.estimador, **opciones)
+        return self.entrenar_modelo(df, activar=activar, parametros=self.ajuste['mejor']['parametros'])
+
+    @property
+    def disponible(self):
+        """Hay un modelo con el que predecir (el de sklearn o el bosque compilado)"""
+        return self.model is not None or self.bosque is not None
+
+    def exportar_bosque(self, ruta):
+        """Exporta el bosque entrenado a arrays planos (ver src.bosque); False si no es un bosque"""
+        if not hasattr(self.model, 'estimators_'):
+            return False
+        exportar_bosque(self.model, self.label_encoders, ruta, self.huella_modelo())
+        return True
+
     def predecir_tiempo_espera(self, distrito, edad, sexo, bvd):
         """Predice el tiempo de espera para un paciente específico"""
         try:
-            if self.model is None:
+            if not self.disponible:
                 return "Modelo no disponible"
             
             # Verificar que las categorías existen en los encoders
@@ -88,23 +177,21 @@ class ModeloPrediccion:
                     return f"Sexo '{sexo}' no encontrado en datos de entrenamiento"
             
             # Codificar entradas
-            distrito_enc = self.label_encoders['DISTRITO_NOMBRE'].transform([distrito])[0]
-            edad_enc = self.label_encoders['TRAMO_EDAD'].transform([edad])[0]
-            sexo_enc = self.label_encoders['SEXO'].transform([sexo])[0]
+            distrito_enc = self.codificar_columna('DISTRITO_NOMBRE', [distrito])[0]
+            edad_enc = self.codificar_columna('TRAMO_EDAD', [edad])[0]
+            sexo_enc = self.codificar_columna('SEXO', [sexo])[0]
             
             # Crear array de características
-            X_new = np.array([[distrito_enc, edad_enc, sexo_enc, bvd]])
-            
-            # Predecir
-            prediccion = self.model.predict(X_new)[0]
+            X_new = pd.DataFrame([[distrito_enc, edad_enc, sexo_enc, bvd]], columns=FEATURES)
             
-            # Añadir intervalo de confianza (simulado basado en RMSE)
-            intervalo_confianza = self.metrics.get('RMSE', 30) * 1.96
+            # Predecir con el intervalo de la propia fila
+            prediccion, inferior, superior = (v[0] for v in self._predecir_con_intervalo(X_new))
+            intervalo_confianza = (superior - inferior) / 2
             
             return {
                 'prediccion': max(0, int(prediccion)),
-                'intervalo_min': max(0, int(prediccion - intervalo_confianza)),
-                'intervalo_max': max(0, int(prediccion + intervalo_confianza)),
+                'intervalo_min': max(0, int(inferior)),
+                'intervalo_max': max(0, int(superior)),
                 'confianza': min(95, max(50, 100 - (intervalo_confianza / 10)))
             }
             
@@ -112,62 +199,440 @@ class ModeloPrediccion:
             print(f"Error en predicción: {e}")
             return f"Error en predicción: {str(e)}"
     
+    def codificar_columna(self, col, valores):
+        """Codifica una columna entera con su LabelEncoder; -1 si la categoría no se vio"""
+        clases = self.label_encoders[col].classes_
+        valores = pd.Series(valores).astype(str).to_numpy()
+        return pd.Categorical(valores, categories=clases).codes.astype(np.int64)
+
+    def predecir_lote(self, df):
+        """Predice el tiempo de espera de todas las filas de `df` con una sola llamada
+
+        `df` necesita DISTRITO_NOMBRE, TRAMO_EDAD, SEXO y BVD. Devuelve un
+        DataFrame con el mismo índice y las columnas prediccion,
+        intervalo_min, intervalo_max y confianza (NaN en las filas no
+        válidas), `valido` y `motivo` con la causa cuando una fila tiene una
+        categoría no vista en el entrenamiento.
+        """
+        n = len(df)
+        resultado = pd.DataFrame({
+            'prediccion': np.full(n, np.nan),
+            'intervalo_min': np.full(n, np.nan),
+            'intervalo_max': np.full(n, np.nan),
+            'confianza': np.full(n, np.nan),
+            'valido': np.zeros(n, dtype=bool),
+            'motivo': np.full(n, '', dtype=object)
+        }, index=df.index)
+        if not self.disponible:
+            resultado['motivo'] = "Modelo no disponible"
+            return resultado
+
+        # Codificar columnas completas y marcar las categorías desconocidas
+        codigos = {}
+        valido = np.ones(n, dtype=bool)
+        motivo = resultado['motivo'].to_numpy()
+        for col in CATEGORICAS:
+            codigos[col] = self.codificar_columna(col, df[col])
+            desconocidos = valido & (codigos[col] < 0)
+            if desconocidos.any():
+                valores = df[col].to_numpy()[desconocidos]
+                motivo[desconocidos] = [MENSAJES_DESCONOCIDO[col].format(v) for v in valores]
+                valido &= ~desconocidos
+        bvd = pd.to_numeric(df['BVD'], errors='coerce').to_numpy(dtype=float)
+        sin_bvd = valido & np.isnan(bvd)
+        motivo[sin_bvd] = "BVD no válido"
+        valido &= ~sin_bvd
+
+        if valido.any():
+            X = pd.DataFrame({
+                'DISTRITO_NOMBRE_encoded': codigos['DISTRITO_NOMBRE'][valido],
+                'TRAMO_EDAD_encoded': codigos['TRAMO_EDAD'][valido],
+                'SEXO_encoded': codigos['SEXO'][valido],
+                'BVD': bvd[valido]
+            })
+            if self.tabla is not None:
+                prediccion, inferior, superior = self._predecir_tabla(X.to_numpy()).T
+            else:
+                prediccion, inferior, superior = self._predecir_con_intervalo(X)
+
+            # Mismos redondeos que predecir_tiempo_espera
+            intervalo_confianza = (superior - inferior) / 2
+            resultado.loc[valido, 'prediccion'] = np.maximum(0, np.trunc(prediccion))
+            resultado.loc[valido, 'intervalo_min'] = np.maximum(0, np.trunc(inferior))
+            resultado.loc[valido, 'intervalo_max'] = np.maximum(0, np.trunc(superior))
+            resultado.loc[valido, 'confianza'] = np.clip(100 - intervalo_confianza / 10, 50, 95)
+        resultado['valido'] = valido
+        resultado['motivo'] = motivo
+        return resultado
+
+    def predecir_filas(self, df, posiciones=None):
+        """Espera prevista (días, truncada como en predecir_lote) de cada fila de `df`
+
+        Es la entrada del score de recomendación de todos los candidatos: se
+        calcula en una pasada por bloques de BLOQUE_PREDICCION y se memoriza
+        para este mismo objeto `df` y la versión del modelo, así que cada
+        consulta solo indexa este vector. La clave no es df.attrs['huella']:
+        pandas copia los attrs a cada subconjunto filtrado. Con `posiciones`
+        se devuelven solo esas filas; si el vector de `df` no está ya
+        calculado se predicen solo ellas, sin memorizar. Solo se necesita la
+        predicción puntual, no el intervalo. Las filas con categorías no
+        vistas o sin BVD quedan en NaN.
+        """
+        referencia, clave, esperas = self._esperas
+        if referencia() is not df or clave != (len(df), id(df.index), self.version):
+            if posiciones is not None:
+                return self._calcular_esperas(df.iloc[posiciones])
+            esperas = self._calcular_esperas(df)
+            self._esperas = (weakref.ref(df), (len(df), id(df.index), self.version), esperas)
+        return esperas if posiciones is None else esperas[posiciones]
+
+    def _calcular_esperas(self, df):
+        """Espera prevista de cada fila de `df`, sin memorizar (ver predecir_filas)"""
+        inicio = time.perf_counter()
+        esperas = np.full(len(df), np.nan)
+        if self.disponible and len(df):
+            codigos = [self.codificar_columna(col, df[col]) for col in CATEGORICAS]
+            bvd = df['BVD'].to_numpy(dtype=float)
+            valido = np.logical_and.reduce([c >= 0 for c in codigos] + [~np.isnan(bvd)])
+            X = np.column_stack(codigos + [bvd])[valido]
+            bloque = ML_CONFIG['BLOQUE_PREDICCION']
+            prediccion = np.concatenate([self._predecir_puntual(X[i:i + bloque])
+                                         for i in range(0, len(X), bloque)] or [np.empty(0)])
+            esperas[valido] = np.maximum(0, np.trunc(prediccion))
+            print(f"Esperas previstas para {len(df)} filas "
+                  f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+        return esperas
+
+    def _predecir_puntual(self, X):
+        """Predicción sin intervalo de X (códigos y BVD, ndarray)"""
+        if self.tabla is not None:
+            return self._predecir_tabla(X)[:, 0]
+        if self.bosque is not None:
+            return self.bosque.predicciones_arboles(X).mean(axis=1)
+        return self.model.predict(pd.DataFrame(X, columns=FEATURES))
+
+    def _valores_hojas(self):
+        """Valores de hoja de todos los árboles en un solo vector y el desplazamiento de cada árbol"""
+        if self._hojas[0] is not self.model:
+            arboles = [t.tree_ for t in self.model.estimators_]
+            desplazamientos = np.cumsum([0] + [t.node_count for t in arboles[:-1]])
+            valores = np.concatenate([t.value[:, 0, 0] for t in arboles])
+            self._hojas = (self.model, (valores, desplazamientos))
+        return self._hojas[1]
+
+    def predicciones_arboles(self, X):
+        """Matriz filas × árboles con la predicción de cada árbol del bosque
+
+        `apply` obtiene la hoja de cada fila en todos los árboles en una
+        llamada y los valores se leen con una sola indexación sobre el
+        vector de hojas; la media por fila es exactamente `predict`. Con el
+        bosque compilado el recorrido se hace en NumPy, sin sklearn.
+        """
+        if self.bosque is not None:
+            return self.bosque.predicciones_arboles(np.asarray(X))
+        valores, desplazamientos = self._valores_hojas()
+        return valores[self.model.apply(X) + desplazamientos]
+
+    def _predecir_con_intervalo(self, X):
+        """Predicción e intervalo (cuantiles de INTERVALO_CUANTILES) de cada fila de X
+
+        En el bosque el intervalo son los cuantiles de las predicciones de
+        los árboles, calculados en la misma pasada que la predicción y por
+        bloques de BLOQUE_PREDICCION filas para acotar la memoria. Con
+        gradient boosting se usan los modelos de cuantiles y, si no hay
+        ninguno de los dos, ±1.96·RMSE como antes.
+        """
+        if self.bosque is not None or hasattr(self.model, 'estimators_'):
+            cuantiles = ML_CONFIG['INTERVALO_CUANTILES']
+            bloque = ML_CONFIG['BLOQUE_PREDICCION']
+            partes = []
+            for inicio in range(0, len(X), bloque):
+                arboles = self.predicciones_arboles(X.iloc[inicio:inicio + bloque])
+                partes.append(np.vstack([arboles.mean(axis=1), np.quantile(arboles, cuantiles, axis=1)]))
+            prediccion, inferior, superior = np.hstack(partes) if partes else np.empty((3, 0))
+        else:
+            prediccion = self.model.predict(X)
+            if self.modelos_cuantiles:
+                inferior = self.modelos_cuantiles['inferior'].predict(X)
+                superior = self.modelos_cuantiles['superior'].predict(X)
+            else:
+                intervalo = self.metrics.get('RMSE', 30) * 1.96
+                inferior, superior = prediccion - intervalo, prediccion + intervalo
+        # El intervalo siempre contiene la predicción puntual
+        return prediccion, np.minimum(inferior, prediccion), np.maximum(superior, prediccion)
+
+    def _rejilla_tabla(self, resolucion_bvd):
+        """Todas las combinaciones distrito × edad × sexo × BVD cuantizado"""
+        tamanos = [len(self.label_encoders[col].classes_) for col in CATEGORICAS]
+        n_bvd = int(round(100 / resolucion_bvd)) + 1
+        ejes = [np.arange(n) for n in tamanos] + [np.arange(n_bvd) * resolucion_bvd]
+        malla = np.meshgrid(*ejes, indexing='ij')
+        X = pd.DataFrame({f: m.ravel() for f, m in zip(FEATURES, malla)})
+        return X, tamanos + [n_bvd]
+
+    def _predecir_tabla(self, X):
+        """Predicción e intervalo por indexación en la tabla: X con códigos y BVD
+
+        Devuelve una fila (predicción, inferior, superior) por entrada.
+        """
+        resolucion = self.tabla_info['resolucion_bvd']
+        n_bvd = self.tabla.shape[-2]
+        indice_bvd = np.clip(np.rint(X[:, 3] / resolucion), 0, n_bvd - 1).astype(np.int64)
+        return np.asarray(self.tabla[X[:, 0].astype(np.int64), X[:, 1].astype(np.int64),
+                                     X[:, 2].astype(np.int64), indice_bvd], dtype=float)
+
+    def huella_modelo(self):
+        """Hash estable del modelo entrenado
+
+        En los bosques se calcula sobre los arrays de cada árbol: el estado
+        completo de `tree_` incluye bytes de relleno que cambian al guardar
+        y volver a cargar con joblib. El bosque compilado lleva la huella del
+        modelo del que se exportó.
+        """
+        import joblib
+
+        if self.model is None and self.bosque is not None:
+            return self.bosque.huella
+        if hasattr(self.model, 'estimators_'):
+            return joblib.hash([(t.tree_.feature, t.tree_.threshold, t.tree_.value,
+                                 t.tree_.children_left, t.tree_.children_right)
+                                for t in self.model.estimators_])
+        return joblib.hash(self.model)
+
+    @property
+    def version(self):
+        """Versión del modelo actual; se recalcula solo cuando cambia el modelo"""
+        if not self.disponible:
+            return None
+        objeto = self.model if self.model is not None else self.bosque
+        if self._version[0] is not objeto:
+            self._version = (objeto, self.huella_modelo())
+        return self._version[1]
+
+    def _huella_tabla(self):
+        """Identifica el modelo y los encoders para los que vale una tabla"""
+        return {
+            'modelo': self.huella_modelo(),
+            'clases': {col: [str(c) for c in self.label_encoders[col].classes_] for col in CATEGORICAS}
+        }
+
+    def ruta_tabla(self):
+        """Ruta de la tabla de este modelo: TABLA_PATH con la huella del modelo
+
+        Cada versión tiene su propia tabla, así que compilar la de un modelo
+        nuevo no pisa la que otro worker tiene abierta con el anterior.
+        """
+        base, extension = os.path.splitext(ML_CONFIG['TABLA_PATH'])
+        return f"{base}_{self.version[:16]}{extension}"
+
+    def _purgar_tablas(self, ruta):
+        """Borra las tablas de otros modelos por encima de VERSIONES_CONSERVADAS"""
+        base, extension = os.path.splitext(ML_CONFIG['TABLA_PATH'])
+        otras = [r for r in glob.glob(f"{glob.escape(base)}_*{extension}") if r != ruta]
+        otras.sort(key=os.path.getmtime)
+        for vieja in otras[:max(len(otras) - ML_CONFIG['VERSIONES_CONSERVADAS'] + 1, 0)]:
+            for fichero in (vieja, os.path.splitext(vieja)[0] + '.json'):
+                try:
+                    os.remove(fichero)
+                except OSError:
+                    pass
+
+    def compilar_tabla(self, resolucion_bvd=None, ruta=None, muestras_verificacion=100000):
+        """Precalcula el bosque sobre todo el espacio discreto de entrada
+
+        Genera una tabla densa distrito × edad × sexo × BVD (con paso
+        `resolucion_bvd` en [0, 100]) con la predicción y los dos extremos
+        del intervalo en el último eje, la guarda como .npy (por defecto en
+        ruta_tabla()) y la vuelve a abrir memory-mapped. La desviación
+        respecto al bosque exacto se mide sobre `muestras_verificacion`
+        entradas aleatorias con BVD de dos decimales. El .json de metadatos
+        se escribe antes que la tabla y los dos por fichero temporal y
+        os.replace: una tabla publicada siempre tiene su .json completo.
+        """
+        if not self.disponible:
+            return False
+        resolucion_bvd = resolucion_bvd or ML_CONFIG['TABLA_RESOLUCION_BVD']
+        ruta = ruta or self.ruta_tabla()
+        inicio = time.perf_counter()
+
+        X, forma = self._rejilla_tabla(resolucion_bvd)
+        tabla = np.column_stack(self._predecir_con_intervalo(X)).astype(np.float32).reshape(forma + [3])
+
+        # Desviación máxima frente al bosque en entradas no cuantizadas
+        rng = np.random.default_rng(0)
+        muestra = pd.DataFrame({f: rng.integers(0, n, muestras_verificacion)
+                                for f, n in zip(FEATURES[:3], forma[:3])})
+        muestra['BVD'] = np.round(rng.uniform(0, 100, muestras_verificacion), 2)
+        exacto = self._predecir_con_intervalo(muestra)[0]
+        self.tabla = tabla
+        self.tabla_info = {'resolucion_bvd': resolucion_bvd}
+        desviacion = np.abs(self._predecir_tabla(muestra.to_numpy())[:, 0] - exacto)
+
+        self.tabla_info = {
+            'resolucion_bvd': resolucion_bvd,
+            'forma': forma,
+            'canales': ['prediccion', 'inferior', 'superior'],
+            'desviacion_maxima': float(desviacion.max()),
+            'desviacion_media': float(desviacion.mean()),
+            'muestras_verificacion': muestras_verificacion,
+            **self._huella_tabla()
+        }
+        ruta_info = os.path.splitext(ruta)[0] + '.json'
+        tmp = f"{ruta_info}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.tabla_info, f, ensure_ascii=False)
+        os.replace(tmp, ruta_info)
+        tmp = f"{ruta}.{os.getpid()}.tmp.npy"
+        np.save(tmp, tabla)
+        os.replace(tmp, ruta)
+        if ruta == self.ruta_tabla():
+            self._purgar_tablas(ruta)
+
+        print(f"Tabla de predicción {forma} compilada en {time.perf_counter() - inicio:.2f} s "
+              f"({tabla.nbytes / 1024:.0f} KiB, desviación máx. {self.tabla_info['desviacion_maxima']:.2f} días, "
+              f"media {self.tabla_info['desviacion_media']:.3f})")
+        return self.cargar_tabla(ruta)
+
+    def cargar_tabla(self, ruta=None):
+        """Abre la tabla memory-mapped si corresponde al modelo y encoders actuales"""
+        if not self.disponible:
+            return False
+        ruta = ruta or self.ruta_tabla()
+        ruta_info = os.path.splitext(ruta)[0] + '.json'
+        if not (os.path.exists(ruta) and os.path.exists(ruta_info)):
+            return False
+        with open(ruta_info, encoding='utf-8') as f:
+            info = json.load(f)
+        huella = self._huella_tabla()
+        if info.get('modelo') != huella['modelo'] or info.get('clases') != huella['clases'] \
+                or 'canales' not in info:
+            print("Tabla de predicción desactualizada para el modelo actual")
+            return False
+        self.tabla = np.load(ruta, mmap_mode='r')
+        self.tabla_info = info
+        return True
+
     def obtener_importancia_caracteristicas(self):
         """Obtiene la importancia de cada característica en el modelo"""
         if self.model is None:
             return {}
         
         feature_names = ['Distrito', 'Edad', 'Sexo', 'BVD']
-        importances = self.model.feature_importances_
+        # El gradient boosting por histogramas no calcula importancias
+        importances = getattr(self.model, 'feature_importances_', None)
+        if importances is None:
+            return {}
         
         return dict(zip(feature_names, importances))
 
-def recomendar_residencia(df, distrito, edad, sexo, modelo_ml, bvd=None):
-    """Recomienda residencias con ML"""
+def puntuar_recomendaciones(bvd, espera):
+    """Score de recomendación vectorizado: más alto con BVD alto y espera corta
+
+    `espera` en días; donde es NaN (sin predicción) el score es el BVD.
+    Los pesos y el tope de espera salen de ML_CONFIG.
+    """
+    tope = ML_CONFIG['RECOMENDACION_ESPERA_MAX']
+    bvd = np.asarray(bvd, dtype=float)
+    espera = np.asarray(espera, dtype=float)
+    score = (bvd * ML_CONFIG['RECOMENDACION_PESO_BVD']
+             + (tope - np.minimum(espera, tope)) * ML_CONFIG['RECOMENDACION_PESO_ESPERA'])
+    return np.where(np.isnan(espera), bvd, score)
+
+def mejores_k(score, k):
+    """Índices de los `k` scores más altos, de mayor a menor
+
+    np.argpartition encuentra el k-ésimo en tiempo lineal y solo se ordenan
+    los elegidos. En los empates gana el índice menor, como en un orden
+    estable.
+    """
+    score = np.asarray(score)
+    k = min(k, len(score))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    umbral = score[np.argpartition(-score, k - 1)[k - 1]]
+    mayores = np.flatnonzero(score > umbral)
+    elegidos = np.concatenate([mayores, np.flatnonzero(score == umbral)[:k - len(mayores)]])
+    return elegidos[np.lexsort((elegidos, -score[elegidos]))]
+
+def recomendar_residencia(df, distrito, edad, sexo, modelo_ml, bvd=None, bvd_min=0, indice=None, k=None):
+    """Recomienda residencias con ML
+
+    Se puntúan todas las filas que cumplen el filtro (no solo las de mayor
+    BVD) con la espera prevista de cada una y se devuelven las `k` mejores
+    (RECOMENDACIONES_K). Con `indice` (IndiceRecomendacion de `df`) el
+    filtro se resuelve sin copiar ni recorrer el DataFrame. `bvd` se
+    mantiene por compatibilidad y no interviene en el resultado.
+    """
     if df.empty:
         return "No hay datos disponibles"
+    k = k or ML_CONFIG['RECOMENDACIONES_K']
+
+    if indice is not None:
+        # Filas del filtro, de mayor a menor BVD, directamente del índice
+        posiciones = indice.posiciones(distrito, edad, sexo, bvd_min)
+    else:
+        # Filtrar por criterios
+        mascara = df['BVD'].notna().to_numpy(copy=True)
+        
+        if bvd_min and bvd_min > 0:
+            mascara &= (df['BVD'] >= bvd_min).to_numpy()
+        
+        if distrito != "Todos":
+            mascara &= (df['DISTRITO_NOMBRE'] == distrito).to_numpy()
+        
+        if edad != "Todos":
+            mascara &= (df['TRAMO_EDAD'] == edad).to_numpy()
+        
+        if sexo != "Todos":
+            mascara &= (df['SEXO'] == sexo).to_numpy()
+        
+        # Mismo orden que el índice: BVD descendente, estable
+        posiciones = np.flatnonzero(mascara)
+        posiciones = posiciones[np.argsort(-df['BVD'].to_numpy()[posiciones], kind='stable')]
     
-    # Si no se proporciona BVD, usar el promedio
-    if bvd is None:
-        bvd = df['BVD'].mean()
-    
-    # Filtrar por criterios
-    filtrado = df.copy()
-    
-    if distrito != "Todos":
-        filtrado = filtrado[filtrado['DISTRITO_NOMBRE'] == distrito]
-    
-    if edad != "Todos":
-        filtrado = filtrado[filtrado['TRAMO_EDAD'] == edad]
-    
-    if sexo != "Todos":
-        filtrado = filtrado[filtrado['SEXO'] == sexo]
-    
-    if len(filtrado) == 0:
+    if len(posiciones) == 0:
         return "No se encontraron residencias que coincidan con los criterios"
     
-    # Ordenar por BVD (prioridad) y tomar las top 5
-    recomendaciones_raw = filtrado.nlargest(5, 'BVD')
+    # Score de todos los candidatos con el vector de esperas del modelo
+    esperas = np.full(len(posiciones), np.nan)
+    if modelo_ml and modelo_ml.disponible:
+        try:
+            # El vector de todas las filas solo se memoriza para el DataFrame
+            # del índice; otro DataFrame predice solo sus candidatos
+            if indice is not None and indice.df is df:
+                esperas = modelo_ml.predecir_filas(df)[posiciones]
+            else:
+                esperas = modelo_ml.predecir_filas(df, posiciones)
+        except Exception as e:
+            print(f"Error en predicción: {e}")
+    score = puntuar_recomendaciones(df['BVD'].to_numpy()[posiciones], esperas)
+    recomendaciones_raw = df.iloc[posiciones[mejores_k(score, k)]]
     
-    # Añadir predicción de tiempo de espera
+    # Añadir predicción de tiempo de espera (una sola llamada al modelo)
+    predicciones = None
+    if modelo_ml and modelo_ml.disponible:
+        try:
+            predicciones = modelo_ml.predecir_lote(recomendaciones_raw)
+        except Exception as e:
+            print(f"Error en predicción: {e}")
+            predicciones = f"Error en predicción: {str(e)}"
+
     resultados = []
-    for _, rec in recomendaciones_raw.iterrows():
-        if modelo_ml and modelo_ml.model:
-            prediccion = modelo_ml.predecir_tiempo_espera(
-                rec['DISTRITO_NOMBRE'], 
-                rec['TRAMO_EDAD'], 
-                rec['SEXO'],
-                rec['BVD']
-            )
-            
-            if isinstance(prediccion, dict):
-                tiempo_espera = prediccion['prediccion']
-                intervalo = f"{prediccion['intervalo_min']}-{prediccion['intervalo_max']} días"
+    for i, (_, rec) in enumerate(recomendaciones_raw.iterrows()):
+        if isinstance(predicciones, pd.DataFrame):
+            prediccion = predicciones.iloc[i]
+            if prediccion['valido']:
+                tiempo_espera = int(prediccion['prediccion'])
+                intervalo = f"{int(prediccion['intervalo_min'])}-{int(prediccion['intervalo_max'])} días"
                 confianza = prediccion['confianza']
             else:
-                tiempo_espera = prediccion
+                tiempo_espera = prediccion['motivo']
                 intervalo = "N/A"
                 confianza = 0
+        elif predicciones is not None:
+            tiempo_espera = predicciones
+            intervalo = "N/A"
+            confianza = 0
         else:
             tiempo_espera = "Modelo no disponible"
             intervalo = "N/A"
@@ -176,7 +641,7 @@ def recomendar_residencia(df, distrito, edad, sexo, modelo_ml, bvd=None):
         # Calcular score de recomendación (combinando BVD y tiempo de espera)
         if isinstance(tiempo_espera, (int, float)):
             # Score más alto = mejor recomendación (BVD alto, tiempo bajo)
-            score_recomendacion = (rec['BVD'] * 0.7) + (100 - min(tiempo_espera, 100)) * 0.3
+            score_recomendacion = float(puntuar_recomendaciones(rec['BVD'], tiempo_espera))
         else:
             score_recomendacion = rec['BVD']
         
@@ -195,5 +660,4 @@ def recomendar_residencia(df, distrito, edad, sexo, modelo_ml, bvd=None):
     # Ordenar por score de recomendación (de mayor a menor)
     resultados.sort(key=lambda x: x['SCORE_RECOMENDACION'], reverse=True)
     
-    # Tomar solo las 3 mejores
-    return resultados[:3]
\ No newline at end of file
+    return resultados[:k]
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Tabla de datos paginada, filtrada y ordenada en el servidor
+"""
+
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+from config import APP_CONFIG, CACHE_CONFIG
+from src.cache import CacheLRU
+
+# Términos de filter_query de DataTable: {columna} operador valor, unidos con &&
+TERMINO = re.compile(r'^\{(?P<columna>[^}]+)\}\s+(?P<operador>is blank|is nil|[is]?(?:eq|ne|lt|le|gt|ge|contains|'
+                     r'datestartswith|<=|>=|!=|=|<|>))\s*(?P<valor>.*)$')
+SIMBOLOS = {'=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+COMPARACIONES = {'eq': operator.eq, 'ne': operator.ne, 'lt': operator.lt, 'le': operator.le,
+                 'gt': operator.gt, 'ge': operator.ge}
+
+def parsear_filtro(consulta):
+    """Lista de (columna, operador, valor, sensible_mayusculas) de un filter_query
+
+    Los operadores simbólicos se normalizan a su nombre (`>=` -> `ge`) y el
+    prefijo `i`/`s` de DataTable se separa del operador. Los términos que
+    no se entienden se ignoran.
+    """
+    terminos = []
+    for texto in (consulta or '').split(' && '):
+        m = TERMINO.match(texto.strip())
+        if not m:
+            if texto.strip():
+                print(f"Filtro de tabla no reconocido: {texto.strip()}")
+            continue
+        operador, sensible = m['operador'], True
+        if operador[0] in 'is' and not operador.startswith('is '):
+            sensible, operador = operador[0] == 's', operador[1:]
+        operador = SIMBOLOS.get(operador, operador)
+        valor = m['valor'].strip()
+        if len(valor) >= 2 and valor[0] == valor[-1] and valor[0] in '"\'`':
+            valor = valor[1:-1]
+        terminos.append((m['columna'], operador, valor, sensible))
+    return terminos
+
+class TablaDatos:
+    """Vista del DataFrame para el DataTable con page/filter/sort_action="custom"
+
+    Las columnas de texto se factorizan la primera vez que se filtran u
+    ordenan: los filtros se evalúan sobre los valores distintos (pocos) y se
+    llevan a las filas comparando códigos enteros, y el orden usa el rango
+    de cada valor distinto. Las posiciones filtradas y ordenadas se guardan
+    por consulta en una LRU, así que pasar de página es un slice. Solo viaja
+    al navegador la página pedida, sin las columnas de `ocultas`.
+    """
+
+    def __init__(self, df, ocultas=None, capacidad=None):
+        ocultas = APP_CONFIG['TABLA_COLUMNAS_OCULTAS'] if ocultas is None else ocultas
+        self.df = df.drop(columns=[c for c in ocultas if c in df.columns])
+        self.columnas = list(self.df.columns)
+        self._textos = {}
+        self.consultas = CacheLRU(capacidad or CACHE_CONFIG['TABLA_CONSULTAS_MAX'])
+
+    def definicion_columnas(self):
+        """`columns` del DataTable, con el tipo que decide los operadores del filtro"""
+        def tipo(serie):
+            if pd.api.types.is_datetime64_any_dtype(serie):
+                return 'datetime'
+            return 'numeric' if pd.api.types.is_numeric_dtype(serie) else 'text'
+        return [{'name': col, 'id': col, 'type': tipo(self.df[col])} for col in self.columnas]
+
+    def _texto(self, columna):
+        """Códigos, valores distintos (str) y rango alfabético de cada valor"""
+        if columna not in self._textos:
+            codigos, valores = pd.factorize(self.df[columna], use_na_sentinel=True)
+            valores = np.asarray(valores, dtype=str)
+            rangos = np.empty(len(valores) + 1)
+            rangos[np.argsort(valores, kind='stable')] = np.arange(len(valores))
+            rangos[-1] = np.nan  # los nulos tienen código -1
+            self._textos[columna] = (codigos, valores, rangos)
+        return self._textos[columna]
+
+    def _mascara(self, columna, operador, valor, sensible):
+        serie = self.df[columna]
+        if operador in ('is blank', 'is nil'):
+            return serie.isna().to_numpy()
+
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            fechas = serie.to_numpy()
+            if operador == 'datestartswith':
+                # '2025', '2025-10' o '2025-10-24': todo el año, mes o día del prefijo
+                periodo = pd.Period(valor, freq={4: 'Y', 7: 'M'}.get(len(valor), 'D'))
+                return ((fechas >= periodo.start_time.to_datetime64())
+                        & (fechas <= periodo.end_time.to_datetime64()))
+            if operador in COMPARACIONES:
+                return COMPARACIONES[operador](fechas, pd.Timestamp(valor).to_datetime64())
+            return (serie.dt.strftime('%Y-%m-%d %H:%M:%S').str.contains(valor, regex=False)
+                    .fillna(False).to_numpy())
+
+        if pd.api.types.is_numeric_dtype(serie) and operador in COMPARACIONES:
+            return COMPARACIONES[operador](serie.to_numpy(dtype=float), float(valor))
+
+        # Texto (o contains sobre números): se evalúa sobre los valores distintos
+        codigos, valores, _ = self._texto(columna)
+        if not sensible:
+            valores, valor = np.char.lower(valores), valor.lower()
+        if operador in ('contains', 'datestartswith'):
+            buscar = (np.char.find(valores, valor) >= 0 if operador == 'contains'
+                      else np.char.startswith(valores, valor))
+        elif operador in COMPARACIONES:
+            buscar = COMPARACIONES[operador](valores, valor)
+        else:
+            raise ValueError(f"Operador no soportado: {operador}")
+        seleccion = np.flatnonzero(buscar)
+        if len(seleccion) == 1:
+            return codigos == seleccion[0]
+        return np.isin(codigos, seleccion)
+
+    def _clave_orden(self, columna, posiciones, descendente):
+        serie = self.df[columna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            clave = serie.to_numpy()[posiciones].view(np.int64).astype(float)
+        elif pd.api.types.is_numeric_dtype(serie):
+            clave = serie.to_numpy(dtype=float)[posiciones]
+        else:
+            codigos, _, rangos = self._texto(columna)
+            clave = rangos[codigos[posiciones]]
+        # Los NaN quedan al final en los dos sentidos
+        return -clave if descendente else clave
+
+    def filas(self, consulta='', orden=None):
+        """Posiciones (iloc) de las filas que cumplen `consulta`, en el orden `orden`"""
+        orden = [(o['column_id'], o['direction']) for o in orden or [] if o['column_id'] in self.columnas]
+        clave = (consulta or '', tuple(orden))
+
+        def calcular():
+            mascara = np.ones(len(self.df), dtype=bool)
+            for columna, operador, valor, sensible in parsear_filtro(consulta):
+                if columna not in self.columnas:
+                    continue
+                try:
+                    mascara &= self._mascara(columna, operador, valor, sensible)
+                except (ValueError, TypeError) as e:
+                    print(f"Filtro de tabla ignorado ({columna} {operador} {valor}): {e}")
+            posiciones = np.flatnonzero(mascara)
+            if orden:
+                # lexsort ordena por la última clave primero: la primera de sort_by manda
+                claves = [self._clave_orden(c, posiciones, d == 'desc') for c, d in reversed(orden)]
+                posiciones = posiciones[np.lexsort(claves)]
+            return posiciones
+
+        return self.consultas.obtener(clave, calcular)
+
+    def pagina(self, pagina=0, tamano=None, consulta='', orden=None):
+        """Registros de la página pedida, número de páginas y filas que cumplen el filtro"""
+        tamano = tamano or APP_CONFIG['TABLA_TAMANO_PAGINA']
+        posiciones = self.filas(consulta, orden)
+        n_paginas = max(1, -(-len(posiciones) // tamano))
+        pagina = min(pagina or 0, n_paginas - 1)
+        registros = self.df.iloc[posiciones[pagina * tamano:(pagina + 1) * tamano]].to_dict('records')
+        return registros, n_paginas, len(posiciones)
@@ -0,0 +1,45 @@
+"""
+Fixtures comunes: datos de ejemplo y directorios de trabajo temporales
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from config import APP_CONFIG, ML_CONFIG
+
+@pytest.fixture
+def csv_datos(tmp_path):
+    """Copia de data/lista_espera.csv en un directorio temporal"""
+    ruta = tmp_path / 'lista_espera.csv'
+    shutil.copy(os.path.join(RAIZ, 'data', 'lista_espera.csv'), ruta)
+    return str(ruta)
+
+@pytest.fixture
+def directorio_trabajo(tmp_path, monkeypatch):
+    """Cachés, artefactos y candados en tmp_path en lugar de en el proyecto"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(APP_CONFIG, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setitem(APP_CONFIG, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.setitem(ML_CONFIG, 'ARTEFACTOS_DIR', str(tmp_path / 'modelos'))
+    return tmp_path
+
+@pytest.fixture
+def datos(csv_datos, directorio_trabajo):
+    """Datos de ejemplo limpios, como los carga la app"""
+    from src.etl import cargar_datos
+    return cargar_datos(csv_datos)
+
+@pytest.fixture
+def modelo(datos):
+    """Bosque entrenado con los datos de ejemplo (versión activa del almacén)"""
+    from src.model import ModeloPrediccion
+    modelo_ml = ModeloPrediccion('random_forest')
+    assert modelo_ml.entrenar_modelo(datos)
+    return modelo_ml
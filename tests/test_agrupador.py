@@ -0,0 +1,106 @@
+"""
+Agrupador de predicciones: los lotes devuelven lo mismo que las llamadas sueltas
+"""
+
+import threading
+
+import pandas as pd
+import pytest
+
+from config import ML_CONFIG
+from src.agrupador import AgrupadorPredicciones
+from src.artefactos import AlmacenModelos
+from src.model import ModeloPrediccion
+
+COLUMNAS = ['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO', 'BVD']
+
+@pytest.mark.parametrize('compilado', [False, True])
+def test_lotes_igual_que_sin_agrupar(datos, modelo, compilado):
+    servido = ModeloPrediccion()
+    AlmacenModelos().cargar(servido, compilado=compilado)
+    assert (servido.model is None) == compilado
+    n_jobs = getattr(servido.model, 'n_jobs', None)
+
+    # Un paciente desconocido entre medias: su fila sale como no válida en su sitio
+    entrada = datos[COLUMNAS].astype({'BVD': float})
+    entrada.loc[entrada.index[7], 'DISTRITO_NOMBRE'] = 'MARTE'
+    partes = [entrada.iloc[i:i + 3] for i in range(0, 60, 3)] + [entrada.iloc[[100]]]
+    esperado = [servido.predecir_lote(p) for p in partes]
+
+    agrupador = AgrupadorPredicciones(espera_ms=50, max_filas=4096)
+    envuelto = agrupador.envolver(servido)
+    resultados = [None] * len(partes)
+    salida = threading.Barrier(len(partes))
+
+    def cliente(i):
+        salida.wait()
+        resultados[i] = envuelto.predecir_lote(partes[i])
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(len(partes))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(30)
+
+    for obtenido, referencia in zip(resultados, esperado):
+        pd.testing.assert_frame_equal(obtenido, referencia)
+    estadisticas = agrupador.estadisticas()
+    assert estadisticas['llamadas'] == len(partes) and estadisticas['llamadas_por_lote'] > 1
+    # El estimador compartido no cambia al predecir
+    assert getattr(servido.model, 'n_jobs', None) == n_jobs
+
+def test_lote_grande_va_directo(datos, modelo):
+    agrupador = AgrupadorPredicciones(espera_ms=50, max_filas=10)
+    resultado = agrupador.envolver(modelo).predecir_lote(datos[COLUMNAS])
+    pd.testing.assert_frame_equal(resultado, modelo.predecir_lote(datos[COLUMNAS]))
+    assert agrupador.estadisticas()['lotes'] == 0
+
+def test_prediccion_individual(modelo):
+    envuelto = AgrupadorPredicciones(espera_ms=5).envolver(modelo)
+    assert envuelto.predecir_tiempo_espera('CENTRO', '>=85', 'MUJER', 80.0) == \
+        modelo.predecir_tiempo_espera('CENTRO', '>=85', 'MUJER', 80.0)
+    assert isinstance(envuelto.predecir_tiempo_espera('MARTE', '>=85', 'MUJER', 80.0), str)
+
+def test_sin_respuesta_del_agrupador_predice_directo(datos, modelo, monkeypatch):
+    agrupador = AgrupadorPredicciones(espera_ms=5, tiempo_maximo=0.2)
+    atascado = threading.Event()
+    monkeypatch.setattr(agrupador, '_ejecutar', lambda lote: atascado.wait(10))
+    entrada = datos[COLUMNAS].iloc[:3]
+    resultado = agrupador.envolver(modelo).predecir_lote(entrada)
+    pd.testing.assert_frame_equal(resultado, modelo.predecir_lote(entrada))
+    # La llamada sale de la cola: el lote atascado no la vuelve a recoger
+    assert not agrupador._cola and agrupador._filas_en_cola == 0
+    atascado.set()
+
+def test_fallo_del_agrupador_predice_directo(datos, modelo, monkeypatch):
+    agrupador = AgrupadorPredicciones(espera_ms=5)
+    ejecutar = agrupador._ejecutar
+    monkeypatch.setattr(agrupador, '_ejecutar', lambda lote: 1 / 0)
+    entrada = datos[COLUMNAS].iloc[:3]
+    envuelto = agrupador.envolver(modelo)
+    pd.testing.assert_frame_equal(envuelto.predecir_lote(entrada), modelo.predecir_lote(entrada))
+
+    # El hilo sigue vivo y vuelve a agrupar
+    monkeypatch.setattr(agrupador, '_ejecutar', ejecutar)
+    pd.testing.assert_frame_equal(envuelto.predecir_lote(entrada), modelo.predecir_lote(entrada))
+    assert agrupador._hilo.is_alive() and agrupador.estadisticas()['lotes'] == 1
+
+def test_hilos_de_openmp_se_fijan_al_cargar(datos, monkeypatch):
+    threadpoolctl = pytest.importorskip('threadpoolctl')
+    monkeypatch.setitem(ML_CONFIG, 'HILOS_PREDICCION', 2)
+    hgb = ModeloPrediccion('hist_gradient_boosting')
+    assert hgb.entrenar_modelo(datos)
+    originales = threadpoolctl.threadpool_limits(limits=None, user_api='openmp')
+    try:
+        threadpoolctl.threadpool_limits(1, user_api='openmp')
+        servido = ModeloPrediccion()
+        AlmacenModelos().cargar(servido)
+        openmp = [p for p in threadpoolctl.threadpool_info() if p['user_api'] == 'openmp']
+        assert openmp and all(p['num_threads'] == 2 for p in openmp)
+
+        # Los lotes no tocan el estado global de hilos
+        antes = threadpoolctl.threadpool_info()
+        AgrupadorPredicciones(espera_ms=5).envolver(servido).predecir_lote(datos[COLUMNAS].iloc[:3])
+        assert threadpoolctl.threadpool_info() == antes
+    finally:
+        originales.restore_original_limits()
@@ -0,0 +1,139 @@
+"""
+API REST por lotes: ida y vuelta NDJSON/CSV y códigos de error
+"""
+
+import io
+import json
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from config import APP_CONFIG
+from src.api import crear_api, leer_filas
+from src.indice import IndiceRecomendacion
+from src.model import recomendar_residencia
+
+PACIENTE = {'DISTRITO_NOMBRE': 'CENTRO', 'TRAMO_EDAD': '>=85', 'SEXO': 'MUJER', 'BVD': 80}
+
+@pytest.fixture
+def contexto(datos, modelo):
+    return {'df': datos, 'indice': IndiceRecomendacion(datos), 'modelo': modelo,
+            'recomendar': recomendar_residencia}
+
+@pytest.fixture
+def cliente(contexto):
+    app = Flask(__name__)
+    app.register_blueprint(crear_api(lambda: contexto))
+    return app.test_client()
+
+def _ndjson(registros):
+    return ''.join(json.dumps(r) + '\n' for r in registros)
+
+def _lineas(respuesta):
+    return [json.loads(l) for l in respuesta.get_data(as_text=True).splitlines()]
+
+def test_predict_ndjson_coincide_con_predecir_lote(cliente, modelo):
+    pacientes = [dict(PACIENTE, id=1), dict(PACIENTE, BVD=55.5), dict(PACIENTE, id=3, DISTRITO_NOMBRE='MARTE')]
+    respuesta = cliente.post('/api/v1/predict', data=_ndjson(pacientes), content_type='application/x-ndjson')
+    assert respuesta.status_code == 200
+    assert respuesta.headers['X-Version-Modelo'] == str(modelo.version)
+    lineas = _lineas(respuesta)
+    assert [l['fila'] for l in lineas] == [0, 1, 2]
+    # Los ids enteros siguen siendo enteros aunque falte alguno
+    assert [l['id'] for l in lineas] == [1, None, 3]
+    assert isinstance(lineas[0]['id'], int)
+
+    esperado = modelo.predecir_lote(pd.DataFrame([{k: p[k] for k in PACIENTE} for p in pacientes]))
+    assert [l['valido'] for l in lineas] == list(esperado['valido'])
+    assert lineas[0]['prediccion'] == pytest.approx(esperado['prediccion'].iloc[0])
+    assert lineas[2]['motivo'] == esperado['motivo'].iloc[2]
+
+def test_predict_csv_con_coma_decimal(cliente):
+    cuerpo = '﻿DISTRITO_NOMBRE;TRAMO_EDAD;SEXO;BVD\r\nCENTRO;>=85;MUJER;80,5\r\nLATINA;80 - 84;HOMBRE;70\r\n'
+    respuesta = cliente.post('/api/v1/predict', data=cuerpo.encode(), content_type='text/csv')
+    assert respuesta.status_code == 200
+    lineas = respuesta.get_data(as_text=True).splitlines()
+    assert lineas[0].startswith('fila;id;prediccion')
+    assert len(lineas) == 3 and all(l.split(';')[6] == 'True' for l in lineas[1:])
+
+@pytest.mark.parametrize('salto', ['\n', '\r\n', '\r'])
+def test_csv_con_saltos_de_linea_entre_comillas(salto):
+    cuerpo = f'id,DISTRITO_NOMBRE,BVD{salto}"uno{salto}dos",CENTRO,80{salto}"a, ""b""",LATINA,70{salto}'
+    filas = list(leer_filas(io.BytesIO(cuerpo.encode()), 'csv'))
+    assert filas == [{'id': f'uno{salto}dos', 'DISTRITO_NOMBRE': 'CENTRO', 'BVD': '80'},
+                     {'id': 'a, "b"', 'DISTRITO_NOMBRE': 'LATINA', 'BVD': '70'}]
+
+@pytest.mark.parametrize('salto', ['\r\n', '\r'])
+def test_predict_ndjson_con_otros_saltos(cliente, salto):
+    cuerpo = _ndjson([dict(PACIENTE, id='a'), dict(PACIENTE, id='b')]).replace('\n', salto) + salto
+    respuesta = cliente.post('/api/v1/predict', data=cuerpo.encode(), content_type='application/x-ndjson')
+    assert respuesta.status_code == 200
+    assert [(l['id'], l['valido']) for l in _lineas(respuesta)] == [('a', True), ('b', True)]
+
+def test_recommend_ndjson(cliente):
+    consultas = [{'distrito': 'CENTRO'}, {'sexo': 'MUJER', 'bvd_min': 90, 'k': 2}, {'bvd_min': 'x'}]
+    respuesta = cliente.post('/api/v1/recommend', data=_ndjson(consultas), content_type='application/x-ndjson')
+    assert respuesta.status_code == 200
+    lineas = _lineas(respuesta)
+    assert [l['consulta'] for l in lineas] == [0, 1, 2]
+    assert len(lineas[1]['recomendaciones']) <= 2
+    assert 'numéricos' in lineas[2]['mensaje']
+
+@pytest.mark.parametrize('datos_peticion, tipo, estado', [
+    (_ndjson([PACIENTE]), 'application/json', 415),
+    ('{"a":\n', 'application/x-ndjson', 400),
+    ('[1]\n', 'application/x-ndjson', 400),
+    ('DISTRITO_NOMBRE\nCENTRO\n', 'text/csv', 400),
+])
+def test_errores_de_peticion(cliente, datos_peticion, tipo, estado):
+    respuesta = cliente.post('/api/v1/predict', data=datos_peticion, content_type=tipo)
+    assert respuesta.status_code == estado
+    assert 'error' in respuesta.get_json()
+
+def test_cuerpo_demasiado_grande(cliente, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'API_MAX_BYTES', 10)
+    respuesta = cliente.post('/api/v1/predict', data=_ndjson([PACIENTE]), content_type='application/x-ndjson')
+    assert respuesta.status_code == 413
+
+def test_cuerpo_chunked_sin_content_length(cliente, monkeypatch):
+    cuerpo = _ndjson([PACIENTE] * 3).encode()
+    chunked = {'input_stream': io.BytesIO(cuerpo), 'headers': {'Transfer-Encoding': 'chunked'},
+               'environ_overrides': {'wsgi.input_terminated': True, 'CONTENT_LENGTH': ''}}
+    respuesta = cliente.post('/api/v1/predict', content_type='application/x-ndjson', **chunked)
+    assert respuesta.status_code == 200 and len(_lineas(respuesta)) == 3
+
+    # El límite se aplica contando los bytes leídos
+    monkeypatch.setitem(APP_CONFIG, 'API_MAX_BYTES', 10)
+    chunked['input_stream'] = io.BytesIO(cuerpo)
+    respuesta = cliente.post('/api/v1/predict', content_type='application/x-ndjson', **chunked)
+    assert respuesta.status_code == 413
+
+def test_error_tras_el_primer_bloque_va_en_la_ultima_linea(cliente, contexto, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'API_BLOQUE_FILAS', 1)
+    respuesta = cliente.post('/api/v1/predict', data=_ndjson([PACIENTE]) + '[1]\n',
+                             content_type='application/x-ndjson')
+    assert respuesta.status_code == 200
+    assert 'error' in _lineas(respuesta)[-1]
+
+    predecir = contexto['modelo'].predecir_lote
+    llamadas = []
+
+    def fallar_segundo(df):
+        llamadas.append(1)
+        if len(llamadas) > 1:
+            raise RuntimeError('fallo del modelo')
+        return predecir(df)
+
+    monkeypatch.setattr(contexto['modelo'], 'predecir_lote', fallar_segundo)
+    respuesta = cliente.post('/api/v1/predict', data=_ndjson([PACIENTE] * 2), content_type='application/x-ndjson')
+    lineas = _lineas(respuesta)
+    assert respuesta.status_code == 200 and len(lineas) == 2
+    assert 'fallo del modelo' in lineas[-1]['error']
+
+def test_datos_cargandose(datos):
+    app = Flask(__name__)
+    app.register_blueprint(crear_api(lambda: None))
+    respuesta = app.test_client().post('/api/v1/predict', data=_ndjson([PACIENTE]),
+                                       content_type='application/x-ndjson')
+    assert respuesta.status_code == 503 and respuesta.headers['Retry-After'] == '5'
@@ -0,0 +1,70 @@
+"""
+Bosque compilado: mismas predicciones, árbol a árbol, que el bosque de sklearn
+"""
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from src.artefactos import AlmacenModelos
+from src.bosque import BLOQUE_RECORRIDO, BosqueCompilado, exportar_bosque
+from src.model import FEATURES, ModeloPrediccion
+
+def _entradas_en_los_umbrales(model, n_aleatorias, semilla=0):
+    """Filas aleatorias y filas con BVD justo en cada umbral y en sus vecinos float32"""
+    rng = np.random.default_rng(semilla)
+    maximos = [int(max(t.tree_.threshold[t.tree_.feature == f].max(initial=0) for t in model.estimators_)) + 2
+               for f in range(3)]
+    X = np.column_stack([rng.integers(0, m, n_aleatorias) for m in maximos]
+                        + [np.round(rng.uniform(0, 100, n_aleatorias), 2)]).astype(float)
+    umbrales = np.unique(np.concatenate([t.tree_.threshold[t.tree_.feature == 3] for t in model.estimators_]))
+    u32 = umbrales.astype(np.float32)
+    bvd = np.concatenate([umbrales, u32, np.nextafter(u32, np.float32(np.inf)),
+                          np.nextafter(u32, np.float32(-np.inf))]).astype(float)
+    bordes = np.repeat(X[:1], len(bvd), axis=0)
+    bordes[:, 3] = bvd
+    return np.vstack([X, bordes])
+
+def _compilar(model, label_encoders, tmp_path):
+    ruta = str(tmp_path / 'bosque.npz')
+    exportar_bosque(model, label_encoders, ruta, 'prueba')
+    return BosqueCompilado.cargar(ruta)
+
+def test_arboles_iguales_que_sklearn(modelo, tmp_path):
+    bosque = _compilar(modelo.model, modelo.label_encoders, tmp_path)
+    X = _entradas_en_los_umbrales(modelo.model, 3 * BLOQUE_RECORRIDO + 17)
+    np.testing.assert_array_equal(bosque.predicciones_arboles(X), modelo.predicciones_arboles(X))
+    np.testing.assert_allclose(bosque.predicciones_arboles(X).mean(axis=1),
+                               modelo.model.predict(pd.DataFrame(X, columns=FEATURES)), rtol=1e-12)
+    assert {col: list(c.classes_) for col, c in bosque.codificadores().items()} == \
+        {col: list(map(str, le.classes_)) for col, le in modelo.label_encoders.items()}
+
+def test_arboles_profundos(tmp_path):
+    rng = np.random.default_rng(1)
+    X = np.column_stack([rng.integers(0, 21, 5000), rng.integers(0, 7, 5000), rng.integers(0, 2, 5000),
+                         np.round(rng.uniform(0, 100, 5000), 2)]).astype(float)
+    y = X[:, 3] * 3 + X[:, 0] * 10 + rng.normal(0, 20, 5000)
+    model = RandomForestRegressor(n_estimators=20, max_depth=None, random_state=0).fit(
+        pd.DataFrame(X, columns=FEATURES), y)
+    bosque = _compilar(model, {}, tmp_path)
+    assert bosque.profundidad > 15
+    entradas = _entradas_en_los_umbrales(model, 2000, semilla=2)
+    valores = np.concatenate([t.tree_.value[:, 0, 0] for t in model.estimators_])
+    desplazamientos = np.cumsum([0] + [t.tree_.node_count for t in model.estimators_[:-1]])
+    esperado = valores[model.apply(pd.DataFrame(entradas, columns=FEATURES)) + desplazamientos]
+    np.testing.assert_array_equal(bosque.predicciones_arboles(entradas), esperado)
+
+def test_modelo_servido_compilado_igual_que_sklearn(datos, modelo):
+    compilado, original = ModeloPrediccion(), ModeloPrediccion()
+    AlmacenModelos().cargar(compilado, compilado=True)
+    AlmacenModelos().cargar(original, compilado=False)
+    assert compilado.model is None and compilado.bosque is not None
+    assert original.model is not None and original.bosque is None
+    assert compilado.version == original.version
+
+    entrada = datos[['DISTRITO_NOMBRE', 'TRAMO_EDAD', 'SEXO', 'BVD']]
+    resultado = compilado.predecir_lote(entrada)
+    esperado = original.predecir_lote(entrada)
+    pd.testing.assert_frame_equal(resultado.drop(columns='confianza'), esperado.drop(columns='confianza'))
+    np.testing.assert_allclose(resultado['confianza'], esperado['confianza'], rtol=1e-9)
+    np.testing.assert_array_equal(compilado.predecir_filas(datos), original.predecir_filas(datos))
@@ -0,0 +1,141 @@
+"""
+Cachés de resultados: contadores, orden de expulsión e invalidación
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from src.cache import (BackendDisco, BackendMemoria, BackendRedis, CacheCompartida, CacheLRU,
+                       CacheRecomendaciones, RedisLocal, crear_backend)
+from src.model import ModeloPrediccion, recomendar_residencia
+
+@pytest.fixture(params=['memoria', 'disco', 'redis_local'])
+def backend(request, tmp_path):
+    if request.param == 'disco':
+        return BackendDisco(str(tmp_path / 'cache' / 'cache.sqlite'))
+    if request.param == 'redis_local':
+        return BackendRedis(RedisLocal())
+    return BackendMemoria()
+
+def _texto(valor):
+    return valor.decode('utf-8') if isinstance(valor, bytes) else valor
+
+def test_lru_contadores_y_orden_de_expulsion():
+    cache = CacheLRU(capacidad=2)
+    calculos = []
+
+    def calcular(valor):
+        return lambda: calculos.append(valor) or valor
+
+    assert cache.obtener('a', calcular(1)) == 1
+    assert cache.obtener('b', calcular(2)) == 2
+    assert cache.obtener('a', calcular(None)) == 1
+    # 'b' es la menos usada recientemente: sale al entrar 'c'
+    assert cache.obtener('c', calcular(3)) == 3
+    assert cache.obtener('a', calcular(None)) == 1
+    assert cache.obtener('b', calcular(4)) == 4
+    assert calculos == [1, 2, 3, 4]
+
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['aciertos'], estadisticas['fallos'], estadisticas['expulsiones']) == (2, 4, 2)
+    assert estadisticas['entradas'] == len(cache) == 2
+    assert estadisticas['tasa_aciertos'] == 2 / 6
+
+def test_recomendaciones_por_version_del_modelo(datos, modelo):
+    cache = CacheRecomendaciones()
+    esperado = recomendar_residencia(datos, 'CENTRO', 'Todos', 'Todos', modelo)
+    assert cache.recomendar(datos, 'CENTRO', 'Todos', 'Todos', modelo) == esperado
+    assert cache.recomendar(datos, 'CENTRO', 'Todos', 'Todos', modelo) == esperado
+    assert (cache.aciertos, cache.fallos) == (1, 1)
+
+    # Versión nueva: entradas propias, sin vaciar las de la anterior
+    nuevo = ModeloPrediccion('random_forest')
+    assert nuevo.entrenar_modelo(datos.iloc[:150])
+    assert nuevo.version != modelo.version
+    assert cache.recomendar(datos, 'CENTRO', 'Todos', 'Todos', nuevo) == \
+        recomendar_residencia(datos, 'CENTRO', 'Todos', 'Todos', nuevo)
+    assert (cache.aciertos, cache.fallos) == (1, 2)
+    assert cache.recomendar(datos, 'CENTRO', 'Todos', 'Todos', modelo) == esperado
+    assert (cache.aciertos, cache.fallos, len(cache)) == (2, 2, 2)
+
+def test_subconjunto_no_comparte_entradas(datos, modelo):
+    cache = CacheRecomendaciones()
+    cache.recomendar(datos, 'Todos', 'Todos', 'Todos', modelo)
+    hombres = datos[datos['SEXO'] == 'HOMBRE']
+    assert hombres.attrs == datos.attrs
+    assert cache.recomendar(hombres, 'Todos', 'Todos', 'Todos', modelo) == \
+        recomendar_residencia(hombres, 'Todos', 'Todos', 'Todos', modelo)
+    assert cache.fallos == 2
+    # La misma selección en otro objeto reutiliza la entrada
+    cache.recomendar(datos[datos['SEXO'] == 'HOMBRE'], 'Todos', 'Todos', 'Todos', modelo)
+    assert cache.aciertos == 1
+
+def test_backend_get_set_ttl_y_borrado(backend):
+    assert backend.get('a') is None
+    backend.set('a', '1')
+    backend.set('b', '2', ttl=1)
+    assert _texto(backend.get('a')) == '1' and _texto(backend.get('b')) == '2'
+    backend.set('a', '3')
+    assert _texto(backend.get('a')) == '3'
+    backend.delete('a')
+    assert backend.get('a') is None
+
+    # add solo guarda si la clave no existe (o ha caducado)
+    assert backend.add('c', 'x', ttl=1)
+    assert not backend.add('c', 'y', ttl=1)
+    assert _texto(backend.get('c')) == 'x'
+    time.sleep(1.1)
+    assert backend.get('b') is None
+    assert backend.add('c', 'z')
+    assert _texto(backend.get('c')) == 'z'
+
+def test_caches_compartidas_calculan_una_vez(backend):
+    primera, segunda = CacheCompartida(backend), CacheCompartida(backend)
+    calculos = []
+    salida = threading.Barrier(2)
+
+    def calcular():
+        calculos.append(1)
+        time.sleep(0.2)
+        return {'valor': [1, 2]}
+
+    resultados = [None, None]
+
+    def cliente(i, cache):
+        salida.wait()
+        resultados[i] = cache.obtener('clave', calcular)
+
+    hilos = [threading.Thread(target=cliente, args=(i, c)) for i, c in enumerate((primera, segunda))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(10)
+    assert resultados == [{'valor': [1, 2]}] * 2 and len(calculos) == 1
+    assert primera.fallos + segunda.fallos == 1 and primera.aciertos + segunda.aciertos == 1
+
+    # Lo que invalida una instancia deja de verlo la otra
+    backend.delete('residencias:clave')
+    assert segunda.obtener('clave', lambda: {'valor': 3}) == {'valor': 3}
+    assert primera.obtener('clave', calcular) == {'valor': 3}
+
+def test_disco_abre_la_conexion_en_cada_proceso(tmp_path):
+    ruta = str(tmp_path / 'cache' / 'cache.sqlite')
+    backend = BackendDisco(ruta)
+    # Construirlo (en el master de gunicorn) no abre ninguna conexión
+    assert not os.path.exists(ruta) and getattr(backend._local, 'conexion', None) is None
+    backend.set('a', '1')
+    conexion = backend._conexion()
+    assert backend._conexion() is conexion
+
+    # Tras un fork (otro pid) se abre una conexión nueva sobre el mismo fichero
+    backend._local.pid = -1
+    assert backend._conexion() is not conexion and backend.get('a') == '1'
+
+def test_crear_backend_redis_local():
+    backend = crear_backend('redis_local')
+    assert isinstance(backend, BackendRedis) and isinstance(backend.cliente, RedisLocal)
+    with pytest.raises(ValueError):
+        crear_backend('memcached')
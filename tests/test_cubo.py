@@ -0,0 +1,72 @@
+"""
+Cubo de agregados: mismas estadísticas que calculadas sobre las filas
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cubo import construir_cubo
+from src.etl import compactar_datos, contar_valores, obtener_estadisticas_avanzadas
+
+def _comparar(cubo, df):
+    esperado = obtener_estadisticas_avanzadas(df)
+    obtenido = cubo.estadisticas()
+    assert obtenido.keys() == esperado.keys()
+    for clave, valor in esperado.items():
+        if isinstance(valor, dict):
+            # Mismo orden, empates incluidos
+            assert list(obtenido[clave].items()) == list(valor.items()), clave
+        else:
+            assert obtenido[clave] == pytest.approx(valor), clave
+
+@pytest.mark.parametrize('compacto', [False, True])
+def test_estadisticas_iguales_a_las_del_dataframe(datos, compacto):
+    df = compactar_datos(datos) if compacto else datos
+    _comparar(construir_cubo(df), df)
+
+def test_mediana_exacta_con_numero_par_e_impar(datos):
+    for n in (len(datos), len(datos) - 1):
+        df = datos.iloc[:n]
+        assert construir_cubo(df).mediana_bvd() == df['BVD'].median()
+
+@pytest.mark.parametrize('compacto', [False, True])
+def test_empates_en_el_orden_de_categorias(compacto):
+    # Empatan LATINA y CENTRO, USERA y RETIRO, y MARTE y JÚPITER (fuera del
+    # orden fijo): en los empates manda el orden de categorías, no el de aparición
+    distritos = ['LATINA', 'USERA', 'MARTE', 'LATINA', 'CENTRO', 'JÚPITER', 'RETIRO', 'CENTRO']
+    df = pd.DataFrame({
+        'DISTRITO_NOMBRE': distritos, 'DISTRITO': distritos,
+        'TRAMO_EDAD': ['>=85'] * 8, 'SEXO': ['MUJER', 'HOMBRE'] * 4, 'MES_ENTRADA': [1] * 8,
+        'BVD': [50.0, 60.0, np.nan, 70.0, 80.0, 80.0, 90.0, 40.0], 'DIAS_EN_ESPERA': [10] * 8
+    })
+    if compacto:
+        df = compactar_datos(df)
+    esperado = [('CENTRO', 2), ('LATINA', 2), ('RETIRO', 1), ('USERA', 1), ('JÚPITER', 1), ('MARTE', 1)]
+    assert list(contar_valores(df['DISTRITO_NOMBRE']).items()) == esperado
+    assert list(contar_valores(df['SEXO']).items()) == [('HOMBRE', 4), ('MUJER', 4)]
+    cubo = construir_cubo(df)
+    assert list(cubo.conteos('DISTRITO_NOMBRE').items()) == esperado
+    assert list(cubo.conteos('SEXO').items()) == [('HOMBRE', 4), ('MUJER', 4)]
+    assert cubo.mediana_bvd() == df['BVD'].median()
+
+def test_filtro_como_sobre_las_filas(datos):
+    cubo = construir_cubo(datos)
+    distrito = datos['DISTRITO_NOMBRE'].iloc[0]
+    for filtro, mascara in [((distrito, "Todos", "Todos"), datos['DISTRITO_NOMBRE'] == distrito),
+                            (("Todos", "Todos", "MUJER"), datos['SEXO'] == 'MUJER'),
+                            (("MARTE", "Todos", "Todos"), np.zeros(len(datos), dtype=bool))]:
+        sub = cubo.filtrar(*filtro)
+        filas = datos[mascara]
+        assert sub.total == len(filas)
+        if len(filas):
+            assert sub.mediana_bvd() == filas['BVD'].median()
+            assert list(sub.conteos('TRAMO_EDAD').items()) == list(contar_valores(filas['TRAMO_EDAD']).items())
+        else:
+            assert np.isnan(sub.mediana_bvd())
+    # Un filtro de un filtro
+    doble = cubo.filtrar(distrito).filtrar(sexo='MUJER')
+    filas = datos[(datos['DISTRITO_NOMBRE'] == distrito) & (datos['SEXO'] == 'MUJER')]
+    assert doble.total == len(filas)
+    if len(filas):
+        assert doble.mediana_bvd() == filas['BVD'].median()
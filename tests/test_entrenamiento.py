@@ -0,0 +1,125 @@
+"""
+Cambio en caliente del modelo: la carga no bloquea las peticiones y el
+modelo nuevo se publica ya preparado
+"""
+
+import subprocess
+import threading
+
+import pytest
+
+from config import APP_CONFIG, ML_CONFIG
+from src import entrenamiento
+from src.artefactos import AlmacenModelos
+from src.entrenamiento import GestorModelo
+from src.etl import cargar_o_entrenar_modelo
+from src.model import ModeloPrediccion
+
+def test_cambio_de_version_en_segundo_plano(datos, modelo):
+    gestor = GestorModelo(modelo, intervalo=0)
+    nuevo = ModeloPrediccion('random_forest')
+    assert nuevo.entrenar_modelo(datos)
+    assert nuevo.artefacto['version'] != modelo.artefacto['version']
+
+    cargar = gestor.almacen.cargar
+    seguir = threading.Event()
+
+    def cargar_lento(*args, **kwargs):
+        seguir.wait(10)
+        return cargar(*args, **kwargs)
+
+    gestor.almacen.cargar = cargar_lento
+    # Mientras se carga la versión nueva se sigue sirviendo la anterior
+    assert gestor.modelo is modelo
+    hilo = gestor._hilo
+    assert hilo is not None and hilo.is_alive()
+    assert gestor.modelo is modelo and gestor._hilo is hilo
+
+    seguir.set()
+    hilo.join(10)
+    servido = gestor.modelo
+    assert servido is not modelo
+    assert servido.artefacto['version'] == nuevo.artefacto['version']
+    assert servido.disponible
+
+def test_sin_version_nueva_no_cambia(modelo):
+    gestor = GestorModelo(modelo, intervalo=0)
+    assert not gestor.comprobar()
+    assert gestor.modelo is modelo
+
+def test_modelo_se_prepara_antes_de_publicarse(datos, modelo):
+    preparados = []
+
+    def preparar(nuevo):
+        # Todavía no es el modelo servido
+        assert gestor._modelo is modelo
+        nuevo.predecir_filas(datos)
+        preparados.append(nuevo)
+
+    gestor = GestorModelo(modelo, intervalo=3600, preparar=preparar)
+    assert ModeloPrediccion('random_forest').entrenar_modelo(datos)
+    assert gestor.comprobar()
+    assert preparados == [gestor.modelo]
+    referencia, clave, _ = gestor.modelo._esperas
+    assert referencia() is datos and clave[-1] == gestor.modelo.version
+
+def test_fallo_al_preparar_mantiene_el_modelo(datos, modelo):
+    def preparar(nuevo):
+        raise RuntimeError('sin memoria')
+
+    gestor = GestorModelo(modelo, intervalo=3600, preparar=preparar)
+    assert ModeloPrediccion('random_forest').entrenar_modelo(datos)
+    assert not gestor.comprobar()
+    assert gestor.modelo is modelo
+
+@pytest.fixture
+def lanzados(monkeypatch):
+    """Llamadas a lanzar_entrenamiento, sin arrancar procesos"""
+    llamadas = []
+    monkeypatch.setattr(entrenamiento, 'lanzar_entrenamiento', lambda df=None, firma=None: llamadas.append((df, firma)) or True)
+    return llamadas
+
+def test_datos_nuevos_lanzan_el_reentrenamiento(csv_datos, modelo, lanzados, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'DATA_PATH', csv_datos)
+    gestor = GestorModelo(modelo, intervalo=3600, vigilar_datos=True)
+    assert not gestor.comprobar_datos() and lanzados == []
+
+    with open(csv_datos, encoding='utf-8') as f:
+        lineas = f.read().splitlines()
+    with open(csv_datos, 'a', encoding='utf-8') as f:
+        f.write(lineas[-1] + '\n')
+    assert gestor.comprobar_datos()
+    assert lanzados == [(None, entrenamiento.firma_fuente())]
+    # Una sola vez por cambio de la fuente
+    assert not gestor.comprobar_datos() and len(lanzados) == 1
+
+def test_entrenamiento_del_arranque_lo_lanza_el_worker(datos, lanzados, monkeypatch):
+    monkeypatch.setitem(ML_CONFIG, 'ENTRENAMIENTO_SEGUNDO_PLANO', True)
+    monkeypatch.setattr(subprocess, 'Popen', None)
+    # Sin modelo: el arranque (el master con preload) solo lo apunta
+    modelo_ml, _ = cargar_o_entrenar_modelo(datos)
+    assert not modelo_ml.disponible and lanzados == []
+
+    gestor = GestorModelo(modelo_ml, intervalo=3600)
+    assert gestor.comprobar_datos()
+    assert lanzados[0][0] is datos and not entrenamiento._PENDIENTES
+
+def test_no_se_relanzan_datos_ya_entrenados(datos, modelo, monkeypatch):
+    monkeypatch.setattr(subprocess, 'Popen', None)
+    assert not entrenamiento.lanzar_entrenamiento(datos)
+
+def test_entrenar_fuente(csv_datos, modelo, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'DATA_PATH', csv_datos)
+    monkeypatch.setitem(ML_CONFIG, 'TOLERANCIA_MAE', 10.0)
+    version = AlmacenModelos().actual()
+    assert entrenamiento.entrenar_fuente()
+    assert entrenamiento.leer_estado()['estado'] == 'sin_cambios' and AlmacenModelos().actual() == version
+
+    with open(csv_datos, encoding='utf-8') as f:
+        lineas = f.read().splitlines()
+    with open(csv_datos, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lineas[:-20]) + '\n')
+    assert entrenamiento.entrenar_fuente()
+    estado = entrenamiento.leer_estado()
+    assert estado['estado'] == 'completado' and estado['firma'] == entrenamiento.firma_fuente()
+    assert AlmacenModelos().actual() == estado['version'] != version
@@ -0,0 +1,104 @@
+"""
+Caché columnar de datos (aciertos, invalidación por huella y reparación) y
+datos congelados para compartir entre workers
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import APP_CONFIG
+from src.cubo import construir_cubo
+from src.etl import cargar_datos, compactar_datos, congelar_datos, obtener_estadisticas_avanzadas, _rutas_cache
+
+def test_cache_acierta_con_los_mismos_datos(csv_datos, directorio_trabajo, capsys):
+    primero = cargar_datos(csv_datos)
+    segundo = cargar_datos(csv_datos)
+    salida = capsys.readouterr().out
+    assert 'Caché de datos MISS' in salida and 'Caché de datos HIT' in salida
+    pd.testing.assert_frame_equal(primero, segundo)
+    assert primero.attrs['huella'] == segundo.attrs['huella']
+
+def test_cache_se_invalida_si_cambia_el_csv(csv_datos, directorio_trabajo):
+    original = cargar_datos(csv_datos)
+    with open(csv_datos, encoding='utf-8') as f:
+        lineas = f.readlines()
+    with open(csv_datos, 'w', encoding='utf-8') as f:
+        f.writelines(lineas[:-10])
+    recortado = cargar_datos(csv_datos)
+    assert len(recortado) == len(original) - 10
+    assert recortado.attrs['huella'] != original.attrs['huella']
+
+def test_mismo_nombre_en_otro_directorio_no_comparte_cache(csv_datos, directorio_trabajo, capsys):
+    otro = directorio_trabajo / 'otra_fuente'
+    otro.mkdir()
+    with open(csv_datos, encoding='utf-8') as f:
+        lineas = f.readlines()
+    (otro / os.path.basename(csv_datos)).write_text(''.join(lineas[:-10]), encoding='utf-8')
+    otro = str(otro / os.path.basename(csv_datos))
+    assert _rutas_cache(otro, APP_CONFIG['CACHE_DIR']) != _rutas_cache(csv_datos, APP_CONFIG['CACHE_DIR'])
+
+    completo, recortado = cargar_datos(csv_datos), cargar_datos(otro)
+    assert len(recortado) == len(completo) - 10
+    capsys.readouterr()
+    # Cada fuente conserva su caché: ninguna invalida la de la otra
+    assert len(cargar_datos(csv_datos)) == len(completo) and len(cargar_datos(otro)) == len(recortado)
+    assert capsys.readouterr().out.count('Caché de datos HIT') == 2
+
+def test_touch_sin_cambios_mantiene_la_huella(csv_datos, directorio_trabajo, capsys):
+    original = cargar_datos(csv_datos)
+    st = os.stat(csv_datos)
+    os.utime(csv_datos, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    capsys.readouterr()
+    tocado = cargar_datos(csv_datos)
+    assert 'Caché de datos HIT' in capsys.readouterr().out
+    assert tocado.attrs['huella'] == original.attrs['huella']
+
+def test_cache_corrupta_se_repara(csv_datos, directorio_trabajo, capsys):
+    original = cargar_datos(csv_datos)
+    _, ruta_meta = _rutas_cache(csv_datos, APP_CONFIG['CACHE_DIR'])
+    with open(ruta_meta, 'w', encoding='utf-8') as f:
+        f.write('{no es json')
+
+    reparado = cargar_datos(csv_datos)
+    salida = capsys.readouterr().out
+    assert 'No se pudo escribir' not in salida
+    pd.testing.assert_frame_equal(original, reparado)
+    assert reparado.attrs['huella'] == original.attrs['huella']
+
+    cargar_datos(csv_datos)
+    assert 'Caché de datos HIT' in capsys.readouterr().out
+
+def test_sin_cache_la_huella_no_lee_el_csv(csv_datos, directorio_trabajo, monkeypatch):
+    import src.etl
+
+    def prohibido(*args, **kwargs):
+        raise AssertionError('no debe calcularse el hash del CSV')
+    monkeypatch.setattr(src.etl, '_hash_fichero', prohibido)
+    df = cargar_datos(csv_datos, usar_cache=False)
+    assert len(df) > 0 and len(df.attrs['huella']) == 16
+
+@pytest.mark.parametrize('compacto', [False, True])
+def test_datos_congelados_de_solo_lectura(datos, compacto):
+    df = compactar_datos(datos) if compacto else datos
+    congelado = congelar_datos(df)
+    pd.testing.assert_frame_equal(congelado, df)
+    assert congelado.attrs == df.attrs
+    for col in ['BVD', 'DIAS_EN_ESPERA', 'NUMERO_ORDEN', 'FECHA_DE_ENTRADA']:
+        assert not congelado[col].to_numpy().flags.writeable, col
+    with pytest.raises(ValueError):
+        congelado['BVD'].to_numpy()[0] = 0
+
+    # Las reducciones (mediana, cuantiles...) no pueden escribir en el buffer
+    bvd = congelado['BVD'].to_numpy()
+    esperado, obtenido = obtener_estadisticas_avanzadas(df), obtener_estadisticas_avanzadas(congelado)
+    assert obtenido['mediana_bvd'] == esperado['mediana_bvd']
+    assert obtenido['top_distritos'] == esperado['top_distritos']
+    assert construir_cubo(congelado).estadisticas()['total_personas'] == len(df)
+    congelado['BVD'].quantile([0.25, 0.75])
+    congelado.describe()
+    # Las consultas no consolidan ni copian los buffers compartidos
+    assert np.shares_memory(bvd, congelado['BVD'].to_numpy())
+    assert not congelado['BVD'].to_numpy().flags.writeable
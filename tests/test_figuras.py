@@ -0,0 +1,23 @@
+"""
+Versión de las figuras precompiladas: cambia con el código y la configuración
+"""
+
+from config import APP_CONFIG
+import src.figuras
+from src.figuras import version_graficos
+
+def test_version_cambia_con_modo_compacto(monkeypatch):
+    original = version_graficos()
+    assert version_graficos() == original
+    monkeypatch.setitem(APP_CONFIG, 'COMPACT_DATA', not APP_CONFIG['COMPACT_DATA'])
+    assert version_graficos() != original
+
+def test_version_cambia_con_el_cubo(monkeypatch, tmp_path):
+    original = version_graficos()
+    for modulo in ('graphics.py', 'cubo.py'):
+        (tmp_path / modulo).write_bytes(b'')
+    falso = str(tmp_path / 'figuras.py')
+    monkeypatch.setattr(src.figuras, '__file__', falso)
+    vacio = version_graficos()
+    (tmp_path / 'cubo.py').write_bytes(b'# cambio')
+    assert vacio != original and version_graficos() != vacio
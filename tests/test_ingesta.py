@@ -0,0 +1,126 @@
+"""
+Almacén de snapshots: diff entre extracciones, reconstrucción y reintentos
+"""
+
+import pandas as pd
+import pytest
+
+from config import APP_CONFIG
+from src.etl import cargar_datos
+from src.ingesta import AlmacenSnapshots
+
+@pytest.fixture
+def extracciones(csv_datos, tmp_path):
+    """CSV con dos extracciones: el 27 hay 5 bajas, 3 BVD cambiados y 2 altas"""
+    dia1 = pd.read_csv(csv_datos, sep=';', encoding='utf-8', dtype=str)
+    dia1['FX_CARGA'] = '2025-10-26'
+    dia2 = dia1.iloc[5:].copy()
+    dia2.loc[dia2.index[:3], 'BVD'] = '99.99'
+    altas = dia1.iloc[:2].copy()
+    altas['DNI'] = ['*****001A', '*****002B']
+    dia2 = pd.concat([dia2, altas])
+    dia2['FX_CARGA'] = '2025-10-27'
+    ruta = tmp_path / 'extracciones.csv'
+    pd.concat([dia1, dia2]).to_csv(ruta, sep=';', index=False, encoding='utf-8')
+    return str(ruta), dia1, dia2
+
+def _claves(df):
+    return sorted(zip(df['DNI'], df['BVD'].astype(float).round(2)))
+
+def test_diff_y_reconstruccion(extracciones, directorio_trabajo):
+    ruta, dia1, dia2 = extracciones
+    almacen = AlmacenSnapshots()
+    primero, segundo = almacen.ingerir(ruta)
+    assert primero['nuevas'] == len(dia1)
+    assert (segundo['nuevas'], segundo['cambiadas'], segundo['bajas']) == (2, 3, 5)
+    assert segundo['sin_cambios'] == len(dia1) - 8
+
+    releido = AlmacenSnapshots()
+    assert releido.snapshots() == ['2025-10-26', '2025-10-27']
+    historico = releido.cargar_snapshot('2025-10-26')
+    ultimo = releido.cargar_snapshot()
+    assert _claves(historico) == _claves(dia1)
+    assert _claves(ultimo) == _claves(dia2)
+    assert list(ultimo['NUMERO_ORDEN']) == list(range(1, len(dia2) + 1))
+    assert ultimo['BVD'].is_monotonic_decreasing
+
+def test_reingesta_se_omite(extracciones, directorio_trabajo):
+    ruta, _, _ = extracciones
+    AlmacenSnapshots().ingerir(ruta)
+    resumenes = AlmacenSnapshots().ingerir(ruta)
+    assert all(r['omitido'] for r in resumenes)
+
+def test_corte_antes_del_manifiesto_no_duplica_el_diff(extracciones, directorio_trabajo, monkeypatch):
+    ruta, dia1, dia2 = extracciones
+    escribir = AlmacenSnapshots._escribir_manifiesto
+    llamadas = []
+
+    def cortar(self):
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            raise OSError('corte simulado')
+        escribir(self)
+
+    monkeypatch.setattr(AlmacenSnapshots, '_escribir_manifiesto', cortar)
+    with pytest.raises(OSError):
+        AlmacenSnapshots().ingerir(ruta)
+    monkeypatch.setattr(AlmacenSnapshots, '_escribir_manifiesto', escribir)
+
+    almacen = AlmacenSnapshots()
+    assert almacen.snapshots() == ['2025-10-26']
+    assert _claves(almacen.cargar_snapshot()) == _claves(dia1)
+
+    _, segundo = almacen.ingerir(ruta)
+    assert (segundo['nuevas'], segundo['cambiadas'], segundo['bajas']) == (2, 3, 5)
+    assert _claves(AlmacenSnapshots().cargar_snapshot('2025-10-26')) == _claves(dia1)
+    assert _claves(AlmacenSnapshots().cargar_snapshot()) == _claves(dia2)
+
+def test_cargar_datos_desde_snapshots(extracciones, csv_datos, directorio_trabajo, monkeypatch):
+    ruta, _, dia2 = extracciones
+    monkeypatch.setitem(APP_CONFIG, 'DATA_PATH', csv_datos)
+    monkeypatch.setitem(APP_CONFIG, 'FUENTE_DATOS', 'snapshots')
+    # Almacén vacío: se cae al CSV
+    assert len(cargar_datos()) == len(pd.read_csv(csv_datos, sep=';'))
+
+    AlmacenSnapshots().ingerir(ruta)
+    df = cargar_datos()
+    assert _claves(df) == _claves(dia2)
+    assert df.attrs['huella'] == 'snapshot-2025-10-27'
+
+def test_mismos_valores_con_otro_formato_no_cambian(extracciones, tmp_path, directorio_trabajo):
+    _, dia1, _ = extracciones
+    ruta1 = tmp_path / 'dia1.csv'
+    dia1.to_csv(ruta1, sep=';', index=False, encoding='utf-8')
+    # Otro CSV con los mismos datos escritos de otra forma: coma decimal,
+    # ceros de más o de menos y espacios; pandas inferiría otros tipos
+    dia2 = dia1.copy()
+    dia2['FX_CARGA'] = '2025-10-27'
+    dia2['BVD'] = dia2['BVD'].astype(float).map(lambda v: f"{v:.3f}".replace('.', ','))
+    dia2['DISTRITO_COD'] = dia2['DISTRITO_COD'].astype(int).astype(str)
+    dia2['SEXO'] = dia2['SEXO'] + ' '
+    dia2.loc[dia2.index[0], 'NOMBRE'] = None
+    ruta2 = tmp_path / 'dia2.csv'
+    dia2.to_csv(ruta2, sep=';', index=False, encoding='utf-8')
+
+    almacen = AlmacenSnapshots()
+    almacen.ingerir(ruta1)
+    segundo, = almacen.ingerir(ruta2)
+    assert (segundo['nuevas'], segundo['cambiadas'], segundo['bajas']) == (0, 1, 0)
+    ultimo = AlmacenSnapshots().cargar_snapshot()
+    assert ultimo['BVD'].dtype == float and _claves(ultimo) == _claves(dia1)
+    assert set(ultimo['SEXO']) == set(dia1['SEXO'])
+
+def test_esquema_validado(extracciones, tmp_path, directorio_trabajo):
+    ruta, dia1, _ = extracciones
+    sin_bvd = tmp_path / 'sin_bvd.csv'
+    dia1.drop(columns='BVD').to_csv(sin_bvd, sep=';', index=False, encoding='utf-8')
+    almacen = AlmacenSnapshots()
+    resumen, = almacen.ingerir(sin_bvd)
+    assert resumen['omitido'] and 'BVD' in resumen['motivo']
+    assert almacen.snapshots() == []
+
+    # Un almacén con otro esquema no mezcla segmentos
+    almacen.manifiesto['columnas'] = dict(almacen.manifiesto['columnas'] or {}, BVD='texto')
+    resumenes = almacen.ingerir(ruta)
+    assert all(r['omitido'] and 'esquema' in r['motivo'] for r in resumenes)
+    assert almacen.snapshots() == []
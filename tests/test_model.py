@@ -0,0 +1,53 @@
+"""
+Tabla de predicción precompilada: una por versión del modelo
+"""
+
+import os
+
+import numpy as np
+
+from src.artefactos import AlmacenModelos
+from src.model import ModeloPrediccion
+
+def test_tabla_por_version_del_modelo(datos, modelo):
+    assert modelo.compilar_tabla(resolucion_bvd=1.0, muestras_verificacion=1000)
+    ruta = modelo.ruta_tabla()
+    assert modelo.version[:16] in ruta
+    assert os.path.exists(ruta) and os.path.exists(os.path.splitext(ruta)[0] + '.json')
+    assert not [f for f in os.listdir('.') if '.tmp' in f]
+
+    # Otro proceso con la misma versión abre la tabla ya compilada
+    cargado = ModeloPrediccion()
+    AlmacenModelos().cargar(cargado)
+    assert cargado.cargar_tabla()
+    np.testing.assert_array_equal(cargado.tabla, modelo.tabla)
+
+    # Una versión nueva compila en su propia ruta y no toca la anterior
+    nuevo = ModeloPrediccion('random_forest')
+    assert nuevo.entrenar_modelo(datos.iloc[:150])
+    assert nuevo.ruta_tabla() != ruta
+    assert not nuevo.cargar_tabla()
+    assert nuevo.compilar_tabla(resolucion_bvd=1.0, muestras_verificacion=1000)
+    assert os.path.exists(ruta) and cargado.cargar_tabla()
+
+def test_esperas_de_un_subconjunto_no_reutilizan_las_del_total(datos, modelo):
+    from src.indice import IndiceRecomendacion
+    from src.model import recomendar_residencia
+    indice = IndiceRecomendacion(datos)
+    todas = modelo.predecir_filas(datos)
+    assert modelo.predecir_filas(datos) is todas
+
+    # Subconjunto que no es un prefijo: hereda attrs['huella'] del total
+    hombres = datos[datos['SEXO'] == 'HOMBRE']
+    assert hombres.attrs == datos.attrs
+    np.testing.assert_array_equal(modelo.predecir_filas(hombres), todas[(datos['SEXO'] == 'HOMBRE').to_numpy()])
+    np.testing.assert_array_equal(modelo.predecir_filas(hombres, [2, 0]), modelo.predecir_filas(hombres)[[2, 0]])
+
+    limpio = ModeloPrediccion()
+    AlmacenModelos().cargar(limpio)
+    recomendar_residencia(datos, 'Todos', 'Todos', 'Todos', modelo, indice=indice)
+    todas = modelo.predecir_filas(datos)
+    assert recomendar_residencia(hombres, 'Todos', 'Todos', 'Todos', modelo, k=10) == \
+        recomendar_residencia(hombres, 'Todos', 'Todos', 'Todos', limpio, k=10)
+    # Sigue memorizado el vector del DataFrame del índice
+    assert modelo.predecir_filas(datos) is todas